@@ -0,0 +1,79 @@
+"""
+API endpoints de administración (perfiles de peticiones y estado de la base de datos)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Header
+from app.core.config import settings
+from app.core.profiling import profile_store
+from app.db.database import pool_status
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def verify_admin_token(x_admin_token: str = Header(None)):
+    """
+    Dependency para validar el token de administración
+    
+    Los endpoints /admin quedan deshabilitados si ADMIN_TOKEN no está configurado.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(verify_admin_token)])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    Listar los últimos perfiles de peticiones
+    
+    Returns:
+        Resumen de cada perfil (más reciente primero)
+    """
+    return [profile.summary() for profile in profile_store.list()]
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: int):
+    """
+    Obtener un perfil completo (árbol de spans SQL/IA y estadísticas de cProfile)
+    
+    Args:
+        profile_id: ID del perfil
+    
+    Returns:
+        Perfil de la petición
+    """
+    profile = profile_store.get(profile_id)
+    
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    
+    return profile.to_dict()
+
+
+@router.delete("/profiles", status_code=204)
+async def clear_profiles():
+    """Eliminar todos los perfiles guardados"""
+    profile_store.clear()
+    logger.info("🧹 Perfiles eliminados")
+
+
+@router.get("/db/pool")
+async def get_pool_status():
+    """
+    Estado del pool de conexiones
+    
+    Los tiempos de apertura de conexión y de espera del pool están en /metrics
+    (angia_db_connect_seconds y angia_db_pool_checkout_seconds).
+    
+    Returns:
+        Modo del pool y conexiones por estado
+    """
+    return pool_status()
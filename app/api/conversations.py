@@ -0,0 +1,98 @@
+"""
+API endpoints del historial de conversaciones
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core.serialization import dumps
+from app.db.database import get_read_db
+from app.models.lead import LeadStatusEnum, OperatorEnum
+from app.services.archive_service import archive_service
+from app.services.search_service import search_service, SearchNotAvailable
+from datetime import datetime
+from typing import Literal, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/conversations", tags=["Conversations"])
+
+
+@router.get("/search")
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=200, description="Términos a buscar"),
+    operator: Optional[OperatorEnum] = Query(None, description="Operador objetivo del lead"),
+    status: Optional[LeadStatusEnum] = Query(None, description="Estado actual del lead"),
+    role: Optional[Literal["user", "assistant"]] = Query(None, description="Quién escribió el mensaje"),
+    start: Optional[datetime] = Query(None, description="Mensajes desde esta fecha"),
+    end: Optional[datetime] = Query(None, description="Mensajes anteriores a esta fecha"),
+    order: Literal["rank", "recent"] = Query("rank", description="Relevancia o más recientes primero"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Buscar en el historial de conversaciones (texto completo)
+    
+    Args:
+        q: Términos a buscar (en PostgreSQL admite "frase exacta", OR y -excluir)
+        operator: Filtrar por operador objetivo del lead
+        status: Filtrar por estado actual del lead
+        role: Filtrar por rol ('user' = lo que escribió el lead)
+        start: Fecha inicial (incluida)
+        end: Fecha final (excluida)
+        order: 'rank' o 'recent'
+        limit: Resultados por página
+        cursor: Valor de `next_cursor` de la página anterior
+        db: Sesión de base de datos (réplica de lectura si está disponible)
+    
+    Returns:
+        Resultados con fragmento resaltado y cursor de la página siguiente
+    """
+    try:
+        results, next_cursor = search_service.search(
+            db, q,
+            operator=operator,
+            status=status,
+            role=role,
+            start=start,
+            end=end,
+            order=order,
+            limit=limit,
+            cursor=cursor
+        )
+    except SearchNotAvailable:
+        raise HTTPException(status_code=501, detail="Búsqueda no disponible para esta base de datos")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"results": results, "next_cursor": next_cursor}
+
+
+@router.get("/{phone_number}/export")
+def export_conversation(phone_number: str, db: Session = Depends(get_read_db)):
+    """
+    Exportar el historial completo de un lead en NDJSON (incluye mensajes archivados)
+    
+    Args:
+        phone_number: Número de teléfono
+        db: Sesión de base de datos (réplica de lectura si está disponible)
+    
+    Returns:
+        Un mensaje por línea, más antiguo primero, con `archived` = true si viene de la capa fría
+    """
+    # La dependencia cierra la sesión antes de enviar la respuesta; el generador la
+    # vuelve a usar (mismo engine) y la cierra al terminar
+    def lines():
+        try:
+            for message in archive_service.iter_history(db, phone_number):
+                yield dumps(message) + b"\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation_{phone_number}.ndjson"'}
+    )
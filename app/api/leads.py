@@ -2,18 +2,33 @@
 API endpoints para gestión de leads
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.schemas.webhook import LeadCreate, LeadResponse
+from app.core.config import settings
+from app.core.serialization import FastJSONResponse
+from app.db.database import get_db, get_read_db
+from app.schemas.webhook import (
+    LeadCreate, LeadResponse, AIResponse, LeadBulkResult, LeadBulkError, LeadBulkStatusUpdate, LeadBulkStatusResult,
+)
 from app.models.lead import Lead, LeadStatusEnum, OperatorEnum
-from typing import List, Optional
+from app.services.lead_service import lead_service
+from app.services.lead_cache import lead_cache
+from app.services.template_service import template_service
+from app.services.stats_service import stats_service, status_metric
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/leads", tags=["Leads"])
 
+# Leads por commit en la carga masiva
+BULK_CHUNK_SIZE = 5000
+
 
 @router.post("/", response_model=LeadResponse, status_code=201)
 async def create_lead(lead_data: LeadCreate, db: Session = Depends(get_db)):
@@ -47,18 +62,209 @@ async def create_lead(lead_data: LeadCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(lead)
     
-    logger.info(f"✅ Lead creado manualmente: {lead.phone_number}")
+    logger.info("✅ Lead creado manualmente: %s", lead.phone_number)
     
     return lead
 
 
+@router.post("/bulk", response_model=LeadBulkResult)
+async def bulk_upsert_leads(request: Request, db: Session = Depends(get_db)):
+    """
+    Crear o actualizar leads en bloque
+    
+    Acepta un arreglo JSON de LeadCreate o NDJSON (un LeadCreate por línea, con
+    Content-Type application/x-ndjson), leído a medida que llega. Los números que ya
+    existen se actualizan sin cambiar su estado. Los elementos inválidos se reportan
+    en `errors` sin detener la carga.
+    
+    Args:
+        request: Petición con el cuerpo JSON o NDJSON
+        db: Sesión de base de datos
+    
+    Returns:
+        Totales y resultado por elemento, en el orden de entrada
+    """
+    results: List[Optional[str]] = []
+    errors: List[LeadBulkError] = []
+    valid: List[Tuple[int, LeadCreate]] = []
+    
+    async for index, item in _iter_bulk_items(request):
+        if index >= settings.BULK_LEADS_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Máximo {settings.BULK_LEADS_MAX_ITEMS} leads por petición"
+            )
+        results.append(None)
+        try:
+            valid.append((index, _validate_bulk_item(item)))
+        except ValueError as e:
+            results[index] = "error"
+            phone_number = item.get("phone_number") if isinstance(item, dict) else None
+            errors.append(LeadBulkError(index=index, phone_number=phone_number, detail=_error_detail(e)))
+    
+    # Guardar por tramos (un commit por tramo) fuera del event loop
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        try:
+            outcomes = await asyncio.to_thread(lead_service.upsert_leads, db, [lead_data for _, lead_data in chunk])
+        except Exception as e:
+            db.rollback()
+            logger.error("❌ Error en carga masiva (%s leads): %s", len(chunk), e)
+            outcomes = ["error"] * len(chunk)
+            errors.extend(
+                LeadBulkError(index=index, phone_number=lead_data.phone_number, detail="Error al guardar en la base de datos")
+                for index, lead_data in chunk
+            )
+        for (index, _), outcome in zip(chunk, outcomes):
+            results[index] = outcome
+    
+    errors.sort(key=lambda error: error.index)
+    
+    return LeadBulkResult(
+        total=len(results),
+        created=results.count("created"),
+        updated=results.count("updated"),
+        failed=len(errors),
+        results=results,
+        errors=errors
+    )
+
+
+@router.post("/bulk/status", response_model=LeadBulkStatusResult)
+async def bulk_update_lead_status(update_data: LeadBulkStatusUpdate, db: Session = Depends(get_db)):
+    """
+    Cambiar el estado de varios leads en una sola sentencia
+    
+    Se eligen por lista de números y/o filtros (estado actual, operador objetivo,
+    inactividad). Los leads cuyo estado no permite la transición no se modifican.
+    
+    Args:
+        update_data: Nuevo estado y criterios de selección
+        db: Sesión de base de datos
+    
+    Returns:
+        Números actualizados y números pedidos que no se actualizaron
+    """
+    try:
+        status = LeadStatusEnum(update_data.status)
+        current_status = (
+            [LeadStatusEnum(value) for value in update_data.current_status]
+            if update_data.current_status is not None else None
+        )
+        target_operator = OperatorEnum(update_data.target_operator) if update_data.target_operator else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Valor inválido: {str(e)}")
+    
+    # Sin lista ni filtros se cambiarían todos los leads
+    if (
+        update_data.phone_numbers is None and current_status is None
+        and target_operator is None and update_data.inactive_since is None
+    ):
+        raise HTTPException(status_code=400, detail="Indica phone_numbers o al menos un filtro")
+    
+    if update_data.phone_numbers is not None and len(update_data.phone_numbers) > settings.BULK_LEADS_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {settings.BULK_LEADS_MAX_ITEMS} leads por petición")
+    
+    updated = lead_service.bulk_update_status(
+        db,
+        status,
+        phone_numbers=update_data.phone_numbers,
+        current_status=current_status,
+        target_operator=target_operator,
+        inactive_since=update_data.inactive_since
+    )
+    
+    phone_numbers = [phone_number for phone_number, _ in updated]
+    updated_set = set(phone_numbers)
+    skipped = [phone for phone in update_data.phone_numbers or [] if phone not in updated_set]
+    
+    return LeadBulkStatusResult(
+        status=status.value,
+        updated=len(phone_numbers),
+        phone_numbers=phone_numbers,
+        skipped=skipped
+    )
+
+
+async def _iter_bulk_items(request: Request) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Leer los elementos de la carga masiva
+    
+    NDJSON se procesa línea por línea mientras llega el cuerpo; un arreglo JSON se lee
+    completo. Una línea NDJSON que no es JSON válido se entrega como texto y se reporta
+    como error de ese elemento.
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if "ndjson" not in content_type and "jsonl" not in content_type:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cuerpo JSON inválido")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON de leads")
+        for index, item in enumerate(items):
+            yield index, item
+        return
+    
+    index = 0
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_ndjson_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_ndjson_line(buffer)
+
+
+def _parse_ndjson_line(line: bytes) -> Any:
+    """Decodificar una línea NDJSON (texto original si no es JSON válido)"""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return line.decode("utf-8", errors="replace")
+
+
+def _validate_bulk_item(item: Any) -> LeadCreate:
+    """
+    Validar un elemento de la carga masiva
+    
+    Raises:
+        ValueError: Si no es un LeadCreate válido o el operador no existe
+    """
+    if isinstance(item, str):
+        raise ValueError("JSON inválido")
+    if not isinstance(item, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    
+    lead_data = LeadCreate.model_validate(item)
+    
+    for operator in (lead_data.target_operator, lead_data.current_operator):
+        if operator and operator not in OperatorEnum.__members__:
+            raise ValueError(f"Operador inválido: {operator}")
+    
+    return lead_data
+
+
+def _error_detail(error: ValueError) -> str:
+    """Mensaje corto de un error de validación"""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+        )
+    return str(error)
+
+
 @router.get("/", response_model=List[LeadResponse])
 async def list_leads(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = Query(None),
     target_operator: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Listar leads con filtros opcionales
@@ -68,28 +274,25 @@ async def list_leads(
         limit: Número máximo de registros a retornar
         status: Filtrar por estado (opcional)
         target_operator: Filtrar por operador objetivo (opcional)
-        db: Sesión de base de datos
+        db: Sesión de base de datos (réplica de lectura si está disponible)
     
     Returns:
         Lista de leads
     """
-    query = db.query(Lead)
-    
-    # Aplicar filtros
-    if status:
-        query = query.filter(Lead.status == LeadStatusEnum(status))
-    
-    if target_operator:
-        query = query.filter(Lead.target_operator == OperatorEnum(target_operator))
-    
-    # Paginación
-    leads = query.offset(skip).limit(limit).all()
+    leads = lead_service.list_leads(
+        db,
+        skip=skip,
+        limit=limit,
+        status=LeadStatusEnum(status) if status else None,
+        target_operator=OperatorEnum(target_operator) if target_operator else None
+    )
     
-    return leads
+    # Filas de la base de datos: se serializan directamente, sin validar con LeadResponse
+    return FastJSONResponse(leads)
 
 
 @router.get("/{phone_number}", response_model=LeadResponse)
-async def get_lead(phone_number: str, db: Session = Depends(get_db)):
+async def get_lead(phone_number: str, db: Session = Depends(get_read_db)):
     """
     Obtener un lead por número de teléfono
     
@@ -131,11 +334,20 @@ async def update_lead_status(
         raise HTTPException(status_code=404, detail="Lead no encontrado")
     
     try:
-        lead.status = LeadStatusEnum(status)
+        new_status = LeadStatusEnum(status)
+        if new_status != lead.status:
+            lead.status = new_status
+            lead.version = Lead.version + 1
+            if new_status == LeadStatusEnum.CONVERTED:
+                lead.converted_at = datetime.now(timezone.utc)
+            stats_service.increment(
+                db, [(datetime.now(timezone.utc), lead.target_operator.value, status_metric(new_status))]
+            )
         db.commit()
+        lead_cache.invalidate(phone_number)
         db.refresh(lead)
         
-        logger.info(f"✅ Estado actualizado: {phone_number} -> {status}")
+        logger.info("✅ Estado actualizado: %s -> %s", phone_number, status)
         
         return lead
         
@@ -143,8 +355,38 @@ async def update_lead_status(
         raise HTTPException(status_code=400, detail=f"Estado inválido: {status}")
 
 
+@router.post("/{phone_number}/opener", response_model=AIResponse)
+async def send_opener(phone_number: str, db: Session = Depends(get_db)):
+    """
+    Generar mensaje de primer contacto con plantilla (sin llamar a la IA)
+    
+    Args:
+        phone_number: Número de teléfono del lead
+        db: Sesión de base de datos
+    
+    Returns:
+        Mensaje de primer contacto y nuevo estado del lead
+    """
+    lead = db.query(Lead).filter(Lead.phone_number == phone_number).first()
+    
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead no encontrado")
+    
+    if lead.status != LeadStatusEnum.PENDING:
+        raise HTTPException(status_code=400, detail=f"Lead ya fue contactado (estado: {lead.status.value})")
+    
+    rendered = template_service.render_for_lead(lead)
+    lead_service.record_first_contact(db, lead, rendered.message, rendered.variant_id)
+    
+    return AIResponse(
+        phone_number=phone_number,
+        message=rendered.message,
+        lead_status=lead.status.value
+    )
+
+
 @router.get("/stats/summary")
-async def get_stats_summary(db: Session = Depends(get_db)):
+async def get_stats_summary(db: Session = Depends(get_read_db)):
     """
     Obtener resumen estadístico de leads
     
@@ -0,0 +1,108 @@
+"""
+API endpoints de estadísticas (series de tiempo desde los agregados)
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.db.database import get_read_db
+from app.services.stats_service import stats_service, step
+from app.services.usage_service import usage_service
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Literal, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+# Periodos máximos por consulta
+MAX_BUCKETS = 2000
+
+# Rango por defecto según la granularidad
+DEFAULT_RANGE = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+
+@router.get("/timeseries")
+async def get_timeseries(
+    granularity: Literal["hour", "day"] = Query("day"),
+    metric: Optional[List[str]] = Query(None, description="Métricas (messages.user, status.CONVERTED, ...)"),
+    operator: Optional[str] = Query(None, description="Operador objetivo (por defecto todos)"),
+    start: Optional[datetime] = Query(None, description="Inicio (por defecto 48 horas o 30 días atrás)"),
+    end: Optional[datetime] = Query(None, description="Fin (por defecto ahora)"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Series de tiempo de mensajes y cambios de estado por hora o por día
+    
+    Se leen solo de la tabla de agregados (`stats_rollups`), que se actualiza con cada
+    mensaje y cambio de estado; la conversión es la métrica `status.CONVERTED`.
+    
+    Args:
+        granularity: 'hour' o 'day'
+        metric: Métricas a incluir (por defecto todas las que tengan datos)
+        operator: Filtrar por operador objetivo
+        start: Inicio del rango (incluido)
+        end: Fin del rango (excluido)
+        db: Sesión de base de datos (réplica de lectura si está disponible)
+    
+    Returns:
+        Series por métrica, con un punto por periodo (ceros donde no hubo actividad)
+    """
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - DEFAULT_RANGE[granularity]
+    
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start debe ser anterior a end")
+    if (end - start) / step(granularity) > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BUCKETS} periodos por consulta")
+    
+    series = stats_service.timeseries(db, granularity, start, end, metrics=metric, operator=operator)
+    
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "operator": operator,
+        "series": series,
+    }
+
+
+@router.get("/costs")
+async def get_costs(
+    group_by: Literal["operator", "model", "prompt_version", "lead"] = Query("operator"),
+    start: Optional[date] = Query(None, description="Primer día (por defecto 30 días atrás)"),
+    end: Optional[date] = Query(None, description="Último día, incluido (por defecto hoy)"),
+    limit: int = Query(100, ge=1, le=1000, description="Grupos máximos (los de mayor costo)"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Consumo de la IA y costo por conversión
+    
+    Lee los totales diarios de `llm_usage` (tokens, tokens en caché, latencia) y los
+    precios de AI_PRICING_PER_MILLION. Una conversión es un lead con consumo en el rango
+    que pasó a CONVERTED en el mismo rango.
+    
+    Args:
+        group_by: operator, model, prompt_version o lead
+        start: Primer día (UTC)
+        end: Último día (UTC, incluido)
+        limit: Grupos máximos
+        db: Sesión de base de datos (réplica de lectura si está disponible)
+    
+    Returns:
+        Grupos con llamadas, tokens, costo, latencia promedio, conversiones y costo por conversión
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=30)
+    
+    if start > end:
+        raise HTTPException(status_code=400, detail="start debe ser anterior o igual a end")
+    
+    report = usage_service.cost_report(db, start, end + timedelta(days=1), group_by=group_by, limit=limit)
+    
+    return {"group_by": group_by, "start": start, "end": end, **report}
+
+
+def _as_utc(moment: datetime) -> datetime:
+    """Fechas sin zona horaria se interpretan como UTC"""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
@@ -2,15 +2,22 @@
 API endpoints para webhooks de WhatsApp
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.schemas.webhook import WhatsAppWebhook, AIResponse, WhatsAppMessage
 from app.services.ai_service import ai_service
 from app.services.lead_service import lead_service
+from app.services.session_store import session_store
+from app.services.conversation_writer import conversation_writer
+from app.services.phone_lock import phone_locks
+from app.services.traffic_recorder import traffic_recorder
 from app.models.lead import LeadStatusEnum
 from app.core.config import settings
+from app.core.metrics import observe_stage, webhook_messages_total, webhook_errors_total
+from typing import Optional
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +27,7 @@ router = APIRouter(prefix="/webhook", tags=["Webhook"])
 @router.post("/whatsapp", response_model=list[AIResponse])
 async def whatsapp_webhook(
     webhook: WhatsAppWebhook,
+    http_response: Response,
     db: Session = Depends(get_db),
     x_webhook_secret: str = Header(None)
 ):
@@ -28,6 +36,7 @@ async def whatsapp_webhook(
     
     Args:
         webhook: Datos del webhook
+        http_response: Respuesta HTTP (lleva X-Process-Time: ms de procesamiento en el servidor)
         db: Sesión de base de datos
         x_webhook_secret: Secret del webhook para autenticación
     
@@ -39,19 +48,34 @@ async def whatsapp_webhook(
         if x_webhook_secret != settings.WHATCHIM_WEBHOOK_SECRET:
             raise HTTPException(status_code=401, detail="Webhook secret inválido")
     
+    arrived_at = time.time()
+    started = time.perf_counter()
     responses = []
     
     for msg in webhook.messages:
         try:
-            # Procesar mensaje
-            response = await process_whatsapp_message(msg, db)
+            # Procesar mensaje (uno a la vez por número, en paralelo entre números)
+            async with phone_locks.hold(msg.from_number):
+                try:
+                    response = await process_whatsapp_message(msg, db)
+                finally:
+                    # Devolver la conexión al pool antes de ceder el event loop (ver save_conversation_message)
+                    db.close()
             responses.append(response)
+            webhook_messages_total.inc()
             
         except Exception as e:
-            logger.error(f"❌ Error procesando mensaje de {msg.from_number}: {str(e)}")
+            webhook_errors_total.inc()
+            logger.error("❌ Error procesando mensaje de %s: %s", msg.from_number, e)
             # Continuar con los demás mensajes
             continue
     
+    # Misma medida que guarda la grabación: scripts/replay_traffic.py compara ambas
+    latency_ms = (time.perf_counter() - started) * 1000
+    http_response.headers["X-Process-Time"] = f"{latency_ms:.2f}"
+    if traffic_recorder.running:
+        traffic_recorder.record(webhook, arrived_at, latency_ms, len(responses))
+    
     return responses
 
 
@@ -69,67 +93,112 @@ async def process_whatsapp_message(msg: WhatsAppMessage, db: Session) -> AIRespo
     phone_number = msg.from_number
     user_message = msg.message
     
-    logger.info(f"📱 Mensaje recibido de {phone_number}: {user_message[:50]}...")
+    logger.info("📱 Mensaje recibido de %s: %.50s...", phone_number, user_message)
     
-    # 1. Obtener o crear sesión
-    session = lead_service.get_or_create_session(db, phone_number)
+    # 1. Obtener o crear sesión (en memoria si el almacén write-behind está activo)
+    with observe_stage("session_lookup"):
+        if session_store.running:
+            session_store.touch(phone_number)
+        else:
+            lead_service.get_or_create_session(db, phone_number)
     
     # 2. Obtener o crear lead (por defecto target_operator = CLARO)
     # TODO: Detectar operador objetivo del mensaje o base de datos de leads
-    lead = lead_service.get_or_create_lead(db, phone_number, "CLARO")
+    with observe_stage("lead_lookup"):
+        lead = lead_service.get_lead_snapshot(db, phone_number, "CLARO")
     
     # 3. Guardar mensaje del usuario en historial
-    lead_service.add_conversation_message(
-        db,
-        phone_number=phone_number,
-        role="user",
-        content=user_message,
-        extra_data={"message_id": msg.message_id}
-    )
+    with observe_stage("db_write"):
+        await save_conversation_message(
+            db,
+            phone_number=phone_number,
+            role="user",
+            content=user_message,
+            extra_data={"message_id": msg.message_id},
+            operator=lead.target_operator.value
+        )
     
     # 4. Obtener historial de conversación
-    conversation_history = lead_service.get_conversation_history(db, phone_number)
+    with observe_stage("history_load"):
+        conversation_history = lead_service.get_conversation_history(
+            db, phone_number, include_archived=lead.archived_at is not None
+        )
     
     # 5. Generar respuesta con IA
-    system_prompt = ai_service.get_system_prompt(
-        target_operator=lead.target_operator.value,
-        current_operator=lead.current_operator.value if lead.current_operator else None
-    )
-    
-    ai_response_text = ai_service.generate_response(
-        conversation_history=conversation_history,
-        lead_info={
-            "phone_number": phone_number,
-            "target_operator": lead.target_operator.value,
-            "current_operator": lead.current_operator.value if lead.current_operator else None,
-        },
-        system_prompt=system_prompt
-    )
+    with observe_stage("prompt_build"):
+        system_prompt = ai_service.get_system_prompt(
+            target_operator=lead.target_operator.value,
+            current_operator=lead.current_operator.value if lead.current_operator else None
+        )
+        route = ai_service.route(user_message, conversation_history, lead.status.value, phone_number)
+    
+    with observe_stage("llm_call"):
+        ai_response_text = ai_service.generate_response(
+            conversation_history=conversation_history,
+            lead_info={
+                "phone_number": phone_number,
+                "target_operator": lead.target_operator.value,
+                "current_operator": lead.current_operator.value if lead.current_operator else None,
+            },
+            system_prompt=system_prompt,
+            route=route
+        )
     
     # 6. Guardar respuesta de la IA en historial
-    lead_service.add_conversation_message(
-        db,
-        phone_number=phone_number,
-        role="assistant",
-        content=ai_response_text
-    )
-    
-    # 7. Actualizar estado del lead
+    with observe_stage("db_write"):
+        await save_conversation_message(
+            db,
+            phone_number=phone_number,
+            role="assistant",
+            content=ai_response_text,
+            operator=lead.target_operator.value
+        )
+    
+    # 7. Actualizar estado del lead (solo si nadie lo cambió desde que se leyó)
+    lead_status = lead.status
     if lead.status == LeadStatusEnum.PENDING:
-        lead_service.update_lead_status(db, phone_number, LeadStatusEnum.CONTACTED)
+        with observe_stage("status_update"):
+            lead_status = lead_service.update_lead_status(
+                db, phone_number, LeadStatusEnum.CONTACTED, expected_version=lead.version
+            ).status
     
     # 8. Detectar intención (interesado, no interesado, etc.)
     # TODO: Implementar detección de intención con IA
     
-    logger.info(f"✅ Respuesta generada para {phone_number}")
+    logger.info("✅ Respuesta generada para %s", phone_number)
     
     return AIResponse(
         phone_number=phone_number,
         message=ai_response_text,
-        lead_status=lead.status.value
+        lead_status=lead_status.value
     )
 
 
+async def save_conversation_message(
+    db: Session,
+    phone_number: str,
+    role: str,
+    content: str,
+    extra_data: dict = None,
+    operator: Optional[str] = None
+) -> None:
+    """
+    Guardar un mensaje en el historial y esperar a que quede confirmado
+    
+    Con el escritor por lotes activo, el mensaje se agrupa con los de otras peticiones
+    en un solo INSERT y commit; si no, se guarda directamente con la sesión de la petición.
+    
+    Antes de esperar al escritor se cierra la transacción de la petición para devolver su
+    conexión al pool: el escritor usa otra y, si todas las peticiones retuvieran la suya
+    mientras esperan, el pool se agotaría.
+    """
+    if conversation_writer.running:
+        db.commit()
+        await conversation_writer.submit(phone_number, role, content, extra_data, operator)
+    else:
+        lead_service.add_conversation_message(db, phone_number, role, content, extra_data, operator)
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -3,7 +3,7 @@ Configuración de la aplicación AngIA V5.0
 """
 
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -18,6 +18,12 @@ class Settings(BaseSettings):
     ENVIRONMENT: Literal["development", "production"] = "development"
     DEBUG: bool = True
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["text", "json"] = "text"  # json: un objeto por línea
+    LOG_ASYNC: bool = True  # Escribir los logs desde un hilo en segundo plano (QueueListener)
+    LOG_SAMPLING: dict[str, float] = {}  # Fracción de INFO/DEBUG a conservar por logger, ej. {"app.api.webhook": 0.1}
+    DB_ECHO: bool = False  # Imprimir cada sentencia SQL (nunca en producción)
+    # Crear tablas al iniciar (None = solo fuera de producción; en producción el esquema ya existe)
+    AUTO_CREATE_SCHEMA: Optional[bool] = None
     
     # OpenAI API (IA)
     OPENAI_API_KEY: str = ""  # Se tomará del entorno
@@ -25,6 +31,26 @@ class Settings(BaseSettings):
     # PostgreSQL Database
     DATABASE_URL: str
     
+    # Réplica de solo lectura (opcional; vacío = todas las lecturas van al primario)
+    DATABASE_READ_URL: str = ""
+    DB_READ_MAX_LAG_SECONDS: float = 5.0  # Retraso máximo tolerado antes de leer del primario
+    DB_READ_HEALTH_TTL_SECONDS: float = 5.0  # Cada cuánto se vuelve a medir estado y retraso de la réplica
+    DB_READ_CONNECT_TIMEOUT_SECONDS: int = 3  # Espera máxima al conectar con la réplica (PostgreSQL)
+    
+    # Estrategia de conexiones
+    # - queue: pool persistente (servidor tradicional)
+    # - null: sin pool, para usar detrás de un pooler tipo pgbouncer (endpoint "-pooler" de Neon)
+    # - small: pool pequeño con edad máxima de conexión (serverless sin pooler externo)
+    DB_POOL_MODE: Literal["queue", "null", "small"] = "queue"
+    DB_POOL_SIZE: int = 5  # Tamaño del pool (modo queue)
+    DB_MAX_OVERFLOW: int = 10  # Conexiones adicionales permitidas (modo queue)
+    DB_SMALL_POOL_SIZE: int = 1  # Tamaño del pool (modo small)
+    DB_SMALL_MAX_OVERFLOW: int = 2  # Conexiones adicionales (modo small)
+    DB_POOL_RECYCLE_SECONDS: int = 300  # Edad máxima de una conexión (modo small)
+    DB_POOL_TIMEOUT_SECONDS: int = 30  # Espera máxima por una conexión del pool
+    DB_POOL_PRE_PING: bool = True  # Verificar conexión al sacarla del pool (modo queue)
+    DB_WARMUP: bool = True  # Abrir la primera conexión (TCP/TLS) al iniciar, en segundo plano
+    
     # WhatChimp API (WhatsApp)
     WHATCHIM_API_KEY: str = "pending"
     WHATCHIM_WEBHOOK_SECRET: str = "pending"
@@ -35,13 +61,72 @@ class Settings(BaseSettings):
     AI_TEMPERATURE: float = 0.7
     AI_MAX_TOKENS: int = 500
     
+    # Enrutamiento por turno: saludos y confirmaciones van a un modelo rápido con menos tokens
+    AI_ROUTING_ENABLED: bool = True
+    AI_FAST_MODEL: str = ""  # Modelo rápido (vacío = AI_MODEL, solo con menos tokens)
+    AI_FAST_MAX_TOKENS: int = 150  # max_tokens del modelo rápido
+    AI_ROUTING_LONG_MESSAGE_CHARS: int = 160  # Mensajes desde este largo van al modelo completo
+    AI_ROUTING_CACHE_TTL_SECONDS: float = 300.0  # Vigencia estimada de la caché de prompt del proveedor
+    
+    # Consumo y costos de la IA
+    AI_PROMPT_VERSION: str = "v1"  # Cambiar al modificar get_system_prompt (agrupa el consumo por versión)
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 10.0  # Cada cuánto se guardan los totales de tokens en llm_usage
+    USAGE_MAX_PENDING_KEYS: int = 50000  # Agregados máximos en memoria sin guardar (el exceso se descarta)
+    # USD por millón de tokens: prompt (sin caché), cached (leídos de la caché) y completion
+    AI_PRICING_PER_MILLION: dict[str, dict[str, float]] = {
+        "gpt-4o-mini": {"prompt": 0.15, "cached": 0.075, "completion": 0.60},
+        "gpt-4o": {"prompt": 2.50, "cached": 1.25, "completion": 10.00},
+    }
+    
     # Configuración de conversación
     MAX_CONVERSATION_HISTORY: int = 10  # Últimos 10 mensajes
     SESSION_TIMEOUT_MINUTES: int = 30
+    SESSION_WRITE_BEHIND: bool = True  # Sesiones en memoria, guardadas por lotes en segundo plano
+    SESSION_FLUSH_INTERVAL_SECONDS: float = 2.0  # Cada cuánto se guardan los contadores
+    SESSION_SWEEP_INTERVAL_SECONDS: float = 300.0  # Cada cuánto se borran las sesiones expiradas
+    LEAD_CACHE_MAX_ENTRIES: int = 10000  # Leads en la caché local por proceso (0 = deshabilitada)
+    LEAD_CACHE_TTL_SECONDS: float = 30.0  # Vigencia de cada lead en caché
+    CONVERSATION_GROUP_COMMIT: bool = True  # Guardar mensajes en lotes (un INSERT y un commit por lote)
+    CONVERSATION_FLUSH_MS: float = 5.0  # Espera máxima para juntar un lote
+    CONVERSATION_BATCH_MAX_ROWS: int = 200  # Filas máximas por lote
+    STATS_FLUSH_INTERVAL_SECONDS: float = 5.0  # Cada cuánto se suman los agregados a stats_rollups (0 = en cada cambio)
+    # Un mensaje a la vez por número: none, local (por proceso) o advisory (PostgreSQL, entre workers)
+    PHONE_LOCK_MODE: Literal["none", "local", "advisory"] = "local"
+    PHONE_LOCK_TIMEOUT_SECONDS: float = 30.0  # Espera máxima por el mensaje anterior del mismo número
+    PHONE_LOCK_POLL_MS: float = 50.0  # Intervalo entre intentos del advisory lock
+    PHONE_LOCK_DATABASE_URL: str = ""  # Conexión directa para el advisory lock (vacío = DATABASE_URL; no un pooler en modo transacción)
+    PHONE_LOCK_POOL_SIZE: int = 5  # Advisory locks simultáneos por proceso (pool propio, aparte del de las peticiones)
+    
+    # Grabación de tráfico del webhook para reproducirlo (scripts/replay_traffic.py)
+    TRAFFIC_RECORD_ENABLED: bool = False
+    TRAFFIC_RECORD_DIR: str = "traffic"  # Directorio local de las capturas
+    TRAFFIC_RECORD_MAX_BYTES: int = 50 * 1024 * 1024  # Tamaño de cada archivo antes de rotar (y comprimir)
+    TRAFFIC_RECORD_BACKUPS: int = 10  # Archivos rotados que se conservan por proceso
+    TRAFFIC_RECORD_SALT: str = ""  # Clave de los seudónimos de números (vacío = aleatoria, guardada en TRAFFIC_RECORD_DIR)
+    
+    # Carga masiva de leads
+    BULK_LEADS_MAX_ITEMS: int = 50000  # Máximo de leads por petición a POST /leads/bulk
+    
+    # Administración y perfilado bajo demanda
+    ADMIN_TOKEN: str = ""  # Vacío = endpoints /admin deshabilitados
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fracción de peticiones perfiladas al azar (0.0 - 1.0)
+    PROFILING_MAX_PROFILES: int = 50  # Perfiles guardados en memoria
     
     # Operadores soportados
     SUPPORTED_OPERATORS: list[str] = ["CLARO", "WOW", "WIN"]
     
+    @property
+    def sql_echo(self) -> bool:
+        """Si se imprime cada sentencia SQL (DB_ECHO, ignorado en producción)"""
+        return self.DB_ECHO and self.ENVIRONMENT != "production"
+    
+    @property
+    def should_create_schema(self) -> bool:
+        """Si se deben crear las tablas al iniciar la aplicación"""
+        if self.AUTO_CREATE_SCHEMA is not None:
+            return self.AUTO_CREATE_SCHEMA
+        return self.ENVIRONMENT != "production"
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
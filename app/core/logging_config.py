@@ -0,0 +1,138 @@
+"""
+Configuración de logging de la aplicación
+
+- Los registros pasan por un QueueHandler a un hilo en segundo plano (QueueListener)
+  que les da formato (texto o JSON) y los escribe; el request solo resuelve el mensaje
+  y encola, sin bloquear en stdout.
+- LOG_FORMAT=json escribe un objeto JSON por línea (para agregadores de logs).
+- LOG_SAMPLING reduce los mensajes INFO/DEBUG de alto volumen por logger; las
+  advertencias y errores se escriben siempre.
+
+Para que el formateo sea realmente diferido, los logs de las rutas calientes usan
+argumentos (`logger.info("Mensaje de %s", phone)`) en lugar de f-strings.
+"""
+
+from app.core.config import settings
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Atributos propios de LogRecord (el resto viene de `extra=` y se agrega al JSON)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+# Solo para resolver tracebacks antes de encolar (el formato de salida lo aplica el listener)
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    """Un objeto JSON por registro: ts, level, logger, message, extras y excepción"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Dejar pasar solo una fracción de los registros INFO/DEBUG de ciertos loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        """
+        Args:
+            rates: {nombre de logger: fracción a conservar (0.0 - 1.0)}; aplica también a sus hijos
+        """
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate >= 1.0 or random.random() < rate
+            name = name.rpartition(".")[0]
+        return True
+
+
+class _EnqueueHandler(QueueHandler):
+    """
+    QueueHandler que encola una copia del registro con el mensaje ya resuelto
+
+    Como el QueueHandler estándar, resuelve `msg % args` y el traceback en el hilo que
+    llama: el listener los escribiría más tarde, cuando los objetos de `args` pueden
+    haber cambiado. La copia conserva los campos de `extra=` para JSONFormatter; la
+    fecha, el nivel y el formato de salida (texto o JSON) quedan para el listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        if record.stack_info:
+            message = f"{message}\n{record.stack_info}"
+
+        prepared = copy.copy(record)
+        prepared.msg = message
+        prepared.message = message
+        prepared.args = None
+        prepared.exc_info = None
+        prepared.stack_info = None
+        return prepared
+
+
+def setup_logging() -> None:
+    """Configurar el logger raíz según LOG_LEVEL, LOG_FORMAT, LOG_ASYNC y LOG_SAMPLING"""
+    global _listener
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    if settings.LOG_ASYNC:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        handler: logging.Handler = _EnqueueHandler(log_queue)
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = output
+
+    # El muestreo se aplica antes de encolar, así lo descartado no cuesta nada más
+    handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, settings.LOG_LEVEL))
+
+
+def stop_logging() -> None:
+    """Escribir los registros pendientes y detener el hilo de logging"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
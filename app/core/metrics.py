@@ -0,0 +1,342 @@
+"""
+Métricas en formato Prometheus (sin dependencias externas)
+"""
+
+from app.core.profiling import span
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+import bisect
+import threading
+import time
+
+# Buckets por defecto en segundos (de 1ms a 30s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    """Escapar valor de label según el formato de texto de Prometheus"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Formatear labels como {a="1",b="2"}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    """Formatear número sin decimales innecesarios"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """Base para métricas con labels"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Convertir labels a una tupla ordenada según labelnames"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera labels {self.labelnames}, recibió {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+
+    def render(self) -> str:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monotónico"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Sin labels se exporta 0 desde el inicio, como hace prometheus_client
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Incrementar el contador"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Valor actual del contador"""
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [self._header()]
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n")
+        return "".join(lines)
+
+
+class Gauge(_Metric):
+    """Valor instantáneo que puede subir o bajar"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Sin labels se exporta 0 desde el inicio, como hace prometheus_client
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+
+    def set(self, value: float, **labels) -> None:
+        """Fijar el valor"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [self._header()]
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n")
+        return "".join(lines)
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por cada combinación de labels: [conteos por bucket..., +Inf], suma
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Registrar una observación"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Medir la duración de un bloque en segundos"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = [self._header()]
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}\n")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}\n")
+            lines.append(f"{self.name}_count{labels} {cumulative}\n")
+        return "".join(lines)
+
+
+class MetricsRegistry:
+    """Registro de métricas del proceso"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Crear (o recuperar) un contador"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Crear (o recuperar) un gauge"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Crear (o recuperar) un histograma"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Exportar todas las métricas en formato de texto de Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+# Registro global
+registry = MetricsRegistry()
+
+# Webhook
+webhook_stage_seconds = registry.histogram(
+    "angia_webhook_stage_seconds",
+    "Duración de cada etapa de process_whatsapp_message",
+    ("stage",)
+)
+webhook_messages_total = registry.counter(
+    "angia_webhook_messages_total",
+    "Mensajes de WhatsApp procesados correctamente"
+)
+webhook_errors_total = registry.counter(
+    "angia_webhook_errors_total",
+    "Mensajes de WhatsApp que fallaron al procesarse"
+)
+
+# IA
+llm_request_seconds = registry.histogram(
+    "angia_llm_request_seconds",
+    "Duración de las llamadas al modelo de lenguaje",
+    ("model", "tier")
+)
+llm_tokens_total = registry.counter(
+    "angia_llm_tokens_total",
+    "Tokens consumidos por el modelo de lenguaje",
+    ("model", "tier", "type")
+)
+llm_routes_total = registry.counter(
+    "angia_llm_routes_total",
+    "Turnos por tier de modelo elegido y motivo",
+    ("tier", "reason")
+)
+llm_fallback_responses_total = registry.counter(
+    "angia_llm_fallback_responses_total",
+    "Respuestas de respaldo enviadas porque falló la IA"
+)
+
+# Base de datos
+db_queries_total = registry.counter(
+    "angia_db_queries_total",
+    "Sentencias SQL ejecutadas"
+)
+db_connect_seconds = registry.histogram(
+    "angia_db_connect_seconds",
+    "Tiempo para abrir una conexión nueva (TCP/TLS + autenticación)"
+)
+db_pool_checkout_seconds = registry.histogram(
+    "angia_db_pool_checkout_seconds",
+    "Espera para obtener una conexión del pool (incluye pre-ping y conexión nueva)"
+)
+db_pool_connections = registry.gauge(
+    "angia_db_pool_connections",
+    "Conexiones del pool por engine y estado",
+    ("role", "state")
+)
+db_read_routing_total = registry.counter(
+    "angia_db_read_routing_total",
+    "Sesiones de solo lectura por destino y motivo",
+    ("target", "reason")
+)
+db_replica_lag_seconds = registry.gauge(
+    "angia_db_replica_lag_seconds",
+    "Último retraso medido de la réplica de lectura"
+)
+
+# Sesiones
+session_flush_seconds = registry.histogram(
+    "angia_session_flush_seconds",
+    "Duración de cada guardado por lotes de sesiones"
+)
+session_flush_rows_total = registry.counter(
+    "angia_session_flush_rows_total",
+    "Sesiones guardadas por el almacén write-behind"
+)
+session_store_entries = registry.gauge(
+    "angia_session_store_entries",
+    "Sesiones activas en memoria"
+)
+
+# Caché de leads
+lead_cache_requests_total = registry.counter(
+    "angia_lead_cache_requests_total",
+    "Consultas a la caché de leads por resultado (hit, miss, expired, stale)",
+    ("result",)
+)
+lead_cache_entries = registry.gauge(
+    "angia_lead_cache_entries",
+    "Leads en la caché local"
+)
+
+# Conversaciones
+conversation_flush_seconds = registry.histogram(
+    "angia_conversation_flush_seconds",
+    "Duración de cada INSERT por lotes de conversaciones (incluye commit)"
+)
+conversation_batch_rows = registry.histogram(
+    "angia_conversation_batch_rows",
+    "Mensajes guardados por lote",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+# Bloqueo por número
+phone_lock_wait_seconds = registry.histogram(
+    "angia_phone_lock_wait_seconds",
+    "Espera para procesar un mensaje mientras otro del mismo número está en curso",
+    ("mode",)
+)
+phone_lock_timeouts_total = registry.counter(
+    "angia_phone_lock_timeouts_total",
+    "Mensajes descartados por no obtener el bloqueo de su número a tiempo",
+    ("mode",)
+)
+
+# HTTP
+http_request_seconds = registry.histogram(
+    "angia_http_request_seconds",
+    "Latencia de las peticiones HTTP por ruta",
+    ("method", "route", "status")
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """
+    Medir una etapa del procesamiento del webhook (histograma + span del perfil activo)
+
+    Uso:
+    ```python
+    with observe_stage("lead_lookup"):
+        lead = lead_service.get_or_create_lead(...)
+    ```
+    """
+    with webhook_stage_seconds.time(stage=stage), span("stage", stage):
+        yield
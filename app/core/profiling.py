@@ -0,0 +1,228 @@
+"""
+Perfilado bajo demanda de peticiones (cProfile + árbol de spans SQL/IA)
+"""
+
+from app.core.config import settings
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+
+# Longitud máxima del SQL guardado en cada span
+MAX_STATEMENT_LENGTH = 500
+
+
+class Span:
+    """Tramo medido dentro de una petición perfilada"""
+
+    __slots__ = ("kind", "name", "attributes", "start", "end", "children")
+
+    def __init__(self, kind: str, name: str, attributes: Optional[dict] = None):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> dict:
+        """Serializar span (tiempos en ms relativos al inicio de la petición)"""
+        end = self.end if self.end is not None else time.perf_counter()
+        data = {
+            "kind": self.kind,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class RequestProfile:
+    """Perfil de una petición: spans y (opcionalmente) estadísticas de cProfile"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = next(self._ids)
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.created_at = datetime.now(timezone.utc)
+        self.root = Span("request", f"{method} {path}")
+        self._stack: List[Span] = [self.root]
+        self.status_code: Optional[int] = None
+        self.cprofile_stats: Optional[str] = None
+        self.sql_count = 0
+
+    def open_span(self, kind: str, name: str, attributes: Optional[dict] = None) -> Span:
+        """Abrir span hijo del span actual"""
+        opened = Span(kind, name, attributes)
+        self._stack[-1].children.append(opened)
+        self._stack.append(opened)
+        if kind == "sql":
+            self.sql_count += 1
+        return opened
+
+    def close_span(self, opened: Span) -> None:
+        """Cerrar span (y cualquier hijo que haya quedado abierto)"""
+        opened.end = time.perf_counter()
+        if opened in self._stack:
+            while self._stack and self._stack[-1] is not opened:
+                self._stack.pop().end = opened.end
+            self._stack.pop()
+
+    def finish(self, status_code: int) -> None:
+        """Cerrar el perfil"""
+        self.status_code = status_code
+        self.root.end = time.perf_counter()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return round((end - self.root.start) * 1000, 3)
+
+    def summary(self) -> dict:
+        """Resumen para listados"""
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "created_at": self.created_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "sql_count": self.sql_count,
+            "has_cprofile": self.cprofile_stats is not None,
+        }
+
+    def to_dict(self) -> dict:
+        """Perfil completo"""
+        data = self.summary()
+        data["spans"] = self.root.to_dict(self.root.start)
+        data["cprofile"] = self.cprofile_stats
+        return data
+
+
+class ProfileStore:
+    """Últimos N perfiles en memoria"""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: deque = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[RequestProfile]:
+        """Perfiles del más reciente al más antiguo"""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+# Perfil activo en el contexto de la petición actual (None si no se perfila)
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+# cProfile engancha el intérprete completo: solo una petición a la vez lo usa
+_cprofile_lock = threading.Lock()
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Perfil activo (o None)"""
+    return _current_profile.get()
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes) -> Iterator[None]:
+    """
+    Medir un tramo dentro de la petición perfilada (no hace nada si no hay perfil activo)
+
+    Uso:
+    ```python
+    with span("llm", settings.AI_MODEL):
+        response = client.chat.completions.create(...)
+    ```
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    opened = profile.open_span(kind, name, attributes)
+    try:
+        yield
+    finally:
+        profile.close_span(opened)
+
+
+def start_sql_span(statement: str) -> Optional[Span]:
+    """Abrir span SQL (usado por los eventos de SQLAlchemy)"""
+    profile = _current_profile.get()
+    if profile is None:
+        return None
+    return profile.open_span("sql", statement[:MAX_STATEMENT_LENGTH])
+
+
+def end_sql_span(opened: Optional[Span]) -> None:
+    """Cerrar span SQL"""
+    profile = _current_profile.get()
+    if profile is not None and opened is not None:
+        profile.close_span(opened)
+
+
+@contextmanager
+def profile_request(method: str, path: str, reason: str, store: Optional[ProfileStore] = None) -> Iterator[RequestProfile]:
+    """
+    Perfilar una petición completa
+
+    Se guardan siempre los spans; cProfile solo si ninguna otra petición lo está usando.
+    """
+    profile = RequestProfile(method, path, reason)
+    token = _current_profile.set(profile)
+
+    profiler = None
+    if _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield profile
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+            profile.cprofile_stats = _format_stats(profiler)
+        _current_profile.reset(token)
+        (store or profile_store).add(profile)
+
+
+def _format_stats(profiler: cProfile.Profile, limit: int = 40) -> str:
+    """Top de funciones por tiempo acumulado"""
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+# Almacén global de perfiles
+profile_store = ProfileStore(settings.PROFILING_MAX_PROFILES)
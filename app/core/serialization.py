@@ -0,0 +1,58 @@
+"""
+Serialización JSON rápida para respuestas grandes
+
+Usa orjson si está instalado (varias veces más rápido que json y sin pasar por
+jsonable_encoder); si no, json de la biblioteca estándar con el mismo resultado.
+Pensado para datos que vienen de la base de datos y no necesitan validarse de nuevo.
+
+El resultado es idéntico byte a byte al de JSONResponse con un response_model de
+pydantic (fechas UTC con sufijo Z, sin espacios, UTF-8 sin escapar).
+"""
+
+from fastapi.responses import Response
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+import json
+
+try:
+    import orjson
+except ImportError:  # Opcional: sin orjson se usa json
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Tipos que json no serializa por sí solo (mismo formato que orjson)"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        # Como pydantic y orjson con OPT_UTC_Z: UTC se escribe "Z" en lugar de "+00:00"
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Serializar a JSON (UTF-8, sin espacios)"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(Response):
+    """
+    Respuesta JSON serializada con `dumps`
+
+    Al devolverla directamente desde un endpoint, FastAPI no valida el contenido con el
+    response_model (que se mantiene solo para la documentación).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -2,23 +2,284 @@
 Configuración de base de datos PostgreSQL
 """
 
-from sqlalchemy import create_engine
+from fastapi import Header
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
-from contextlib import contextmanager
-from typing import Generator
-
-# Crear engine de SQLAlchemy
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # Verificar conexión antes de usar
-    pool_size=5,  # Tamaño del pool de conexiones
-    max_overflow=10,  # Conexiones adicionales permitidas
-    echo=settings.DEBUG,  # Log de SQL queries en modo debug
+from app.core.metrics import (
+    db_queries_total, db_connect_seconds, db_pool_checkout_seconds, db_pool_connections,
+    db_read_routing_total, db_replica_lag_seconds,
 )
+from app.core.profiling import start_sql_span, end_sql_span
+from contextlib import contextmanager
+from typing import Generator, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Los engines se crean en el primer uso (no al importar) para acelerar el arranque en frío
+_engine: Optional[Engine] = None
+_read_engine: Optional[Engine] = None
+_lock_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+# Estado de la réplica: (disponible, retraso en segundos, momento de la medición)
+_replica_state = {"available": False, "lag": None, "checked_at": 0.0}
+_replica_lock = threading.Lock()
+
+# Retraso de una réplica de PostgreSQL (0 si está al día o si es un primario)
+REPLICA_LAG_SQL = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+
+def get_engine() -> Engine:
+    """Obtener el engine de SQLAlchemy (se crea en la primera llamada)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(settings.DATABASE_URL)
+    return _engine
+
+
+def get_read_engine() -> Optional[Engine]:
+    """Obtener el engine de la réplica de lectura (None si no está configurada)"""
+    global _read_engine
+    if not settings.DATABASE_READ_URL:
+        return None
+    if _read_engine is None:
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = _create_engine(settings.DATABASE_READ_URL, role="replica")
+                event.listen(_read_engine, "handle_error", _replica_error)
+    return _read_engine
+
+
+def get_lock_engine() -> Engine:
+    """Obtener el engine de los advisory locks por número (PHONE_LOCK_DATABASE_URL o el primario)"""
+    global _lock_engine
+    if _lock_engine is None:
+        with _engine_lock:
+            if _lock_engine is None:
+                _lock_engine = _create_engine(settings.PHONE_LOCK_DATABASE_URL or settings.DATABASE_URL, role="lock")
+    return _lock_engine
+
+
+def _pool_options() -> dict:
+    """Opciones del pool según DB_POOL_MODE"""
+    if settings.DB_POOL_MODE == "null":
+        # Cada sesión abre y cierra su conexión; el pooler externo reutiliza las conexiones reales
+        return {"poolclass": NullPool}
+    
+    if settings.DB_POOL_MODE == "small":
+        # Pocas conexiones por instancia y renovadas por edad en lugar de pre-ping en cada checkout
+        return {
+            "pool_size": settings.DB_SMALL_POOL_SIZE,
+            "max_overflow": settings.DB_SMALL_MAX_OVERFLOW,
+            "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+            "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+            "pool_pre_ping": False,
+        }
+    
+    return {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,  # Verificar conexión antes de usar
+        "pool_size": settings.DB_POOL_SIZE,  # Tamaño del pool de conexiones
+        "max_overflow": settings.DB_MAX_OVERFLOW,  # Conexiones adicionales permitidas
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+
+def _create_engine(url: str, role: str = "primary") -> Engine:
+    """Crear engine de SQLAlchemy y registrar eventos de métricas/perfilado"""
+    if role == "lock":
+        # Cada advisory lock retiene su conexión mientras se procesa el mensaje: pool propio y
+        # acotado, para no quitarle conexiones a las peticiones ni al escritor de conversaciones
+        options = {
+            "pool_size": settings.PHONE_LOCK_POOL_SIZE,
+            "max_overflow": 0,
+            "pool_timeout": settings.PHONE_LOCK_TIMEOUT_SECONDS,
+            "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": True,
+        }
+    else:
+        options = _pool_options()
+    if role == "replica" and url.startswith("postgresql"):
+        # Una réplica caída debe fallar rápido para pasar la lectura al primario
+        options["connect_args"] = {"connect_timeout": settings.DB_READ_CONNECT_TIMEOUT_SECONDS}
+    new_engine = create_engine(
+        url,
+        echo=settings.sql_echo,  # Log de SQL queries (DB_ECHO, nunca en producción)
+        **options
+    )
+    event.listen(new_engine, "do_connect", _timed_connect)
+    event.listen(new_engine, "before_cursor_execute", _before_query)
+    event.listen(new_engine, "after_cursor_execute", _after_query)
+    event.listen(new_engine, "handle_error", _query_error)
+    logger.info("🔌 Engine %s creado (pool: %s)", role, settings.DB_POOL_MODE)
+    return new_engine
+
+
+def __getattr__(name: str):
+    """Compatibilidad: `from app.db.database import engine` crea el engine al usarse"""
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _replica_error(context):
+    """Si la réplica se desconecta, enviar las lecturas al primario hasta la próxima medición"""
+    if context.is_disconnect:
+        _mark_replica_down()
+        logger.warning("⚠️ Réplica de lectura desconectada, usando primario")
+
+
+def _mark_replica_down() -> None:
+    """Marcar la réplica como no disponible hasta la próxima medición (DB_READ_HEALTH_TTL_SECONDS)"""
+    with _replica_lock:
+        _replica_state.update(available=False, checked_at=time.monotonic())
+
+
+def _timed_connect(dialect, conn_rec, cargs, cparams):
+    """Abrir la conexión DBAPI midiendo el tiempo (TCP/TLS + autenticación)"""
+    start = time.perf_counter()
+    connection = dialect.connect(*cargs, **cparams)
+    db_connect_seconds.observe(time.perf_counter() - start)
+    return connection
+
+
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    """Abrir span SQL si la petición se está perfilando"""
+    conn.info.setdefault("profiling_spans", []).append(start_sql_span(statement))
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    """Contar sentencias SQL para las métricas y cerrar el span"""
+    db_queries_total.inc()
+    spans = conn.info.get("profiling_spans")
+    if spans:
+        end_sql_span(spans.pop())
+
+
+def _query_error(context):
+    """Cerrar el span SQL de una sentencia que falló"""
+    conn = context.connection
+    spans = conn.info.get("profiling_spans") if conn is not None else None
+    if spans:
+        end_sql_span(spans.pop())
+
+
+# Crear SessionLocal (el engine se asigna en cada sesión con bind=get_engine())
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _open_session(engine: Optional[Engine] = None) -> Session:
+    """Crear sesión y obtener su conexión midiendo la espera del pool"""
+    db = SessionLocal(bind=engine or get_engine())
+    start = time.perf_counter()
+    try:
+        db.connection()
+    except Exception:
+        db.close()
+        raise
+    db_pool_checkout_seconds.observe(time.perf_counter() - start)
+    return db
+
+
+def replica_available() -> bool:
+    """
+    Verificar si la réplica está disponible y con retraso aceptable
+    
+    El resultado se guarda DB_READ_HEALTH_TTL_SECONDS para no medir en cada petición.
+    """
+    read_engine = get_read_engine()
+    if read_engine is None:
+        return False
+    
+    now = time.monotonic()
+    if now - _replica_state["checked_at"] < settings.DB_READ_HEALTH_TTL_SECONDS:
+        return _replica_state["available"]
+    
+    with _replica_lock:
+        if now - _replica_state["checked_at"] < settings.DB_READ_HEALTH_TTL_SECONDS:
+            return _replica_state["available"]
+        
+        try:
+            with read_engine.connect() as conn:
+                if read_engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+            available = lag <= settings.DB_READ_MAX_LAG_SECONDS
+            db_replica_lag_seconds.set(lag)
+            if not available:
+                logger.warning("⚠️ Réplica con retraso de %.1fs, usando primario", lag)
+        except Exception as e:
+            lag = None
+            available = False
+            logger.warning("⚠️ Réplica de lectura no disponible: %s", e)
+        
+        _replica_state.update(available=available, lag=lag, checked_at=time.monotonic())
+        return available
+
 
-# Crear SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def warm_up() -> None:
+    """Abrir una conexión (TCP/TLS) por adelantado para que la primera petición no la pague"""
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        logger.info("🔥 Conexión a base de datos precalentada")
+    except Exception as e:
+        logger.warning("⚠️ No se pudo precalentar la conexión: %s", e)
+
+
+def _engine_pool_status(engine: Engine, role: str) -> dict:
+    """Estado del pool de un engine (y gauges de /metrics)"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+        db_pool_connections.set(pool.checkedin(), role=role, state="idle")
+        db_pool_connections.set(pool.checkedout(), role=role, state="in_use")
+    
+    return status
+
+
+def pool_status() -> dict:
+    """Estado de los pools y de la réplica (también actualiza los gauges de /metrics)"""
+    status = {"mode": settings.DB_POOL_MODE, "primary": None, "replica": None}
+    
+    if _engine is not None:
+        status["primary"] = _engine_pool_status(_engine, "primary")
+    
+    if settings.DATABASE_READ_URL:
+        status["replica"] = {
+            "available": _replica_state["available"],
+            "lag_seconds": _replica_state["lag"],
+        }
+        if _read_engine is not None:
+            status["replica"].update(_engine_pool_status(_read_engine, "replica"))
+    
+    if _lock_engine is not None:
+        status["lock"] = _engine_pool_status(_lock_engine, "lock")
+    
+    return status
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -31,8 +292,58 @@ def get_db() -> Generator[Session, None, None]:
     def read_root(db: Session = Depends(get_db)):
         ...
     ```
+    
+    La conexión se toma del pool recién con la primera consulta. FastAPI resuelve esta
+    dependencia en su threadpool: si la tomara aquí, las peticiones en espera retendrían
+    conexiones mientras el event loop se bloquea pidiendo otra, y el pool se agotaría.
     """
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(
+    x_read_your_writes: Optional[str] = Header(None)
+) -> Generator[Session, None, None]:
+    """
+    Dependency para obtener sesión de solo lectura
+    
+    Usa la réplica (DATABASE_READ_URL) salvo que no esté configurada, esté caída o
+    atrasada más de DB_READ_MAX_LAG_SECONDS, o que la petición envíe el header
+    `X-Read-Your-Writes: 1` para ver sus propias escrituras recientes. Si la réplica
+    falla al conectar entre dos mediciones, la sesión se abre en el primario y la
+    réplica queda marcada como no disponible.
+    
+    Uso en FastAPI:
+    ```python
+    @router.get("/")
+    def list_items(db: Session = Depends(get_read_db)):
+        ...
+    ```
+    """
+    if get_read_engine() is None:
+        reason = "no_replica"
+    elif x_read_your_writes and x_read_your_writes.lower() in ("1", "true", "yes"):
+        reason = "read_your_writes"
+    elif not replica_available():
+        reason = "replica_unavailable"
+    else:
+        reason = "replica"
+    
+    db = None
+    if reason == "replica":
+        try:
+            db = _open_session(get_read_engine())
+        except DBAPIError as e:
+            _mark_replica_down()
+            reason = "replica_unavailable"
+            logger.warning("⚠️ Réplica de lectura no disponible, usando primario: %s", e)
+    if db is None:
+        db = _open_session()
+    
+    db_read_routing_total.inc(target="replica" if reason == "replica" else "primary", reason=reason)
     try:
         yield db
     finally:
@@ -50,7 +361,7 @@ def get_db_context():
         lead = db.query(Lead).first()
     ```
     """
-    db = SessionLocal()
+    db = _open_session()
     try:
         yield db
     finally:
@@ -58,14 +369,59 @@ def get_db_context():
 
 
 def init_db():
-    """Inicializar base de datos (crear tablas)"""
+    """Inicializar base de datos (crear tablas y agregar columnas nuevas)"""
     from app.models.lead import Base
-    Base.metadata.create_all(bind=engine)
+    from app.db.fulltext import ensure_fulltext_index
+    Base.metadata.create_all(bind=get_engine())
+    add_missing_columns(Base.metadata)
+    ensure_fulltext_index(get_engine())
     print("✅ Base de datos inicializada correctamente")
 
 
+def add_missing_columns(metadata) -> list:
+    """
+    Agregar a tablas existentes las columnas nuevas del modelo (migración aditiva)
+    
+    create_all no modifica tablas que ya existen. Solo se agregan columnas que admiten
+    NULL o tienen valor por defecto en el servidor, para no fallar con filas existentes.
+    
+    Returns:
+        Columnas agregadas ("tabla.columna")
+    """
+    engine = get_engine()
+    inspector = inspect(engine)
+    compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    added = []
+    
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.computed is not None:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning("⚠️ Columna %s.%s requiere migración manual", table.name, column.name)
+                    continue
+                
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {compiler.get_column_default_string(column)}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                connection.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    
+    for name in added:
+        logger.info("✅ Columna agregada: %s", name)
+    return added
+
+
 def drop_db():
     """Eliminar todas las tablas (usar con precaución)"""
     from app.models.lead import Base
-    Base.metadata.drop_all(bind=engine)
+    from app.db.fulltext import drop_fulltext_index
+    drop_fulltext_index(get_engine())
+    Base.metadata.drop_all(bind=get_engine())
     print("⚠️ Todas las tablas han sido eliminadas")
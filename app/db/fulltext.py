@@ -0,0 +1,93 @@
+"""
+Índice de búsqueda de texto completo sobre conversations.content
+
+- PostgreSQL: columna generada `content_tsv` (configuración 'spanish') con índice GIN.
+- SQLite: tabla virtual FTS5 `conversations_fts` sincronizada con triggers (uso local y pruebas).
+
+El índice no forma parte de los modelos porque depende del dialecto; lo crea init_db().
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configuración de texto de PostgreSQL (stemming y stopwords en español)
+TEXT_SEARCH_CONFIG = "spanish"
+
+POSTGRES_DDL = [
+    f"""
+    ALTER TABLE conversations ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(content, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_conversations_content_tsv ON conversations USING GIN (content_tsv)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        content, content='conversations', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF content ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO conversations_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+
+def ensure_fulltext_index(engine: Engine) -> bool:
+    """
+    Crear el índice de texto completo si no existe
+
+    En PostgreSQL agregar la columna generada reescribe la tabla; en tablas grandes
+    conviene ejecutarlo en una ventana de mantenimiento.
+
+    Args:
+        engine: Engine del primario
+
+    Returns:
+        True si el dialecto tiene índice de texto completo
+    """
+    dialect = engine.dialect.name
+
+    if dialect == "postgresql":
+        with engine.begin() as connection:
+            for ddl in POSTGRES_DDL:
+                connection.execute(text(ddl))
+        return True
+
+    if dialect == "sqlite":
+        with engine.begin() as connection:
+            existed = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations_fts'")
+            ).first() is not None
+            for ddl in SQLITE_DDL:
+                connection.execute(text(ddl))
+            # Indexar los mensajes que ya existían antes de crear la tabla virtual
+            if not existed:
+                connection.execute(text("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')"))
+        return True
+
+    logger.warning("⚠️ Búsqueda de texto completo no disponible para el dialecto %s", dialect)
+    return False
+
+
+def drop_fulltext_index(engine: Engine) -> None:
+    """Eliminar el índice de SQLite (en PostgreSQL se elimina junto con la tabla)"""
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS conversations_fts"))
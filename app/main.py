@@ -2,18 +2,28 @@
 Aplicación principal de FastAPI - AngIA V5.0
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
-from app.api import webhook, leads
-from app.db.database import init_db
+from app.core.logging_config import setup_logging
+from app.core.metrics import registry as metrics_registry, http_request_seconds
+from app.core.profiling import profile_request
+from app.api import webhook, leads, admin, stats, conversations
+from app.db.database import init_db, warm_up, pool_status
+from app.services.session_store import session_store
+from app.services.conversation_writer import conversation_writer
+from app.services.stats_service import rollup_recorder
+from app.services.usage_service import usage_recorder
+from app.services.traffic_recorder import traffic_recorder
+import asyncio
+import hmac
 import logging
+import random
+import time
 
-# Configurar logging
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Configurar logging (hilo en segundo plano, texto o JSON, muestreo por logger)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -35,29 +45,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Registrar latencia HTTP por ruta (plantilla de ruta, no la URL concreta)"""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code
+        )
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    Perfilar peticiones bajo demanda
+    
+    Se activa con el header X-Profile-Token (igual a ADMIN_TOKEN) o por muestreo
+    (PROFILING_SAMPLE_RATE). Los perfiles se consultan en /admin/profiles.
+    """
+    reason = None
+    profile_token = request.headers.get("x-profile-token")
+    if profile_token and settings.ADMIN_TOKEN and hmac.compare_digest(profile_token, settings.ADMIN_TOKEN):
+        reason = "header"
+    elif settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+        reason = "sampled"
+    
+    if reason is None:
+        return await call_next(request)
+    
+    with profile_request(request.method, request.url.path, reason) as profile:
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            profile.finish(status_code)
+    
+    response.headers["X-Profile-Id"] = str(profile.id)
+    return response
+
+
 # Incluir routers
 app.include_router(webhook.router)
 app.include_router(leads.router)
+app.include_router(conversations.router)
+app.include_router(stats.router)
+app.include_router(admin.router)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Evento de inicio de la aplicación"""
-    logger.info(f"🚀 Iniciando {settings.APP_NAME} v{settings.APP_VERSION}")
-    logger.info(f"🌍 Entorno: {settings.ENVIRONMENT}")
+    logger.info("🚀 Iniciando %s v%s", settings.APP_NAME, settings.APP_VERSION)
+    logger.info("🌍 Entorno: %s", settings.ENVIRONMENT)
     
-    # Inicializar base de datos
-    try:
-        init_db()
-        logger.info("✅ Base de datos inicializada")
-    except Exception as e:
-        logger.error(f"❌ Error al inicializar base de datos: {str(e)}")
+    # Precalentar la primera conexión (TCP/TLS) en segundo plano mientras llega la primera petición
+    if settings.DB_WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+    
+    # Inicializar base de datos (en producción se omite: create_all inspecciona el esquema en cada arranque en frío)
+    if settings.should_create_schema:
+        try:
+            init_db()
+            logger.info("✅ Base de datos inicializada")
+        except Exception as e:
+            logger.error("❌ Error al inicializar base de datos: %s", e)
+    else:
+        logger.info("⏭️ Creación de esquema omitida (AUTO_CREATE_SCHEMA)")
+    
+    # Sesiones en memoria con guardado por lotes
+    if settings.SESSION_WRITE_BEHIND:
+        session_store.start()
+    
+    # Mensajes de conversación guardados por lotes (group commit)
+    if settings.CONVERSATION_GROUP_COMMIT:
+        conversation_writer.start()
+    
+    # Agregados de estadísticas guardados por lotes
+    rollup_recorder.start()
+    
+    # Totales de tokens y latencia de la IA guardados por lotes
+    usage_recorder.start()
+    
+    # Grabación opcional del tráfico del webhook
+    if settings.TRAFFIC_RECORD_ENABLED:
+        traffic_recorder.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento de cierre de la aplicación"""
-    logger.info(f"👋 Cerrando {settings.APP_NAME}")
+    # Guardar mensajes y sesiones pendientes antes de salir
+    await conversation_writer.stop()
+    await session_store.stop()
+    await rollup_recorder.stop()
+    await usage_recorder.stop()
+    traffic_recorder.stop()
+    logger.info("👋 Cerrando %s", settings.APP_NAME)
 
 
 @app.get("/")
@@ -84,6 +178,13 @@ async def health_check():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato Prometheus"""
+    pool_status()
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/debug/env")
 async def debug_env():
     """Debug endpoint para verificar variables de entorno"""
@@ -2,7 +2,10 @@
 Modelos de base de datos para AngIA V5.0
 """
 
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, Enum as SQLEnum, JSON
+from sqlalchemy import (
+    Column, String, Integer, BigInteger, Date, DateTime, Text, Boolean, Enum as SQLEnum, JSON, LargeBinary,
+    UniqueConstraint,
+)
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 import enum
@@ -49,11 +52,15 @@ class Lead(Base):
     notes = Column(Text, nullable=True)
     extra_data = Column(JSON, nullable=True)  # Datos adicionales flexibles
     
+    # Versión: se incrementa en cada cambio de estado (detecta copias en caché desactualizadas)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
     last_contacted_at = Column(DateTime(timezone=True), nullable=True)
     converted_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=True)  # Último archivo de sus mensajes (None = sin archivo)
 
 
 class Conversation(Base):
@@ -76,6 +83,27 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 
+class ConversationArchive(Base):
+    """Modelo de archivo de conversaciones (mensajes antiguos de un lead, comprimidos)"""
+    __tablename__ = "conversation_archives"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Lead y rango de los mensajes archivados
+    phone_number = Column(String(20), index=True, nullable=False)
+    first_message_at = Column(DateTime(timezone=True), nullable=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=False)
+    message_count = Column(Integer, nullable=False)
+    
+    # Mensajes en JSON Lines comprimidos ('zstd' o 'zlib')
+    codec = Column(String(10), nullable=False)
+    raw_bytes = Column(BigInteger, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 class Session(Base):
     """Modelo de Sesión (para rate limiting y control)"""
     __tablename__ = "sessions"
@@ -93,3 +121,47 @@ class Session(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
     expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class StatsRollup(Base):
+    """Modelo de agregados de estadísticas por periodo (hora o día) y operador"""
+    __tablename__ = "stats_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "metric", "operator", "bucket", name="uq_stats_rollups_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Periodo: 'hour' o 'day', con el inicio del periodo en UTC
+    granularity = Column(String(5), nullable=False)
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    
+    # Operador objetivo del lead y métrica ('messages.user', 'status.CONVERTED', ...)
+    operator = Column(String(10), nullable=False)
+    metric = Column(String(40), nullable=False)
+    
+    count = Column(Integer, default=0, nullable=False)
+
+
+class LlmUsage(Base):
+    """Modelo de consumo de la IA agregado por día, lead, operador, modelo y versión de prompt"""
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        UniqueConstraint("day", "phone_number", "operator", "model", "prompt_version", name="uq_llm_usage_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Clave del agregado (día en UTC)
+    day = Column(Date, index=True, nullable=False)
+    phone_number = Column(String(20), index=True, nullable=False)
+    operator = Column(String(10), nullable=False)
+    model = Column(String(60), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    
+    # Totales del día
+    calls = Column(Integer, default=0, nullable=False)
+    prompt_tokens = Column(BigInteger, default=0, nullable=False)
+    completion_tokens = Column(BigInteger, default=0, nullable=False)
+    cached_tokens = Column(BigInteger, default=0, nullable=False)  # Parte de prompt_tokens leída de la caché
+    latency_ms = Column(BigInteger, default=0, nullable=False)  # Suma de la latencia de las llamadas
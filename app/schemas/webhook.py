@@ -74,3 +74,49 @@ class LeadResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class LeadBulkError(BaseModel):
+    """Error de un elemento de la carga masiva"""
+    index: int = Field(..., description="Posición del elemento en la entrada (desde 0)")
+    phone_number: Optional[str] = Field(default=None, description="Número de teléfono, si se pudo leer")
+    detail: str = Field(..., description="Motivo del error")
+
+
+class LeadBulkResult(BaseModel):
+    """Schema para respuesta de carga masiva de leads"""
+    total: int = Field(..., description="Elementos recibidos")
+    created: int = Field(..., description="Leads creados")
+    updated: int = Field(..., description="Leads existentes actualizados")
+    failed: int = Field(..., description="Elementos con error")
+    results: List[str] = Field(..., description="Resultado por elemento, en el orden de entrada: created, updated o error")
+    errors: List[LeadBulkError] = Field(default_factory=list, description="Detalle de los elementos con error")
+
+
+class LeadBulkStatusUpdate(BaseModel):
+    """Schema para cambio de estado en bloque (por lista de números y/o filtros)"""
+    status: str = Field(..., description="Nuevo estado")
+    phone_numbers: Optional[List[str]] = Field(default=None, description="Números de teléfono a actualizar")
+    current_status: Optional[List[str]] = Field(default=None, description="Solo leads en alguno de estos estados")
+    target_operator: Optional[str] = Field(default=None, description="Solo leads de este operador objetivo")
+    inactive_since: Optional[datetime] = Field(default=None, description="Solo leads sin cambios desde esta fecha")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "status": "FAILED",
+                "current_status": ["CONTACTED"],
+                "inactive_since": "2025-11-01T00:00:00Z"
+            }
+        }
+
+
+class LeadBulkStatusResult(BaseModel):
+    """Schema para respuesta de cambio de estado en bloque"""
+    status: str = Field(..., description="Estado aplicado")
+    updated: int = Field(..., description="Leads actualizados")
+    phone_numbers: List[str] = Field(..., description="Números actualizados")
+    skipped: List[str] = Field(
+        default_factory=list,
+        description="Números pedidos que no se actualizaron (no existen o la transición no es válida)"
+    )
@@ -2,28 +2,151 @@
 Servicio de IA usando Manus API (OpenAI-compatible)
 """
 
-from openai import OpenAI
 from app.core.config import settings
-from typing import List, Dict
+from app.core.metrics import llm_request_seconds, llm_tokens_total, llm_fallback_responses_total, llm_routes_total
+from app.core.profiling import span
+from app.services.usage_service import usage_recorder
+from app.templates.operators import OPERATOR_BENEFITS
+from collections import OrderedDict
+from typing import List, Dict, NamedTuple, Optional
 import logging
+import re
+import threading
+import time
+import unicodedata
 
 logger = logging.getLogger(__name__)
 
+# Mensajes que no necesitan el modelo completo (saludos, confirmaciones, despedidas)
+TRIVIAL_PATTERN = re.compile(
+    r"^(hola|buenas|buenos dias|buenas tardes|buenas noches|ok|okey|ya|si|no|gracias|muchas gracias|"
+    r"ok gracias|listo|perfecto|dale|chao|adios|bien|genial|entendido|de acuerdo|claro)[\s!.?👍🙏😊]*$"
+)
+
+# Palabras que indican una pregunta que requiere el modelo completo
+COMPLEX_KEYWORDS = (
+    "compar", "diferencia", "mejor", "precio", "cuanto", "cuesta", "plan", "cobertura", "velocidad",
+    "megas", "contrato", "portabilidad", "penalidad", "factura", "por que", "porque", "como funciona",
+)
+
+# Máximo de números con caché de prompt registrada
+WARM_CACHE_MAX_ENTRIES = 10000
+
+
+class ModelRoute(NamedTuple):
+    """Modelo elegido para un turno"""
+    tier: str  # fast | full
+    model: str
+    max_tokens: int
+    reason: str  # trivial, complex, long, opening, interested, warm_cache, default, disabled
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para comparar palabras clave"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char)).strip()
+
 
 class AIService:
     """Servicio de IA para generar respuestas inteligentes"""
     
     def __init__(self):
-        """Inicializar cliente de OpenAI (usando Gemini del sandbox)"""
-        # El cliente OpenAI tomará OPENAI_API_KEY y OPENAI_BASE_URL del entorno
-        self.client = OpenAI()
-        logger.info("✅ AIService inicializado con OpenAI (Gemini 2.5 Flash)")
+        """Inicializar servicio (el cliente de OpenAI se crea en la primera llamada)"""
+        self._client = None
+        self._client_lock = threading.Lock()
+        # Último modelo completo usado por número: {teléfono: vencimiento de su caché de prompt}
+        self._warm: "OrderedDict[str, float]" = OrderedDict()
+        self._warm_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """
+        Cliente de OpenAI (usando Gemini del sandbox)
+        
+        Importar `openai` toma cientos de ms; se difiere hasta la primera respuesta
+        de la IA para no pagarlo en el arranque en frío.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    # El cliente OpenAI tomará OPENAI_API_KEY y OPENAI_BASE_URL del entorno
+                    self._client = OpenAI()
+                    logger.info("✅ AIService inicializado con OpenAI (Gemini 2.5 Flash)")
+        return self._client
+    
+    def route(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]],
+        lead_status: Optional[str] = None,
+        phone_number: Optional[str] = None
+    ) -> ModelRoute:
+        """
+        Elegir modelo y max_tokens del turno con señales locales (sin llamar a la IA)
+        
+        Van al modelo completo: la primera respuesta de la conversación, preguntas con
+        palabras clave de planes/precios/comparación, mensajes largos y leads interesados.
+        Van al rápido: saludos y confirmaciones cortas. El resto va al rápido, salvo que el
+        modelo completo haya respondido a este número hace poco (su caché de prompt sigue
+        vigente y el historial ya está en ella).
+        
+        Args:
+            user_message: Mensaje actual del usuario
+            conversation_history: Historial (incluye el mensaje actual)
+            lead_status: Estado actual del lead (opcional)
+            phone_number: Número de teléfono, para la caché de prompt (opcional)
+        
+        Returns:
+            ModelRoute con tier, modelo, max_tokens y motivo
+        """
+        if not settings.AI_ROUTING_ENABLED:
+            return self._route("full", "disabled")
+        
+        # La primera respuesta presenta la oferta: siempre con el modelo completo
+        if not any(message["role"] == "assistant" for message in conversation_history):
+            return self._route("full", "opening")
+        
+        text = _normalize(user_message)
+        if TRIVIAL_PATTERN.match(text):
+            return self._route("fast", "trivial")
+        if any(keyword in text for keyword in COMPLEX_KEYWORDS):
+            return self._route("full", "complex")
+        if len(text) >= settings.AI_ROUTING_LONG_MESSAGE_CHARS:
+            return self._route("full", "long")
+        if lead_status == "INTERESTED":
+            return self._route("full", "interested")
+        if phone_number and self._is_warm(phone_number):
+            return self._route("full", "warm_cache")
+        return self._route("fast", "default")
+    
+    def _route(self, tier: str, reason: str) -> ModelRoute:
+        """Construir la ruta de un tier y contarla"""
+        llm_routes_total.inc(tier=tier, reason=reason)
+        if tier == "fast":
+            return ModelRoute(tier, settings.AI_FAST_MODEL or settings.AI_MODEL, settings.AI_FAST_MAX_TOKENS, reason)
+        return ModelRoute(tier, settings.AI_MODEL, settings.AI_MAX_TOKENS, reason)
+    
+    def _is_warm(self, phone_number: str) -> bool:
+        """Si el modelo completo respondió a este número dentro de AI_ROUTING_CACHE_TTL_SECONDS"""
+        with self._warm_lock:
+            expires = self._warm.get(phone_number)
+            return expires is not None and expires > time.monotonic()
+    
+    def _mark_warm(self, phone_number: str) -> None:
+        """Registrar que el modelo completo tiene el prompt de este número en caché"""
+        with self._warm_lock:
+            self._warm[phone_number] = time.monotonic() + settings.AI_ROUTING_CACHE_TTL_SECONDS
+            self._warm.move_to_end(phone_number)
+            while len(self._warm) > WARM_CACHE_MAX_ENTRIES:
+                self._warm.popitem(last=False)
     
     def generate_response(
         self,
         conversation_history: List[Dict[str, str]],
         lead_info: Dict[str, any],
-        system_prompt: str
+        system_prompt: str,
+        route: Optional[ModelRoute] = None
     ) -> str:
         """
         Generar respuesta inteligente basada en el contexto
@@ -32,10 +155,14 @@ class AIService:
             conversation_history: Historial de conversación [{"role": "user", "content": "..."}]
             lead_info: Información del lead (operador actual, target, etc.)
             system_prompt: Prompt del sistema con instrucciones
+            route: Modelo y max_tokens elegidos con `route` (por defecto el modelo completo)
         
         Returns:
             Respuesta generada por la IA
         """
+        if route is None:
+            route = ModelRoute("full", settings.AI_MODEL, settings.AI_MAX_TOKENS, "default")
+        
         try:
             # Construir mensajes para la API
             messages = [
@@ -46,21 +173,49 @@ class AIService:
             messages.extend(conversation_history[-settings.MAX_CONVERSATION_HISTORY:])
             
             # Llamar a Manus API (compatible con OpenAI)
-            response = self.client.chat.completions.create(
-                model=settings.AI_MODEL,
-                messages=messages,
-                temperature=settings.AI_TEMPERATURE,
-                max_tokens=settings.AI_MAX_TOKENS,
-            )
+            started = time.perf_counter()
+            with span("llm", route.model, messages=len(messages)):
+                response = self.client.chat.completions.create(
+                    model=route.model,
+                    messages=messages,
+                    temperature=settings.AI_TEMPERATURE,
+                    max_tokens=route.max_tokens,
+                )
+            elapsed = time.perf_counter() - started
+            llm_request_seconds.observe(elapsed, model=route.model, tier=route.tier)
+            
+            # Registrar consumo de tokens (métricas y totales por lead en llm_usage)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                prompt_tokens = usage.prompt_tokens or 0
+                completion_tokens = usage.completion_tokens or 0
+                details = getattr(usage, "prompt_tokens_details", None)
+                cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+                llm_tokens_total.inc(prompt_tokens, model=route.model, tier=route.tier, type="prompt")
+                llm_tokens_total.inc(completion_tokens, model=route.model, tier=route.tier, type="completion")
+                llm_tokens_total.inc(cached_tokens, model=route.model, tier=route.tier, type="cached")
+                usage_recorder.record(
+                    phone_number=lead_info.get("phone_number", "unknown"),
+                    operator=lead_info.get("target_operator"),
+                    model=route.model,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cached_tokens=cached_tokens,
+                    latency_ms=elapsed * 1000
+                )
             
             # Extraer respuesta
             ai_response = response.choices[0].message.content.strip()
             
-            logger.info(f"✅ Respuesta generada para lead: {lead_info.get('phone_number', 'unknown')}")
+            if route.tier == "full" and lead_info.get("phone_number"):
+                self._mark_warm(lead_info["phone_number"])
+            
+            logger.info("✅ Respuesta generada para lead: %s", lead_info.get("phone_number", "unknown"))
             return ai_response
             
         except Exception as e:
-            logger.error(f"❌ Error al generar respuesta: {str(e)}")
+            logger.error("❌ Error al generar respuesta: %s", e)
+            llm_fallback_responses_total.inc()
             return "Lo siento, estoy teniendo problemas técnicos. ¿Podrías intentar de nuevo en unos momentos?"
     
     def get_system_prompt(self, target_operator: str, current_operator: str = None) -> str:
@@ -94,33 +249,10 @@ BENEFICIOS POR OPERADOR:
 """
         
         # Agregar beneficios específicos por operador
-        if target_operator == "CLARO":
-            base_prompt += """
-CLARO:
-- Mayor cobertura 4G/5G en Perú
-- Planes con más gigas y minutos
-- Roaming internacional incluido
-- App Mi Claro para gestionar tu línea
-- Atención al cliente 24/7
-"""
-        elif target_operator == "WOW":
-            base_prompt += """
-WOW:
-- Internet de fibra óptica ultra rápido
-- Planes con Netflix, HBO Max incluidos
-- Sin permanencia mínima
-- Instalación gratis
-- Precio fijo sin sorpresas
-"""
-        elif target_operator == "WIN":
-            base_prompt += """
-WIN:
-- Planes económicos y flexibles
-- Cobertura en todo Perú
-- Recargas desde S/5
-- Bonos de internet y llamadas
-- Sin contratos ni permanencia
-"""
+        benefits = OPERATOR_BENEFITS.get(target_operator)
+        if benefits:
+            base_prompt += f"\n{target_operator}:\n"
+            base_prompt += "".join(f"- {benefit}\n" for benefit in benefits)
         
         base_prompt += """
 IMPORTANTE:
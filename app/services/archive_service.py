@@ -0,0 +1,256 @@
+"""
+Servicio de archivo de conversaciones (capa fría comprimida)
+
+Los mensajes antiguos, o de leads cerrados, se mueven de `conversations` a
+`conversation_archives`: un blob por lead y ejecución, con los mensajes en JSON Lines
+comprimidos con zstd (si el paquete `zstandard` está instalado) o zlib. El historial y
+la exportación leen también los archivos, así que el cambio es transparente para la IA.
+Cada lead archivado queda marcado con `leads.archived_at`: el webhook solo consulta el
+archivo de esos leads.
+"""
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.models.lead import Conversation, ConversationArchive, Lead, LeadStatusEnum
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import json
+import logging
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sin zstandard se usa zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Estados de lead cuya conversación se considera cerrada
+CLOSED_STATUSES = (LeadStatusEnum.CONVERTED, LeadStatusEnum.NOT_INTERESTED, LeadStatusEnum.FAILED)
+
+# Leads por lote (un commit por lote)
+ARCHIVE_BATCH_LEADS = 200
+
+# Ids por sentencia DELETE (SQLite limita el número de parámetros por sentencia)
+DELETE_CHUNK_SIZE = 500
+
+
+def compress(data: bytes) -> tuple:
+    """
+    Comprimir con el mejor códec disponible
+
+    Returns:
+        (códec, datos comprimidos)
+    """
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Descomprimir un blob guardado con `compress`"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Archivo comprimido con zstd: instala el paquete zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Códec desconocido: {codec}")
+
+
+class ArchiveService:
+    """Servicio para archivar y leer conversaciones antiguas"""
+
+    @staticmethod
+    def archive(
+        db: Session,
+        before: Optional[datetime] = None,
+        closed_before: Optional[datetime] = None,
+        dry_run: bool = False
+    ) -> dict:
+        """
+        Mover conversaciones a la capa fría
+
+        Un mensaje se archiva si es anterior a `before`, o si su lead está cerrado
+        (CLOSED_STATUSES) y el mensaje es anterior a `closed_before`.
+
+        Args:
+            db: Sesión de base de datos
+            before: Fecha límite para cualquier lead (opcional)
+            closed_before: Fecha límite para leads cerrados (opcional)
+            dry_run: Solo calcular el reporte, sin mover nada
+
+        Returns:
+            Reporte: leads, mensajes, bytes sin comprimir y comprimidos, tamaño de la tabla
+        """
+        criteria = _archive_criteria(before, closed_before)
+        if criteria is None:
+            raise ValueError("Indica before y/o closed_before")
+
+        report = {
+            "dry_run": dry_run,
+            "leads": 0,
+            "messages": 0,
+            "raw_bytes": 0,
+            "compressed_bytes": 0,
+            "table_bytes_before": _table_bytes(db),
+        }
+
+        archived_at = datetime.now(timezone.utc)
+        last_phone = ""
+        while True:
+            phones = list(db.scalars(
+                select(Conversation.phone_number)
+                .outerjoin(Lead, Lead.phone_number == Conversation.phone_number)
+                .where(criteria)
+                .where(Conversation.phone_number > last_phone)
+                .group_by(Conversation.phone_number)
+                .order_by(Conversation.phone_number)
+                .limit(ARCHIVE_BATCH_LEADS)
+            ))
+            if not phones:
+                break
+            last_phone = phones[-1]
+
+            rows = db.execute(
+                select(Conversation)
+                .outerjoin(Lead, Lead.phone_number == Conversation.phone_number)
+                .where(criteria)
+                .where(Conversation.phone_number.in_(phones))
+                .order_by(Conversation.phone_number, Conversation.created_at, Conversation.id)
+            ).scalars().all()
+
+            by_phone: Dict[str, List[Conversation]] = {}
+            for conversation in rows:
+                by_phone.setdefault(conversation.phone_number, []).append(conversation)
+
+            for phone_number, conversations in by_phone.items():
+                raw = "\n".join(json.dumps(_serialize(conv), ensure_ascii=False) for conv in conversations).encode()
+                codec, payload = compress(raw)
+                report["leads"] += 1
+                report["messages"] += len(conversations)
+                report["raw_bytes"] += len(raw)
+                report["compressed_bytes"] += len(payload)
+
+                if not dry_run:
+                    db.add(ConversationArchive(
+                        phone_number=phone_number,
+                        first_message_at=conversations[0].created_at,
+                        last_message_at=conversations[-1].created_at,
+                        message_count=len(conversations),
+                        codec=codec,
+                        raw_bytes=len(raw),
+                        payload=payload
+                    ))
+
+            if not dry_run:
+                # Marca que usa el webhook para consultar el archivo solo de estos leads
+                db.execute(
+                    update(Lead).where(Lead.phone_number.in_(list(by_phone))).values(archived_at=archived_at)
+                )
+                ids = [conversation.id for conversation in rows]
+                for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+                    db.execute(delete(Conversation).where(Conversation.id.in_(ids[start:start + DELETE_CHUNK_SIZE])))
+                db.commit()
+            db.expunge_all()
+
+        report["table_bytes_after"] = _table_bytes(db)
+        report["saved_bytes"] = report["raw_bytes"] - report["compressed_bytes"]
+        report["ratio"] = round(report["raw_bytes"] / report["compressed_bytes"], 2) if report["compressed_bytes"] else None
+
+        logger.info(
+            "🗄️ Archivo%s: %s mensajes de %s leads, %s -> %s bytes",
+            " (simulación)" if dry_run else "", report["messages"], report["leads"],
+            report["raw_bytes"], report["compressed_bytes"]
+        )
+        return report
+
+    @staticmethod
+    def load_messages(db: Session, phone_number: str, limit: Optional[int] = None) -> List[dict]:
+        """
+        Leer mensajes archivados de un lead
+
+        Args:
+            db: Sesión de base de datos
+            phone_number: Número de teléfono
+            limit: Solo los N mensajes más recientes (por defecto todos)
+
+        Returns:
+            Mensajes (más antiguo primero) con id, role, content, extra_data y created_at
+        """
+        archives = db.execute(
+            select(ConversationArchive.codec, ConversationArchive.payload)
+            .where(ConversationArchive.phone_number == phone_number)
+            .order_by(ConversationArchive.last_message_at.desc(), ConversationArchive.id.desc())
+        )
+
+        chunks: List[List[dict]] = []
+        total = 0
+        for codec, payload in archives:
+            messages = [json.loads(line) for line in decompress(codec, payload).decode().splitlines()]
+            chunks.append(messages)
+            total += len(messages)
+            if limit is not None and total >= limit:
+                break
+
+        messages = [message for chunk in reversed(chunks) for message in chunk]
+        return messages[-limit:] if limit is not None else messages
+
+    @staticmethod
+    def iter_history(db: Session, phone_number: str) -> Iterator[dict]:
+        """
+        Historial completo de un lead: primero lo archivado y luego lo reciente
+
+        Args:
+            db: Sesión de base de datos
+            phone_number: Número de teléfono
+
+        Yields:
+            Mensajes (más antiguo primero) con el campo `archived`
+        """
+        for message in ArchiveService.load_messages(db, phone_number):
+            yield {**message, "archived": True}
+
+        conversations = db.execute(
+            select(Conversation)
+            .where(Conversation.phone_number == phone_number)
+            .order_by(Conversation.created_at, Conversation.id)
+            .execution_options(yield_per=500)
+        ).scalars()
+        for conversation in conversations:
+            yield {**_serialize(conversation), "archived": False}
+
+
+def _archive_criteria(before: Optional[datetime], closed_before: Optional[datetime]):
+    """Condición SQL de los mensajes a archivar (None si no hay criterios)"""
+    conditions = []
+    if before is not None:
+        conditions.append(Conversation.created_at < before)
+    if closed_before is not None:
+        conditions.append(Lead.status.in_(CLOSED_STATUSES) & (Conversation.created_at < closed_before))
+    return or_(*conditions) if conditions else None
+
+
+def _serialize(conversation: Conversation) -> dict:
+    """Mensaje como dict serializable en JSON"""
+    created_at = conversation.created_at
+    if created_at is not None and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return {
+        "id": conversation.id,
+        "role": conversation.role,
+        "content": conversation.content,
+        "extra_data": conversation.extra_data,
+        "created_at": created_at.isoformat() if created_at else None,
+    }
+
+
+def _table_bytes(db: Session) -> Optional[int]:
+    """Tamaño en disco de conversations con índices (solo PostgreSQL)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.scalar(select(func.pg_total_relation_size("conversations")))
+
+
+# Instancia global del servicio
+archive_service = ArchiveService()
@@ -0,0 +1,180 @@
+"""
+Escritor de conversaciones con commit agrupado (group commit)
+
+Las peticiones concurrentes encolan sus mensajes y esperan la confirmación; una sola
+tarea en segundo plano los guarda con un INSERT de varias filas y un único commit
+cada CONVERSATION_FLUSH_MS milisegundos o al juntar CONVERSATION_BATCH_MAX_ROWS filas.
+
+La cola es FIFO y la escribe una sola tarea, así que los mensajes de un mismo número se
+insertan en el orden en que se enviaron (id creciente). `created_at` se fija al encolar.
+"""
+
+from sqlalchemy import insert
+from app.core.config import settings
+from app.core.metrics import conversation_flush_seconds, conversation_batch_rows
+from app.db.database import get_db_context
+from app.models.lead import Conversation
+from app.services.stats_service import stats_service, message_metric
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de cola
+_STOP = object()
+
+
+class ConversationWriter:
+    """Cola de mensajes de conversación guardados por lotes"""
+
+    def __init__(self, flush_ms: Optional[float] = None, max_rows: Optional[int] = None):
+        """
+        Args:
+            flush_ms: Espera máxima para juntar un lote (por defecto CONVERSATION_FLUSH_MS)
+            max_rows: Filas máximas por lote (por defecto CONVERSATION_BATCH_MAX_ROWS)
+        """
+        self.flush_delay = (flush_ms if flush_ms is not None else settings.CONVERSATION_FLUSH_MS) / 1000
+        self.max_rows = max_rows or settings.CONVERSATION_BATCH_MAX_ROWS
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Si la tarea de escritura en segundo plano está activa"""
+        return self._task is not None and not self._task.done()
+
+    async def submit(
+        self,
+        phone_number: str,
+        role: str,
+        content: str,
+        extra_data: dict = None,
+        operator: Optional[str] = None
+    ) -> int:
+        """
+        Encolar un mensaje y esperar a que quede guardado
+
+        Args:
+            phone_number: Número de teléfono
+            role: 'user' o 'assistant'
+            content: Contenido del mensaje
+            extra_data: Datos adicionales (opcional)
+            operator: Operador objetivo del lead (para estadísticas)
+
+        Returns:
+            ID de la conversación guardada
+        """
+        if not self.running:
+            raise RuntimeError("El escritor de conversaciones no está iniciado")
+
+        row = {
+            "phone_number": phone_number,
+            "role": role,
+            "content": content,
+            "extra_data": extra_data or {},
+            "created_at": datetime.now(timezone.utc),
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, operator, future))
+        return await future
+
+    async def _collect(self) -> Tuple[List[Tuple[dict, Optional[str], asyncio.Future]], bool]:
+        """
+        Esperar el primer mensaje y juntar los siguientes hasta el plazo o el máximo de filas
+
+        Returns:
+            (lote, True si se pidió detener el escritor)
+        """
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.flush_delay
+        while len(batch) < self.max_rows:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _write(self, batch: List[Tuple[dict, Optional[str], asyncio.Future]]) -> None:
+        """Guardar un lote y resolver las confirmaciones"""
+        start = time.perf_counter()
+        try:
+            ids = await asyncio.to_thread(_insert_rows, [(row, operator) for row, operator, _ in batch])
+        except Exception as e:
+            logger.error("❌ Error guardando %s mensajes: %s", len(batch), e)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        conversation_flush_seconds.observe(time.perf_counter() - start)
+        conversation_batch_rows.observe(len(batch))
+        for (_, _, future), conversation_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(conversation_id)
+
+    async def _run(self) -> None:
+        """Bucle de escritura: un lote a la vez, en orden de llegada"""
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._write(batch)
+
+    def start(self) -> None:
+        """Iniciar la tarea en segundo plano (requiere un event loop activo)"""
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("✅ Escritor de conversaciones iniciado (lotes de hasta %s filas)", self.max_rows)
+
+    async def stop(self) -> None:
+        """Guardar los mensajes en cola y detener la tarea"""
+        if self._task is None:
+            return
+        # La marca de parada entra al final de la cola: todo lo encolado antes se guarda
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+
+def _insert_rows(rows: List[Tuple[dict, Optional[str]]]) -> List[int]:
+    """
+    INSERT de varias filas con un solo commit (sus estadísticas cuentan solo si se confirma)
+
+    Args:
+        rows: (columnas de la conversación, operador objetivo) por mensaje
+
+    Returns:
+        IDs generados, en el mismo orden que las filas
+    """
+    with get_db_context() as db:
+        result = db.execute(
+            insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True),
+            [row for row, _ in rows]
+        )
+        ids = list(result.scalars())
+        stats_service.increment(
+            db, [(row["created_at"], operator, message_metric(row["role"])) for row, operator in rows]
+        )
+        db.commit()
+    return ids
+
+
+# Instancia global del escritor
+conversation_writer = ConversationWriter()
@@ -0,0 +1,112 @@
+"""
+Caché local (por proceso) de leads por número de teléfono
+
+Guarda una copia inmutable de los campos que usa el webhook (id, estado, operadores,
+versión y si tiene mensajes archivados) para no consultar el mismo lead en cada mensaje. Tamaño acotado (LRU) y TTL
+de LEAD_CACHE_TTL_SECONDS, que limita cuánto puede durar una copia desactualizada por
+cambios hechos en otro worker; además, los cambios de estado se aplican solo si la
+versión de la copia coincide con la de la base de datos.
+"""
+
+from app.core.config import settings
+from app.core.metrics import lead_cache_requests_total, lead_cache_entries
+from app.models.lead import Lead, LeadStatusEnum, OperatorEnum
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+import threading
+import time
+
+
+class LeadSnapshot(NamedTuple):
+    """Copia inmutable de un lead (mismos nombres de atributo que el modelo)"""
+    id: int
+    phone_number: str
+    status: LeadStatusEnum
+    target_operator: OperatorEnum
+    current_operator: Optional[OperatorEnum]
+    version: int
+    archived_at: Optional[datetime]
+
+    @classmethod
+    def from_lead(cls, lead: Lead) -> "LeadSnapshot":
+        """Crear copia a partir del modelo"""
+        return cls(
+            id=lead.id,
+            phone_number=lead.phone_number,
+            status=lead.status,
+            target_operator=lead.target_operator,
+            current_operator=lead.current_operator,
+            version=lead.version,
+            archived_at=lead.archived_at,
+        )
+
+
+class LeadCache:
+    """Caché LRU con TTL de LeadSnapshot por número de teléfono"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """
+        Args:
+            max_entries: Máximo de leads en memoria (por defecto LEAD_CACHE_MAX_ENTRIES, 0 = deshabilitada)
+            ttl_seconds: Vigencia de cada copia (por defecto LEAD_CACHE_TTL_SECONDS)
+        """
+        self.max_entries = settings.LEAD_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = settings.LEAD_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[LeadSnapshot, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, phone_number: str) -> Optional[LeadSnapshot]:
+        """
+        Obtener la copia vigente de un lead
+
+        Args:
+            phone_number: Número de teléfono
+
+        Returns:
+            LeadSnapshot o None si no está en caché o expiró
+        """
+        if not self.max_entries:
+            return None
+
+        with self._lock:
+            item = self._entries.get(phone_number)
+            if item is None:
+                result = "miss"
+            elif item[1] <= time.monotonic():
+                del self._entries[phone_number]
+                item = None
+                result = "expired"
+            else:
+                self._entries.move_to_end(phone_number)
+                result = "hit"
+
+        lead_cache_requests_total.inc(result=result)
+        return item[0] if item else None
+
+    def put(self, snapshot: LeadSnapshot) -> None:
+        """Guardar (o reemplazar) la copia de un lead"""
+        if not self.max_entries:
+            return
+
+        with self._lock:
+            self._entries[snapshot.phone_number] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(snapshot.phone_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            lead_cache_entries.set(len(self._entries))
+
+    def invalidate(self, phone_number: str) -> None:
+        """Descartar la copia de un lead (después de cambiar su estado)"""
+        with self._lock:
+            self._entries.pop(phone_number, None)
+
+    def clear(self) -> None:
+        """Vaciar la caché"""
+        with self._lock:
+            self._entries.clear()
+            lead_cache_entries.set(0)
+
+
+# Instancia global de la caché
+lead_cache = LeadCache()
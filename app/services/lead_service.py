@@ -2,14 +2,40 @@
 Servicio de gestión de leads
 """
 
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import lead_cache_requests_total
 from app.models.lead import Lead, Conversation, Session as SessionModel, LeadStatusEnum, OperatorEnum
+from app.schemas.webhook import LeadCreate
+from app.services.lead_cache import lead_cache, LeadSnapshot
+from app.services.stats_service import stats_service, message_metric, status_metric
+from app.services.archive_service import archive_service
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Transiciones de estado permitidas en los cambios en bloque (estado actual -> nuevos estados)
+STATUS_TRANSITIONS = {
+    LeadStatusEnum.PENDING: {LeadStatusEnum.CONTACTED, LeadStatusEnum.NOT_INTERESTED, LeadStatusEnum.FAILED},
+    LeadStatusEnum.CONTACTED: {
+        LeadStatusEnum.INTERESTED, LeadStatusEnum.NOT_INTERESTED, LeadStatusEnum.CONVERTED, LeadStatusEnum.FAILED,
+    },
+    LeadStatusEnum.INTERESTED: {LeadStatusEnum.NOT_INTERESTED, LeadStatusEnum.CONVERTED, LeadStatusEnum.FAILED},
+    LeadStatusEnum.NOT_INTERESTED: {LeadStatusEnum.CONTACTED, LeadStatusEnum.INTERESTED, LeadStatusEnum.FAILED},
+    LeadStatusEnum.FAILED: {LeadStatusEnum.PENDING, LeadStatusEnum.CONTACTED},
+    LeadStatusEnum.CONVERTED: set(),
+}
+
+# Columnas de LeadResponse (listados sin objetos ORM)
+LEAD_LIST_COLUMNS = (
+    Lead.id, Lead.phone_number, Lead.name, Lead.email, Lead.current_operator, Lead.target_operator,
+    Lead.status, Lead.created_at, Lead.updated_at,
+)
+
 
 class LeadService:
     """Servicio para gestionar leads"""
@@ -31,7 +57,7 @@ class LeadService:
         lead = db.query(Lead).filter(Lead.phone_number == phone_number).first()
         
         if lead:
-            logger.info(f"✅ Lead existente encontrado: {phone_number}")
+            logger.info("✅ Lead existente encontrado: %s", phone_number)
             return lead
         
         # Crear nuevo lead
@@ -44,46 +70,193 @@ class LeadService:
         db.commit()
         db.refresh(lead)
         
-        logger.info(f"✅ Nuevo lead creado: {phone_number} -> {target_operator}")
+        logger.info("✅ Nuevo lead creado: %s -> %s", phone_number, target_operator)
         return lead
     
     @staticmethod
-    def update_lead_status(db: Session, phone_number: str, status: LeadStatusEnum) -> Lead:
+    def get_lead_snapshot(db: Session, phone_number: str, target_operator: str) -> LeadSnapshot:
         """
-        Actualizar estado del lead
+        Obtener o crear un lead pasando por la caché local
         
         Args:
             db: Sesión de base de datos
             phone_number: Número de teléfono del lead
-            status: Nuevo estado
+            target_operator: Operador objetivo si hay que crearlo (CLARO, WOW, WIN)
         
         Returns:
-            Lead actualizado
+            Copia inmutable del lead (id, estado, operadores, versión y archived_at)
         """
-        lead = db.query(Lead).filter(Lead.phone_number == phone_number).first()
+        snapshot = lead_cache.get(phone_number)
+        if snapshot is None:
+            snapshot = LeadSnapshot.from_lead(LeadService.get_or_create_lead(db, phone_number, target_operator))
+            lead_cache.put(snapshot)
+        return snapshot
+    
+    @staticmethod
+    def upsert_leads(db: Session, leads: List[LeadCreate]) -> List[str]:
+        """
+        Crear o actualizar leads en bloque (INSERT ... ON CONFLICT por lotes, un solo commit)
+        
+        Los leads existentes conservan su estado; se actualizan operador objetivo y los
+        campos enviados (los vacíos no borran el valor guardado).
+        
+        Args:
+            db: Sesión de base de datos
+            leads: Leads validados (operadores en OperatorEnum)
+        
+        Returns:
+            "created" o "updated" por lead, en el mismo orden
+        """
+        if not leads:
+            return []
         
-        if not lead:
-            raise ValueError(f"Lead no encontrado: {phone_number}")
+        # Un número repetido en la misma carga se guarda una vez (los datos posteriores completan o reemplazan)
+        rows = {}
+        for lead_data in leads:
+            row = _lead_row(lead_data)
+            previous = rows.get(lead_data.phone_number)
+            if previous is not None:
+                row = {**previous, **{key: value for key, value in row.items() if value is not None}}
+            rows[lead_data.phone_number] = row
         
-        lead.status = status
-        lead.updated_at = datetime.now(timezone.utc)
+        existing = set(db.scalars(select(Lead.phone_number).where(Lead.phone_number.in_(list(rows)))))
         
+        now = datetime.now(timezone.utc)
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            _upsert_leads_bulk(db, dialect, list(rows.values()), now)
+        else:
+            _upsert_leads_generic(db, list(rows.values()), now, existing)
+        db.commit()
+        
+        for phone_number in existing:
+            lead_cache.invalidate(phone_number)
+        
+        results = []
+        seen = set(existing)
+        for lead_data in leads:
+            results.append("updated" if lead_data.phone_number in seen else "created")
+            seen.add(lead_data.phone_number)
+        
+        logger.info("✅ Carga masiva: %d creados, %d actualizados", len(rows) - len(existing), len(existing))
+        return results
+    
+    @staticmethod
+    def update_lead_status(
+        db: Session,
+        phone_number: str,
+        status: LeadStatusEnum,
+        expected_version: Optional[int] = None
+    ) -> Lead:
+        """
+        Actualizar estado del lead (un solo UPDATE que incrementa la versión)
+        
+        Args:
+            db: Sesión de base de datos
+            phone_number: Número de teléfono del lead
+            status: Nuevo estado
+            expected_version: Si se indica, solo se actualiza si el lead sigue en esa versión
+                (el cambio se descarta si la copia en caché estaba desactualizada)
+        
+        Returns:
+            Lead actualizado (o el lead sin cambios si la versión no coincidía)
+        """
+        now = datetime.now(timezone.utc)
+        values = {"status": status, "updated_at": now, "version": Lead.version + 1}
         if status == LeadStatusEnum.CONVERTED:
-            lead.converted_at = datetime.now(timezone.utc)
+            values["converted_at"] = now
+        
+        stmt = update(Lead).where(Lead.phone_number == phone_number)
+        if expected_version is not None:
+            stmt = stmt.where(Lead.version == expected_version)
         
+        lead = db.scalars(stmt.values(**values).returning(Lead)).first()
+        if lead is not None:
+            stats_service.increment(db, [(now, lead.target_operator.value, status_metric(status))])
         db.commit()
-        db.refresh(lead)
+        lead_cache.invalidate(phone_number)
+        
+        if lead is None:
+            lead = db.query(Lead).filter(Lead.phone_number == phone_number).first()
+            if not lead:
+                raise ValueError(f"Lead no encontrado: {phone_number}")
+            
+            lead_cache_requests_total.inc(result="stale")
+            logger.warning(
+                "⚠️ Lead modificado por otro proceso, se descarta el cambio: %s (versión %s -> %s)",
+                phone_number, expected_version, lead.version
+            )
+            return lead
         
-        logger.info(f"✅ Lead actualizado: {phone_number} -> {status}")
+        logger.info("✅ Lead actualizado: %s -> %s", phone_number, status)
         return lead
     
+    @staticmethod
+    def bulk_update_status(
+        db: Session,
+        status: LeadStatusEnum,
+        phone_numbers: Optional[List[str]] = None,
+        current_status: Optional[List[LeadStatusEnum]] = None,
+        target_operator: Optional[OperatorEnum] = None,
+        inactive_since: Optional[datetime] = None
+    ) -> List[Tuple[str, OperatorEnum]]:
+        """
+        Cambiar el estado de varios leads con un solo UPDATE ... RETURNING
+        
+        Solo se actualizan los leads cuyo estado actual permite pasar a `status`
+        (STATUS_TRANSITIONS); los filtros se combinan con AND.
+        
+        Args:
+            db: Sesión de base de datos
+            status: Nuevo estado
+            phone_numbers: Limitar a estos números (opcional)
+            current_status: Limitar a leads en estos estados (opcional)
+            target_operator: Limitar a este operador objetivo (opcional)
+            inactive_since: Limitar a leads sin cambios desde esta fecha (opcional)
+        
+        Returns:
+            (phone_number, target_operator) de cada lead actualizado
+        """
+        allowed_from = [source for source, targets in STATUS_TRANSITIONS.items() if status in targets]
+        if current_status is not None:
+            allowed_from = [source for source in allowed_from if source in current_status]
+        if not allowed_from:
+            return []
+        
+        now = datetime.now(timezone.utc)
+        values = {"status": status, "updated_at": now, "version": Lead.version + 1}
+        if status == LeadStatusEnum.CONVERTED:
+            values["converted_at"] = now
+        
+        stmt = update(Lead).where(Lead.status.in_(allowed_from))
+        if phone_numbers is not None:
+            stmt = stmt.where(Lead.phone_number.in_(phone_numbers))
+        if target_operator is not None:
+            stmt = stmt.where(Lead.target_operator == target_operator)
+        if inactive_since is not None:
+            stmt = stmt.where(func.coalesce(Lead.updated_at, Lead.created_at) < inactive_since)
+        
+        updated = db.execute(
+            stmt.values(**values).returning(Lead.phone_number, Lead.target_operator),
+            execution_options={"synchronize_session": False}
+        ).all()
+        stats_service.increment(db, [(now, operator.value, status_metric(status)) for _, operator in updated])
+        db.commit()
+        
+        for phone_number, _ in updated:
+            lead_cache.invalidate(phone_number)
+        
+        logger.info("✅ Cambio de estado en bloque: %d leads -> %s", len(updated), status.value)
+        return [(phone_number, operator) for phone_number, operator in updated]
+    
     @staticmethod
     def add_conversation_message(
         db: Session,
         phone_number: str,
         role: str,
         content: str,
-        extra_data: dict = None
+        extra_data: dict = None,
+        operator: Optional[str] = None
     ) -> Conversation:
         """
         Agregar mensaje al historial de conversación
@@ -94,25 +267,114 @@ class LeadService:
             role: 'user' o 'assistant'
             content: Contenido del mensaje
             extra_data: Datos adicionales (opcional)
+            operator: Operador objetivo del lead para estadísticas (si no se indica, se consulta)
         
         Returns:
             Conversation creada
         """
+        now = datetime.now(timezone.utc)
         conversation = Conversation(
             phone_number=phone_number,
             role=role,
             content=content,
-            extra_data=extra_data or {}
+            extra_data=extra_data or {},
+            created_at=now
         )
         db.add(conversation)
+        
+        if operator is None:
+            target_operator = db.scalar(select(Lead.target_operator).where(Lead.phone_number == phone_number))
+            operator = target_operator.value if target_operator else None
+        stats_service.increment(db, [(now, operator, message_metric(role))])
+        
         db.commit()
         db.refresh(conversation)
         
-        logger.info(f"✅ Mensaje agregado: {phone_number} ({role})")
+        logger.info("✅ Mensaje agregado: %s (%s)", phone_number, role)
         return conversation
     
     @staticmethod
-    def get_conversation_history(db: Session, phone_number: str, limit: int = 10) -> List[dict]:
+    def record_first_contact(db: Session, lead: Lead, message: str, variant_id: str) -> Conversation:
+        """
+        Registrar mensaje de primer contacto generado por plantilla
+        
+        El mensaje queda en el historial como respuesta del asistente, de modo que
+        la IA tenga el contexto cuando el lead responda.
+        
+        Args:
+            db: Sesión de base de datos
+            lead: Lead contactado
+            message: Mensaje enviado
+            variant_id: Variante de plantilla usada
+        
+        Returns:
+            Conversation creada
+        """
+        now = datetime.now(timezone.utc)
+        
+        conversation = Conversation(
+            phone_number=lead.phone_number,
+            role="assistant",
+            content=message,
+            extra_data={"source": "template", "template_variant": variant_id},
+            created_at=now
+        )
+        db.add(conversation)
+        
+        events = [(now, lead.target_operator.value, message_metric("assistant"))]
+        if lead.status == LeadStatusEnum.PENDING:
+            lead.status = LeadStatusEnum.CONTACTED
+            lead.updated_at = now
+            lead.version = Lead.version + 1
+            events.append((now, lead.target_operator.value, status_metric(LeadStatusEnum.CONTACTED)))
+        lead.last_contacted_at = now
+        stats_service.increment(db, events)
+        
+        db.commit()
+        lead_cache.invalidate(lead.phone_number)
+        
+        logger.info("✅ Primer contacto registrado: %s (%s)", lead.phone_number, variant_id)
+        return conversation
+    
+    @staticmethod
+    def list_leads(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        status: Optional[LeadStatusEnum] = None,
+        target_operator: Optional[OperatorEnum] = None
+    ) -> List[dict]:
+        """
+        Listar leads como diccionarios (solo las columnas de LeadResponse)
+        
+        No carga objetos ORM: cada fila es una tupla de columnas convertida a dict, lista
+        para serializar sin volver a validarla.
+        
+        Args:
+            db: Sesión de base de datos
+            skip: Número de registros a saltar
+            limit: Número máximo de registros
+            status: Filtrar por estado (opcional)
+            target_operator: Filtrar por operador objetivo (opcional)
+        
+        Returns:
+            Lista de leads con los campos de LeadResponse
+        """
+        query = select(*LEAD_LIST_COLUMNS)
+        if status is not None:
+            query = query.where(Lead.status == status)
+        if target_operator is not None:
+            query = query.where(Lead.target_operator == target_operator)
+        
+        return [row._asdict() for row in db.execute(query.offset(skip).limit(limit))]
+    
+    @staticmethod
+    def get_conversation_history(
+        db: Session,
+        phone_number: str,
+        limit: int = 10,
+        include_archived: bool = False
+    ) -> List[dict]:
         """
         Obtener historial de conversación
         
@@ -120,6 +382,8 @@ class LeadService:
             db: Sesión de base de datos
             phone_number: Número de teléfono
             limit: Número máximo de mensajes a retornar
+            include_archived: Completar con mensajes archivados si los recientes no alcanzan
+                el límite (solo para leads con `archived_at`: evita consultar el archivo en cada mensaje)
         
         Returns:
             Lista de mensajes en formato [{"role": "user", "content": "..."}]
@@ -127,7 +391,7 @@ class LeadService:
         conversations = (
             db.query(Conversation)
             .filter(Conversation.phone_number == phone_number)
-            .order_by(Conversation.created_at.desc())
+            .order_by(Conversation.created_at.desc(), Conversation.id.desc())
             .limit(limit)
             .all()
         )
@@ -141,6 +405,11 @@ class LeadService:
             for conv in conversations
         ]
         
+        # Completar con mensajes archivados si los recientes no alcanzan el límite
+        if include_archived and len(messages) < limit:
+            archived = archive_service.load_messages(db, phone_number, limit=limit - len(messages))
+            messages = [{"role": message["role"], "content": message["content"]} for message in archived] + messages
+        
         return messages
     
     @staticmethod
@@ -160,8 +429,13 @@ class LeadService:
         
         now = datetime.now(timezone.utc)
         
+        # SQLite devuelve fechas sin zona horaria (se guardan en UTC)
+        expires_at = session.expires_at if session else None
+        if expires_at is not None and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        
         # Si existe y no ha expirado, retornar
-        if session and session.expires_at > now:
+        if session and expires_at > now:
             session.message_count += 1
             session.updated_at = now
             db.commit()
@@ -178,15 +452,66 @@ class LeadService:
             phone_number=phone_number,
             is_active=True,
             message_count=1,
-            expires_at=now + timedelta(minutes=30)  # 30 minutos de duración
+            expires_at=now + timedelta(minutes=settings.SESSION_TIMEOUT_MINUTES)
         )
         db.add(session)
         db.commit()
         db.refresh(session)
         
-        logger.info(f"✅ Nueva sesión creada: {phone_number}")
+        logger.info("✅ Nueva sesión creada: %s", phone_number)
         return session
 
 
+def _lead_row(lead_data: LeadCreate) -> dict:
+    """Columnas de un lead nuevo a partir del schema validado"""
+    return {
+        "phone_number": lead_data.phone_number,
+        "name": lead_data.name,
+        "email": lead_data.email,
+        "current_operator": OperatorEnum(lead_data.current_operator) if lead_data.current_operator else None,
+        "target_operator": OperatorEnum(lead_data.target_operator),
+        "notes": lead_data.notes,
+        "status": LeadStatusEnum.PENDING,
+        "version": 1,
+    }
+
+
+def _upsert_leads_bulk(db: Session, dialect: str, rows: List[dict], now: datetime) -> None:
+    """
+    INSERT ... ON CONFLICT DO UPDATE ejecutado con todas las filas como parámetros
+    
+    La sentencia se compila una vez; SQLAlchemy agrupa las filas en INSERT de varios
+    VALUES (PostgreSQL) o usa executemany del driver (SQLite).
+    """
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(Lead)
+    excluded = stmt.excluded
+    
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Lead.phone_number],
+        set_={
+            "name": func.coalesce(excluded.name, Lead.name),
+            "email": func.coalesce(excluded.email, Lead.email),
+            "current_operator": func.coalesce(excluded.current_operator, Lead.current_operator),
+            "target_operator": excluded.target_operator,
+            "notes": func.coalesce(excluded.notes, Lead.notes),
+            "updated_at": now,
+            "version": Lead.version + 1,
+        }
+    ), rows)
+
+
+def _upsert_leads_generic(db: Session, rows: List[dict], now: datetime, existing: set) -> None:
+    """Upsert fila por fila para dialectos sin ON CONFLICT"""
+    for row in rows:
+        if row["phone_number"] not in existing:
+            db.add(Lead(**row))
+            continue
+        
+        values = {key: row[key] for key in ("name", "email", "current_operator", "notes") if row[key] is not None}
+        values.update(target_operator=row["target_operator"], updated_at=now, version=Lead.version + 1)
+        db.execute(update(Lead).where(Lead.phone_number == row["phone_number"]).values(**values))
+
+
 # Instancia global del servicio
 lead_service = LeadService()
@@ -0,0 +1,208 @@
+"""
+Serialización de mensajes por número de teléfono
+
+Dos mensajes del mismo número no deben procesarse a la vez: ambos leerían el mismo
+historial y las respuestas quedarían intercaladas. Números distintos se procesan en
+paralelo sin restricción.
+
+Modos (PHONE_LOCK_MODE):
+    none       Sin bloqueo
+    local      asyncio.Lock por número (un solo proceso/worker)
+    advisory   Además, advisory lock de PostgreSQL por número, válido entre workers e
+               instancias. Cada bloqueo retiene una conexión de un pool propio
+               (PHONE_LOCK_POOL_SIZE, aparte del de las peticiones) y requiere conexión
+               directa (PHONE_LOCK_DATABASE_URL, no un pooler en modo transacción como pgbouncer).
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from app.core.config import settings
+from app.core.metrics import phone_lock_wait_seconds, phone_lock_timeouts_total
+from app.db.database import get_lock_engine
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PhoneLockTimeout(Exception):
+    """No se obtuvo el bloqueo del número dentro de PHONE_LOCK_TIMEOUT_SECONDS"""
+
+
+def phone_lock_key(phone_number: str) -> int:
+    """Clave de 64 bits (con signo, como bigint) del advisory lock de un número"""
+    digest = hashlib.blake2b(phone_number.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def worker_for_phone(phone_number: str, workers: List[str]) -> str:
+    """
+    Worker asignado a un número (hashing de rendezvous)
+
+    Cada número va siempre al mismo worker, y al agregar o quitar uno solo se reasignan
+    los números de ese worker. Sirve para repartir mensajes entre consumidores de una
+    cola manteniendo el orden por número sin bloqueos.
+
+    Args:
+        phone_number: Número de teléfono
+        workers: Identificadores de los workers disponibles
+
+    Returns:
+        Identificador del worker
+    """
+    if not workers:
+        raise ValueError("No hay workers disponibles")
+    return max(
+        workers,
+        key=lambda worker: hashlib.blake2b(f"{worker}:{phone_number}".encode(), digest_size=8).digest()
+    )
+
+
+class _LocalLock:
+    """asyncio.Lock con contador de usuarios (se elimina cuando nadie lo usa)"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class PhoneLocks:
+    """Bloqueos por número de teléfono (en proceso y, opcionalmente, en PostgreSQL)"""
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            mode: none, local o advisory (por defecto PHONE_LOCK_MODE)
+            timeout: Espera máxima por el bloqueo (por defecto PHONE_LOCK_TIMEOUT_SECONDS)
+            poll_interval: Segundos entre intentos del advisory lock (por defecto PHONE_LOCK_POLL_MS)
+        """
+        self.mode = mode or settings.PHONE_LOCK_MODE
+        self.timeout = settings.PHONE_LOCK_TIMEOUT_SECONDS if timeout is None else timeout
+        self.poll_interval = settings.PHONE_LOCK_POLL_MS / 1000 if poll_interval is None else poll_interval
+        self._local: Dict[str, _LocalLock] = {}
+        # Un permiso por conexión del pool de bloqueos: esperar aquí y no en un hilo bloqueado en el pool
+        self._connections = asyncio.Semaphore(settings.PHONE_LOCK_POOL_SIZE)
+
+    @asynccontextmanager
+    async def hold(self, phone_number: str) -> AsyncIterator[None]:
+        """
+        Mantener el bloqueo de un número mientras se procesa su mensaje
+
+        Uso:
+        ```python
+        async with phone_locks.hold(msg.from_number):
+            await process_whatsapp_message(msg, db)
+        ```
+
+        Raises:
+            PhoneLockTimeout: Si el número sigue bloqueado después de `timeout` segundos
+        """
+        if self.mode == "none":
+            yield
+            return
+
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+
+        entry = self._local.get(phone_number)
+        if entry is None:
+            entry = self._local[phone_number] = _LocalLock()
+        entry.users += 1
+        try:
+            try:
+                await asyncio.wait_for(entry.lock.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self._timed_out(phone_number, "local")
+
+            try:
+                connection = None
+                if self.mode == "advisory":
+                    connection = await self._acquire_advisory(phone_number, deadline)
+                phone_lock_wait_seconds.observe(time.perf_counter() - started, mode=self.mode)
+                try:
+                    yield
+                finally:
+                    if connection is not None:
+                        try:
+                            await asyncio.to_thread(_release_advisory, connection, phone_lock_key(phone_number))
+                        finally:
+                            self._connections.release()
+            finally:
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._local[phone_number]
+
+    async def _acquire_advisory(self, phone_number: str, deadline: float) -> Connection:
+        """Obtener el advisory lock del número, reintentando hasta `deadline`"""
+        key = phone_lock_key(phone_number)
+        try:
+            await asyncio.wait_for(self._connections.acquire(), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self._timed_out(phone_number, "advisory")
+        try:
+            connection = await asyncio.to_thread(get_lock_engine().connect)
+        except BaseException:
+            self._connections.release()
+            raise
+        try:
+            while not await asyncio.to_thread(_try_advisory, connection, key):
+                if time.monotonic() >= deadline:
+                    self._timed_out(phone_number, "advisory")
+                await asyncio.sleep(self.poll_interval)
+        except PhoneLockTimeout:
+            await asyncio.to_thread(connection.close)
+            self._connections.release()
+            raise
+        except BaseException:
+            # Un intento cancelado pudo haber obtenido el bloqueo: cerrar la sesión lo libera
+            connection.invalidate()
+            connection.close()
+            self._connections.release()
+            raise
+        return connection
+
+    def _timed_out(self, phone_number: str, mode: str) -> None:
+        """Registrar y lanzar el timeout"""
+        phone_lock_timeouts_total.inc(mode=mode)
+        raise PhoneLockTimeout(f"{phone_number} sigue en proceso después de {self.timeout:g}s")
+
+
+def _try_advisory(connection: Connection, key: int) -> bool:
+    """Un intento de pg_try_advisory_lock (sin quedar dentro de una transacción)"""
+    acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+    connection.commit()
+    return bool(acquired)
+
+
+def _release_advisory(connection: Connection, key: int) -> None:
+    """
+    Liberar el advisory lock y devolver la conexión al pool
+
+    El bloqueo es de sesión (no se libera con rollback); si el unlock falla se invalida
+    la conexión para que al cerrarse la sesión de PostgreSQL lo libere.
+    """
+    try:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        connection.commit()
+    except Exception as e:
+        logger.warning("⚠️ No se pudo liberar el advisory lock %s: %s", key, e)
+        connection.invalidate()
+    finally:
+        connection.close()
+
+
+# Instancia global
+phone_locks = PhoneLocks()
@@ -0,0 +1,224 @@
+"""
+Servicio de búsqueda de texto completo en el historial de conversaciones
+
+Usa el índice creado por app/db/fulltext.py (tsvector + GIN en PostgreSQL, FTS5 en
+SQLite). La paginación es por cursor (keyset): cada página continúa después del último
+resultado de la anterior, sin OFFSET, así que su costo no crece con el número de página.
+"""
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+from app.db.fulltext import TEXT_SEARCH_CONFIG
+from app.models.lead import LeadStatusEnum, OperatorEnum
+from datetime import datetime
+from typing import List, Literal, Optional, Tuple
+import base64
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Marcas alrededor de los términos encontrados en el fragmento
+HIGHLIGHT_START = "**"
+HIGHLIGHT_STOP = "**"
+
+SearchOrder = Literal["rank", "recent"]
+
+
+class SearchNotAvailable(Exception):
+    """El dialecto de la base de datos no tiene búsqueda de texto completo"""
+
+
+class SearchService:
+    """Servicio de búsqueda en conversaciones"""
+
+    @staticmethod
+    def search(
+        db: Session,
+        query: str,
+        operator: Optional[OperatorEnum] = None,
+        status: Optional[LeadStatusEnum] = None,
+        role: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        order: SearchOrder = "rank",
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Buscar mensajes que contengan los términos
+
+        Args:
+            db: Sesión de base de datos
+            query: Términos de búsqueda (en PostgreSQL admite "frase exacta", OR y -excluir)
+            operator: Operador objetivo del lead (opcional)
+            status: Estado actual del lead (opcional)
+            role: 'user' o 'assistant' (opcional)
+            start: Mensajes desde esta fecha (opcional)
+            end: Mensajes anteriores a esta fecha (opcional)
+            order: 'rank' (relevancia) o 'recent' (más nuevos primero)
+            limit: Resultados por página
+            cursor: Cursor devuelto por la página anterior
+
+        Returns:
+            (resultados, cursor de la página siguiente o None)
+
+        Raises:
+            SearchNotAvailable: Si la base de datos no tiene índice de texto completo
+            ValueError: Si el cursor no es válido
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            build = _postgres_query
+        elif dialect == "sqlite":
+            build = _sqlite_query
+            query = _fts5_query(query)
+            if not query:
+                return [], None
+        else:
+            raise SearchNotAvailable(dialect)
+
+        params = {"query": query, "limit": limit + 1}
+        filters = []
+        if operator is not None:
+            filters.append("l.target_operator = :operator")
+            params["operator"] = operator.value
+        if status is not None:
+            filters.append("l.status = :status")
+            params["status"] = status.value
+        if role is not None:
+            filters.append("c.role = :role")
+            params["role"] = role
+        if start is not None:
+            filters.append("c.created_at >= :start")
+            params["start"] = start
+        if end is not None:
+            filters.append("c.created_at < :end")
+            params["end"] = end
+
+        after = _decode_cursor(cursor, order) if cursor else None
+        if after is not None:
+            params["after_rank"], params["after_id"] = after
+
+        sql = build(filters, order, after is not None, join_leads=operator is not None or status is not None)
+        stmt = text(sql).columns(created_at=DateTime(timezone=True))
+        for name in ("start", "end"):
+            if name in params:
+                stmt = stmt.bindparams(bindparam(name, type_=DateTime(timezone=True)))
+        rows = db.execute(stmt, params).mappings().all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(order, last["sort_rank"], last["id"])
+
+        results = [
+            {
+                "id": row["id"],
+                "phone_number": row["phone_number"],
+                "role": row["role"],
+                "created_at": row["created_at"],
+                "target_operator": row["target_operator"],
+                "lead_status": row["status"],
+                "score": round(float(row["score"]), 6),
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+        return results, next_cursor
+
+
+def _postgres_query(filters: List[str], order: SearchOrder, has_cursor: bool, join_leads: bool) -> str:
+    """
+    Consulta para PostgreSQL
+
+    La subconsulta ordena y limita usando solo el índice GIN y el rango; el fragmento
+    (ts_headline, costoso) se calcula después, solo para la página devuelta.
+    """
+    # float8: el valor del cursor debe volver a compararse exactamente igual
+    rank = "ts_rank_cd(c.content_tsv, q.query)::float8"
+    sort_rank = rank if order == "rank" else "0"
+    where = ["c.content_tsv @@ q.query"] + filters
+    if has_cursor:
+        if order == "rank":
+            where.append(f"({rank} < :after_rank OR ({rank} = :after_rank AND c.id < :after_id))")
+        else:
+            where.append("c.id < :after_id")
+    order_by = "sort_rank DESC, c.id DESC" if order == "rank" else "c.id DESC"
+
+    return f"""
+        SELECT page.id, page.phone_number, page.role, page.created_at, page.target_operator, page.status,
+               page.score, page.sort_rank,
+               ts_headline('{TEXT_SEARCH_CONFIG}', page.content, page.query,
+                           'MaxWords=30, MinWords=10, StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}') AS snippet
+        FROM (
+            SELECT c.id, c.phone_number, c.role, c.created_at, c.content, q.query,
+                   l.target_operator, l.status, {rank} AS score, {sort_rank} AS sort_rank
+            FROM conversations c
+            CROSS JOIN websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS q(query)
+            {"JOIN" if join_leads else "LEFT JOIN"} leads l ON l.phone_number = c.phone_number
+            WHERE {" AND ".join(where)}
+            ORDER BY {order_by}
+            LIMIT :limit
+        ) AS page
+        ORDER BY {"page.sort_rank DESC, page.id DESC" if order == "rank" else "page.id DESC"}
+    """
+
+
+def _sqlite_query(filters: List[str], order: SearchOrder, has_cursor: bool, join_leads: bool) -> str:
+    """Consulta para SQLite FTS5 (bm25: menor es más relevante)"""
+    sort_rank = "f.rank" if order == "rank" else "0"
+    where = ["conversations_fts MATCH :query"] + filters
+    if has_cursor:
+        if order == "rank":
+            where.append("(f.rank > :after_rank OR (f.rank = :after_rank AND c.id < :after_id))")
+        else:
+            where.append("c.id < :after_id")
+    order_by = "f.rank, c.id DESC" if order == "rank" else "c.id DESC"
+
+    return f"""
+        SELECT c.id, c.phone_number, c.role, c.created_at, l.target_operator, l.status,
+               -f.rank AS score, {sort_rank} AS sort_rank,
+               snippet(conversations_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 16) AS snippet
+        FROM conversations_fts f
+        JOIN conversations c ON c.id = f.rowid
+        {"JOIN" if join_leads else "LEFT JOIN"} leads l ON l.phone_number = c.phone_number
+        WHERE {" AND ".join(where)}
+        ORDER BY {order_by}
+        LIMIT :limit
+    """
+
+
+def _fts5_query(query: str) -> str:
+    """
+    Convertir los términos a una consulta FTS5 segura
+
+    Cada palabra se busca como prefijo ("portab" encuentra "portabilidad"), ya que FTS5
+    no aplica stemming; todas las palabras deben aparecer.
+    """
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _encode_cursor(order: SearchOrder, rank: float, conversation_id: int) -> str:
+    """Cursor opaco con la posición del último resultado"""
+    payload = json.dumps([order, float(rank), conversation_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, order: SearchOrder) -> Tuple[float, int]:
+    """Leer el cursor (debe corresponder al mismo orden)"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order, rank, conversation_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if cursor_order != order:
+        raise ValueError("El cursor corresponde a otro orden")
+    return float(rank), int(conversation_id)
+
+
+# Instancia global del servicio
+search_service = SearchService()
@@ -0,0 +1,264 @@
+"""
+Almacén de sesiones en memoria con persistencia diferida (write-behind)
+
+El webhook solo actualiza contadores en memoria; una tarea en segundo plano guarda
+los cambios en la tabla `sessions` con upserts por lotes cada
+SESSION_FLUSH_INTERVAL_SECONDS y borra en bloque las sesiones expiradas.
+"""
+
+from sqlalchemy import case, delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
+from app.core.metrics import session_flush_seconds, session_flush_rows_total, session_store_entries
+from app.db.database import get_db_context
+from app.models.lead import Session as SessionModel
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia (SQLite limita el número de parámetros por sentencia)
+UPSERT_BATCH_SIZE = 500
+
+
+class SessionEntry:
+    """Sesión en memoria de un número de teléfono"""
+
+    __slots__ = ("phone_number", "message_count", "pending", "created_at", "expires_at")
+
+    def __init__(self, phone_number: str, now: datetime, ttl: timedelta):
+        self.phone_number = phone_number
+        self.message_count = 0
+        self.pending = 0  # Mensajes aún no guardados en la base de datos
+        self.created_at = now
+        self.expires_at = now + ttl
+
+
+class SessionStore:
+    """Sesiones por número con TTL de SESSION_TIMEOUT_MINUTES y guardado por lotes"""
+
+    def __init__(
+        self,
+        ttl_minutes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        sweep_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            ttl_minutes: Duración de una sesión (por defecto SESSION_TIMEOUT_MINUTES)
+            flush_interval: Segundos entre guardados (por defecto SESSION_FLUSH_INTERVAL_SECONDS)
+            sweep_interval: Segundos entre limpiezas de expiradas (por defecto SESSION_SWEEP_INTERVAL_SECONDS)
+        """
+        self.ttl = timedelta(minutes=ttl_minutes or settings.SESSION_TIMEOUT_MINUTES)
+        self.flush_interval = flush_interval or settings.SESSION_FLUSH_INTERVAL_SECONDS
+        self.sweep_interval = sweep_interval or settings.SESSION_SWEEP_INTERVAL_SECONDS
+        self._entries: Dict[str, SessionEntry] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Si la tarea de guardado en segundo plano está activa"""
+        return self._task is not None and not self._task.done()
+
+    def touch(self, phone_number: str) -> SessionEntry:
+        """
+        Registrar un mensaje en la sesión del número (sin acceso a la base de datos)
+
+        Args:
+            phone_number: Número de teléfono
+
+        Returns:
+            Sesión activa en memoria
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None or entry.expires_at <= now:
+                entry = self._entries[phone_number] = SessionEntry(phone_number, now, self.ttl)
+            entry.message_count += 1
+            entry.pending += 1
+            return entry
+
+    def _take_dirty(self) -> List[dict]:
+        """Extraer cambios pendientes y marcarlos como guardados"""
+        rows = []
+        with self._lock:
+            for entry in self._entries.values():
+                if not entry.pending:
+                    continue
+                rows.append({
+                    "phone_number": entry.phone_number,
+                    "message_count": entry.pending,
+                    "is_active": True,
+                    "created_at": entry.created_at,
+                    "expires_at": entry.expires_at,
+                })
+                entry.pending = 0
+        return rows
+
+    def _restore(self, rows: List[dict]) -> None:
+        """Devolver cambios a memoria si el guardado falló"""
+        with self._lock:
+            for row in rows:
+                entry = self._entries.get(row["phone_number"])
+                if entry is not None and entry.expires_at == row["expires_at"]:
+                    entry.pending += row["message_count"]
+
+    def flush(self) -> int:
+        """
+        Guardar en la base de datos los contadores acumulados
+
+        Los mensajes se suman al contador guardado; solo si la fila guardada ya expiró
+        se reemplaza por la ventana nueva. La decisión se toma en SQL con la fila actual,
+        así otro worker o un reinicio no reinician el contador de una sesión activa.
+
+        Returns:
+            Número de sesiones guardadas
+        """
+        with self._flush_lock:
+            rows = self._take_dirty()
+            if not rows:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                with get_db_context() as db:
+                    _upsert(db, rows, datetime.now(timezone.utc))
+                    db.commit()
+            except Exception as e:
+                self._restore(rows)
+                logger.error("❌ Error guardando sesiones: %s", e)
+                return 0
+
+            session_flush_seconds.observe(time.perf_counter() - start)
+            session_flush_rows_total.inc(len(rows))
+            return len(rows)
+
+    def sweep(self) -> int:
+        """
+        Borrar sesiones expiradas en memoria y en la base de datos (un solo DELETE)
+
+        Returns:
+            Filas borradas en la base de datos
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            expired = [phone for phone, entry in self._entries.items() if entry.expires_at <= now and not entry.pending]
+            for phone in expired:
+                del self._entries[phone]
+            session_store_entries.set(len(self._entries))
+
+        try:
+            with get_db_context() as db:
+                result = db.execute(delete(SessionModel).where(SessionModel.expires_at <= now))
+                db.commit()
+                return result.rowcount or 0
+        except Exception as e:
+            logger.error("❌ Error limpiando sesiones expiradas: %s", e)
+            return 0
+
+    async def _run(self) -> None:
+        """Bucle de guardado y limpieza en segundo plano"""
+        last_sweep = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+            if time.monotonic() - last_sweep >= self.sweep_interval:
+                last_sweep = time.monotonic()
+                deleted = await asyncio.to_thread(self.sweep)
+                if deleted:
+                    logger.info("🧹 Sesiones expiradas eliminadas: %s", deleted)
+
+    def start(self) -> None:
+        """Iniciar la tarea en segundo plano (requiere un event loop activo)"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("✅ Almacén de sesiones iniciado (guardado cada %ss)", self.flush_interval)
+
+    async def stop(self) -> None:
+        """Detener la tarea y guardar lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+def _upsert(db, rows: List[dict], now: datetime) -> None:
+    """
+    Insertar o actualizar sesiones en un solo INSERT ... ON CONFLICT
+
+    Args:
+        db: Sesión de base de datos
+        rows: Filas a guardar
+        now: Momento del guardado (las filas con expires_at anterior se reemplazan)
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _upsert_generic(db, rows, now)
+        return
+    
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        _upsert_batch(db, dialect, rows[start:start + UPSERT_BATCH_SIZE], now)
+
+
+def _merge_values(new: dict, now: datetime) -> dict:
+    """
+    Columnas a actualizar en una fila existente
+
+    Si la sesión guardada sigue activa se suman los mensajes y se conserva su ventana;
+    si expiró, la fila pasa a la ventana nueva con el contador de esta.
+
+    Args:
+        new: Valores nuevos (columnas de `excluded` o de la fila en memoria)
+        now: Momento del guardado
+    """
+    expired = SessionModel.expires_at <= now
+    return {
+        "message_count": case(
+            (expired, new["message_count"]),
+            else_=SessionModel.message_count + new["message_count"]
+        ),
+        "created_at": case((expired, new["created_at"]), else_=SessionModel.created_at),
+        "expires_at": case((expired, new["expires_at"]), else_=SessionModel.expires_at),
+        "is_active": True,
+        "updated_at": now,
+    }
+
+
+def _upsert_batch(db, dialect: str, rows: List[dict], now: datetime) -> None:
+    """Un INSERT ... ON CONFLICT DO UPDATE con varias filas"""
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(SessionModel).values(rows)
+    excluded = {
+        column: getattr(stmt.excluded, column) for column in ("message_count", "created_at", "expires_at")
+    }
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SessionModel.phone_number],
+        set_=_merge_values(excluded, now)
+    ))
+
+
+def _upsert_generic(db, rows: List[dict], now: datetime) -> None:
+    """Upsert fila por fila para dialectos sin ON CONFLICT"""
+    for row in rows:
+        result = db.execute(
+            update(SessionModel)
+            .where(SessionModel.phone_number == row["phone_number"])
+            .values(_merge_values(row, now))
+        )
+        if not result.rowcount:
+            db.add(SessionModel(**row))
+
+
+# Instancia global del almacén
+session_store = SessionStore()
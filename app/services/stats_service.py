@@ -0,0 +1,374 @@
+"""
+Servicio de estadísticas: agregados por hora y por día (rollups)
+
+Los contadores se actualizan de forma incremental con cada cambio (mensajes y cambios
+de estado). Con la aplicación en marcha se suman en memoria cuando la transacción del
+cambio se confirma (un rollback los descarta), y una tarea en segundo plano los guarda
+cada STATS_FLUSH_INTERVAL_SECONDS con un upsert por lotes: así los workers no se
+bloquean entre sí en las mismas filas de la hora y el día actuales. Sin la tarea
+(scripts, STATS_FLUSH_INTERVAL_SECONDS=0) se guardan en la transacción del cambio.
+
+Las series de tiempo se leen solo de la tabla de agregados, así que su costo depende
+del número de periodos pedidos y no del volumen de leads o conversaciones.
+
+Métricas:
+    messages.user / messages.assistant   Mensajes del historial por rol
+    status.<ESTADO>                      Leads que pasaron a ese estado (status.CONVERTED = conversiones)
+"""
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import get_db_context
+from app.models.lead import Conversation, Lead, LeadStatusEnum, StatsRollup
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+
+# Operador usado cuando el número no tiene lead
+UNKNOWN_OPERATOR = "UNKNOWN"
+
+
+def message_metric(role: str) -> str:
+    """Nombre de la métrica de mensajes de un rol"""
+    return f"messages.{role}"
+
+
+def status_metric(status: LeadStatusEnum) -> str:
+    """Nombre de la métrica de transiciones a un estado"""
+    return f"status.{status.value}"
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    """Inicio (UTC) del periodo que contiene `moment`"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def step(granularity: str) -> timedelta:
+    """Duración de un periodo"""
+    return timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+
+
+RollupKey = Tuple[str, datetime, str, str]
+
+# Contadores de la transacción en curso, en Session.info, hasta su commit
+_PENDING_KEY = "pending_rollups"
+
+
+class RollupRecorder:
+    """Acumulador en memoria de los agregados con guardado por lotes"""
+
+    def __init__(self, flush_interval: Optional[float] = None):
+        """
+        Args:
+            flush_interval: Segundos entre guardados (por defecto STATS_FLUSH_INTERVAL_SECONDS)
+        """
+        self.flush_interval = settings.STATS_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Si la tarea de guardado en segundo plano está activa"""
+        return self._task is not None and not self._task.done()
+
+    def add(self, counts: Dict[RollupKey, int]) -> None:
+        """Sumar contadores en memoria (sin acceso a la base de datos)"""
+        with self._lock:
+            self._counts.update(counts)
+
+    def flush(self) -> int:
+        """
+        Sumar los contadores acumulados a `stats_rollups`
+
+        Returns:
+            Filas de agregados guardadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+            if not counts:
+                return 0
+
+            try:
+                with get_db_context() as db:
+                    _add_counts(db, counts, replace=False)
+                    db.commit()
+            except Exception as e:
+                # Las claves son por periodo, operador y métrica: lo devuelto no crece sin límite
+                self.add(counts)
+                logger.error("❌ Error guardando agregados de estadísticas: %s", e)
+                return 0
+            return len(counts)
+
+    async def _run(self) -> None:
+        """Bucle de guardado en segundo plano"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        """Iniciar la tarea en segundo plano (requiere un event loop activo)"""
+        if not self.running and self.flush_interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("✅ Agregados de estadísticas por lotes (guardado cada %ss)", self.flush_interval)
+
+    async def stop(self) -> None:
+        """Detener la tarea y guardar lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+class StatsService:
+    """Servicio para mantener y consultar los agregados de estadísticas"""
+
+    @staticmethod
+    def increment(db: Session, events: Iterable[Tuple[datetime, str, str]]) -> None:
+        """
+        Sumar eventos a los agregados por hora y por día
+
+        Con el guardado por lotes activo se suman en memoria recién cuando `db` confirma
+        su transacción (si hace rollback no se cuentan); si no, se escriben en la
+        transacción de `db` (sin commit).
+
+        Args:
+            db: Sesión de base de datos (su transacción decide si los eventos cuentan)
+            events: (momento, operador, métrica) por cada evento
+        """
+        counts = Counter()
+        for moment, operator, metric in events:
+            for granularity in GRANULARITIES:
+                counts[(granularity, truncate(moment, granularity), operator or UNKNOWN_OPERATOR, metric)] += 1
+
+        if not counts:
+            return
+        if rollup_recorder.running:
+            if not db.in_transaction():
+                # Sin transacción abierta, un close() no dispararía el descarte
+                db.begin()
+            db.info.setdefault(_PENDING_KEY, Counter()).update(counts)
+        else:
+            _add_counts(db, counts, replace=False)
+
+    @staticmethod
+    def timeseries(
+        db: Session,
+        granularity: str,
+        start: datetime,
+        end: datetime,
+        metrics: Optional[List[str]] = None,
+        operator: Optional[str] = None
+    ) -> Dict[str, List[dict]]:
+        """
+        Series de tiempo desde los agregados, con ceros en los periodos sin datos
+
+        Args:
+            db: Sesión de base de datos
+            granularity: 'hour' o 'day'
+            start: Inicio (incluido)
+            end: Fin (excluido)
+            metrics: Métricas a incluir (por defecto todas las que tengan datos)
+            operator: Operador objetivo (por defecto la suma de todos)
+
+        Returns:
+            {métrica: [{"bucket": datetime, "count": int}, ...]}
+        """
+        first = truncate(start, granularity)
+        buckets = []
+        bucket = first
+        while bucket < end:
+            buckets.append(bucket)
+            bucket += step(granularity)
+
+        query = (
+            select(StatsRollup.metric, StatsRollup.bucket, func.sum(StatsRollup.count))
+            .where(StatsRollup.granularity == granularity)
+            .where(StatsRollup.bucket >= first)
+            .where(StatsRollup.bucket < end)
+            .group_by(StatsRollup.metric, StatsRollup.bucket)
+        )
+        if metrics:
+            query = query.where(StatsRollup.metric.in_(metrics))
+        if operator:
+            query = query.where(StatsRollup.operator == operator)
+
+        values: Dict[str, Dict[datetime, int]] = {metric: {} for metric in metrics or []}
+        for metric, bucket, count in db.execute(query):
+            values.setdefault(metric, {})[truncate(bucket, granularity)] = int(count)
+
+        return {
+            metric: [{"bucket": bucket, "count": by_bucket.get(bucket, 0)} for bucket in buckets]
+            for metric, by_bucket in sorted(values.items())
+        }
+
+    @staticmethod
+    def rebuild(db: Session, since: Optional[datetime] = None) -> int:
+        """
+        Reconstruir los agregados desde el historial (backfill)
+
+        Mensajes: desde `conversations`. Estados: el historial no guarda cada transición,
+        así que se cuenta el estado actual de cada lead en su última modificación
+        (`converted_at` para CONVERTED); las transiciones intermedias no se recuperan.
+        Los mensajes ya archivados (conversation_archives) no se cuentan: usar `since`
+        posterior a la fecha de corte del archivo.
+
+        Args:
+            db: Sesión de base de datos
+            since: Reconstruir solo desde esta fecha (por defecto todo)
+
+        Returns:
+            Filas de agregados escritas
+        """
+        dialect = db.get_bind().dialect.name
+        since = truncate(since, "day") if since else None
+        counts = Counter()
+
+        for granularity in GRANULARITIES:
+            # Mensajes por rol y operador del lead
+            moment = Conversation.created_at
+            bucket = _bucket_expr(dialect, granularity, moment)
+            query = (
+                select(bucket, Lead.target_operator, Conversation.role, func.count())
+                .select_from(Conversation)
+                .outerjoin(Lead, Lead.phone_number == Conversation.phone_number)
+                .group_by(bucket, Lead.target_operator, Conversation.role)
+            )
+            if since:
+                query = query.where(moment >= since)
+            for bucket_value, operator, role, count in db.execute(query):
+                counts[(granularity, _parse_bucket(bucket_value), _operator_value(operator), message_metric(role))] += count
+
+            # Estado actual de cada lead en su último cambio
+            moment = func.coalesce(Lead.converted_at, Lead.updated_at, Lead.created_at)
+            bucket = _bucket_expr(dialect, granularity, moment)
+            query = (
+                select(bucket, Lead.target_operator, Lead.status, func.count())
+                .where(Lead.status != LeadStatusEnum.PENDING)
+                .group_by(bucket, Lead.target_operator, Lead.status)
+            )
+            if since:
+                query = query.where(moment >= since)
+            for bucket_value, operator, status, count in db.execute(query):
+                counts[(granularity, _parse_bucket(bucket_value), _operator_value(operator), status_metric(status))] += count
+
+        stmt = delete(StatsRollup)
+        if since:
+            stmt = stmt.where(StatsRollup.bucket >= since)
+        db.execute(stmt)
+
+        if counts:
+            _add_counts(db, counts, replace=True)
+        db.commit()
+
+        logger.info("✅ Agregados reconstruidos: %s filas", len(counts))
+        return len(counts)
+
+
+def _commit_rollups(session: Session) -> None:
+    """Pasar al acumulador los contadores de la transacción confirmada"""
+    counts = session.info.pop(_PENDING_KEY, None)
+    if counts:
+        rollup_recorder.add(counts)
+
+
+def _discard_rollups(session: Session, transaction) -> None:
+    """Descartar los contadores de una transacción que terminó sin commit (rollback o close)"""
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+event.listen(Session, "after_commit", _commit_rollups)
+event.listen(Session, "after_transaction_end", _discard_rollups)
+
+
+def _add_counts(db: Session, counts: Dict[RollupKey, int], replace: bool) -> None:
+    """
+    Sumar (o fijar) contadores con un INSERT ... ON CONFLICT compilado una vez
+
+    Args:
+        db: Sesión de base de datos
+        counts: {(granularidad, periodo, operador, métrica): cantidad}
+        replace: True fija el valor, False lo suma al existente
+    """
+    rows = [
+        {"granularity": granularity, "bucket": bucket, "operator": operator, "metric": metric, "count": count}
+        for (granularity, bucket, operator, metric), count in counts.items()
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _add_counts_generic(db, rows, replace)
+        return
+
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(StatsRollup)
+    count = stmt.excluded.count if replace else StatsRollup.count + stmt.excluded.count
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StatsRollup.granularity, StatsRollup.metric, StatsRollup.operator, StatsRollup.bucket],
+            set_={"count": count}
+        ),
+        rows
+    )
+
+
+def _add_counts_generic(db: Session, rows: List[dict], replace: bool) -> None:
+    """Upsert fila por fila para dialectos sin ON CONFLICT"""
+    for row in rows:
+        result = db.execute(
+            update(StatsRollup)
+            .where(StatsRollup.granularity == row["granularity"])
+            .where(StatsRollup.metric == row["metric"])
+            .where(StatsRollup.operator == row["operator"])
+            .where(StatsRollup.bucket == row["bucket"])
+            .values(count=row["count"] if replace else StatsRollup.count + row["count"])
+        )
+        if not result.rowcount:
+            db.add(StatsRollup(**row))
+
+
+def _bucket_expr(dialect: str, granularity: str, column):
+    """Expresión SQL que trunca una fecha al periodo (en UTC)"""
+    if dialect == "postgresql":
+        return func.date_trunc(granularity, func.timezone("UTC", column))
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00" if granularity == "hour" else "%Y-%m-%d 00:00:00", column)
+    raise ValueError(f"Backfill no soportado para el dialecto {dialect}")
+
+
+def _parse_bucket(value) -> datetime:
+    """Periodo devuelto por la base de datos como datetime UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _operator_value(operator) -> str:
+    """Operador como texto (enum o valor guardado)"""
+    return getattr(operator, "value", operator) or UNKNOWN_OPERATOR
+
+
+# Instancias globales
+rollup_recorder = RollupRecorder()
+stats_service = StatsService()
@@ -0,0 +1,176 @@
+"""
+Servicio de plantillas para mensajes de primer contacto (sin llamadas a la IA)
+"""
+
+from app.templates.first_contact import FIRST_CONTACT_TEMPLATES, DEFAULT_FIRST_CONTACT_TEMPLATES
+from app.templates.operators import OPERATOR_BENEFITS
+from string import Formatter
+from typing import Dict, List, NamedTuple, Optional
+from bisect import bisect_right
+from itertools import accumulate
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos que una plantilla puede usar
+TEMPLATE_FIELDS = frozenset({
+    "greeting", "name", "target_operator", "current_operator", "benefit", "second_benefit"
+})
+
+
+class RenderedMessage(NamedTuple):
+    """Mensaje renderizado y la variante que lo generó"""
+    variant_id: str
+    message: str
+
+
+class CompiledTemplate:
+    """Plantilla validada una sola vez y lista para renderizar"""
+
+    __slots__ = ("variant_id", "weight", "_format")
+
+    def __init__(self, variant_id: str, text: str, weight: int = 1):
+        """
+        Compilar plantilla
+
+        Args:
+            variant_id: Identificador estable de la variante
+            text: Texto con campos en formato str.format
+            weight: Peso relativo para la selección A/B
+
+        Raises:
+            ValueError: Si la plantilla usa campos desconocidos o un peso inválido
+        """
+        fields = {field for _, field, _, _ in Formatter().parse(text) if field is not None}
+        unknown = fields - TEMPLATE_FIELDS
+        if unknown:
+            raise ValueError(f"Plantilla {variant_id} usa campos desconocidos: {sorted(unknown)}")
+        if weight <= 0:
+            raise ValueError(f"Plantilla {variant_id} debe tener peso positivo")
+
+        self.variant_id = variant_id
+        self.weight = weight
+        self._format = text.format_map
+
+    def render(self, context: Dict[str, str]) -> str:
+        """Renderizar la plantilla con el contexto del lead"""
+        return self._format(context)
+
+
+class _VariantSet:
+    """Conjunto de variantes de un operador con selección ponderada"""
+
+    __slots__ = ("variants", "_cumulative", "_total")
+
+    def __init__(self, variants: List[CompiledTemplate]):
+        self.variants = variants
+        self._cumulative = list(accumulate(v.weight for v in variants))
+        self._total = self._cumulative[-1]
+
+    def pick(self, key: str) -> CompiledTemplate:
+        """Elegir variante de forma determinista (el mismo lead siempre recibe la misma)"""
+        bucket = zlib.crc32(key.encode("utf-8")) % self._total
+        return self.variants[bisect_right(self._cumulative, bucket)]
+
+
+class TemplateService:
+    """Servicio para renderizar mensajes de primer contacto por operador"""
+
+    def __init__(
+        self,
+        templates: Optional[Dict[str, List[dict]]] = None,
+        default_templates: Optional[List[dict]] = None
+    ):
+        """
+        Compilar todas las plantillas por operador
+
+        Args:
+            templates: Plantillas por operador (por defecto FIRST_CONTACT_TEMPLATES)
+            default_templates: Plantillas para operadores sin plantillas propias
+        """
+        templates = FIRST_CONTACT_TEMPLATES if templates is None else templates
+        default_templates = DEFAULT_FIRST_CONTACT_TEMPLATES if default_templates is None else default_templates
+
+        self._variant_sets = {
+            operator: self._compile(variants) for operator, variants in templates.items()
+        }
+        self._default_set = self._compile(default_templates)
+
+        # Beneficios precalculados para el contexto (en minúscula inicial para usarlos en medio de frase)
+        self._benefits = {
+            operator: [b[:1].lower() + b[1:] for b in benefits]
+            for operator, benefits in OPERATOR_BENEFITS.items()
+        }
+
+    @staticmethod
+    def _compile(variants: List[dict]) -> _VariantSet:
+        """Compilar una lista de variantes"""
+        if not variants:
+            raise ValueError("Se requiere al menos una variante de plantilla")
+        return _VariantSet([
+            CompiledTemplate(v["id"], v["text"], v.get("weight", 1)) for v in variants
+        ])
+
+    def variant_ids(self, target_operator: str) -> List[str]:
+        """Listar ids de variantes disponibles para un operador"""
+        variant_set = self._variant_sets.get(target_operator, self._default_set)
+        return [v.variant_id for v in variant_set.variants]
+
+    def render_opener(
+        self,
+        phone_number: str,
+        target_operator: str,
+        name: Optional[str] = None,
+        current_operator: Optional[str] = None
+    ) -> RenderedMessage:
+        """
+        Renderizar mensaje de primer contacto personalizado
+
+        Args:
+            phone_number: Número de teléfono (define la variante A/B asignada)
+            target_operator: Operador objetivo (CLARO, WOW, WIN)
+            name: Nombre del lead (opcional)
+            current_operator: Operador actual del lead (opcional)
+
+        Returns:
+            Variante usada y mensaje renderizado
+        """
+        first_name = name.strip().split(" ", 1)[0].title() if name and name.strip() else ""
+        if current_operator == target_operator:
+            # Un lead que ya es cliente del operador objetivo no debe leer "cámbiate desde CLARO"
+            current_operator = None
+        benefits = self._benefits.get(target_operator) or ["los mejores planes", "atención personalizada"]
+
+        context = {
+            "greeting": f"Hola {first_name}" if first_name else "Hola",
+            "name": first_name,
+            "target_operator": target_operator,
+            "current_operator": current_operator or "tu operador actual",
+            "benefit": benefits[0],
+            "second_benefit": benefits[1] if len(benefits) > 1 else benefits[0],
+        }
+
+        variant = self._variant_sets.get(target_operator, self._default_set).pick(phone_number)
+        return RenderedMessage(variant.variant_id, variant.render(context))
+
+    def render_for_lead(self, lead) -> RenderedMessage:
+        """
+        Renderizar mensaje de primer contacto para un Lead
+
+        Args:
+            lead: Lead (modelo SQLAlchemy)
+
+        Returns:
+            Variante usada y mensaje renderizado
+        """
+        return self.render_opener(
+            phone_number=lead.phone_number,
+            target_operator=lead.target_operator.value,
+            name=lead.name,
+            current_operator=lead.current_operator.value if lead.current_operator else None
+        )
+
+
+# Instancia global del servicio
+template_service = TemplateService()
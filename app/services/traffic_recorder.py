@@ -0,0 +1,188 @@
+"""
+Grabación del tráfico del webhook para reproducirlo después (scripts/replay_traffic.py)
+
+Con TRAFFIC_RECORD_ENABLED=True cada petición a /webhook/whatsapp se guarda como una
+línea JSON con su hora de llegada, su latencia y los mensajes anonimizados:
+
+- Números de teléfono: seudónimo estable (HMAC con TRAFFIC_RECORD_SALT), así el orden
+  y la agrupación por número se conservan sin guardar el número real. Sin
+  TRAFFIC_RECORD_SALT se crea una clave al azar una sola vez y se guarda en
+  TRAFFIC_RECORD_DIR; todos los workers y reinicios que graban ahí la comparten, así
+  un número tiene el mismo seudónimo en todas las capturas.
+- Texto: correos y secuencias de 5 o más dígitos (DNI, teléfonos, tarjetas) se
+  reemplazan conservando el largo del mensaje.
+
+Las líneas se escriben desde un hilo en segundo plano en TRAFFIC_RECORD_DIR; al llegar a
+TRAFFIC_RECORD_MAX_BYTES el archivo rota y el anterior se comprime con gzip.
+"""
+
+from app.core.config import settings
+from app.schemas.webhook import WhatsAppWebhook
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FILENAME = "webhook.jsonl"
+SALT_FILENAME = ".salt"
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+DIGITS_PATTERN = re.compile(r"\d{5,}")
+
+
+def _gzip_namer(name: str) -> str:
+    """Nombre del archivo rotado (comprimido)"""
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Comprimir el archivo rotado"""
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class TrafficRecorder:
+    """Grabador de peticiones del webhook (opcional, deshabilitado por defecto)"""
+
+    def __init__(self):
+        self._listener: Optional[QueueListener] = None
+        self._logger = logging.getLogger("angia.traffic")
+        self._logger.propagate = False
+        self._salt: Optional[bytes] = None
+
+    @property
+    def running(self) -> bool:
+        """Si la grabación está activa"""
+        return self._listener is not None
+
+    def pseudonym(self, phone_number: str) -> str:
+        """Seudónimo estable de un número (mismo largo de un número real, prefijo +0)"""
+        if self._salt is None:
+            self._salt = _load_salt(Path(settings.TRAFFIC_RECORD_DIR))
+        digest = hmac.new(self._salt, phone_number.encode(), hashlib.sha256).hexdigest()
+        return "+0" + str(int(digest[:16], 16))[:11].zfill(11)
+
+    def sanitize(self, webhook: WhatsAppWebhook) -> list:
+        """Mensajes sin datos personales (mismo orden y largo)"""
+        return [
+            {
+                "from_number": self.pseudonym(msg.from_number),
+                "message": _mask_text(msg.message),
+                "message_id": hashlib.sha1(msg.message_id.encode()).hexdigest()[:16] if msg.message_id else None,
+                "timestamp": msg.timestamp.isoformat() if msg.timestamp else None,
+            }
+            for msg in webhook.messages
+        ]
+
+    def record(self, webhook: WhatsAppWebhook, arrived_at: float, latency_ms: float, replies: int) -> None:
+        """
+        Guardar una petición (solo encola; la escritura ocurre en segundo plano)
+
+        Args:
+            webhook: Petición recibida
+            arrived_at: Hora de llegada (epoch en segundos)
+            latency_ms: Tiempo de procesamiento de la petición
+            replies: Respuestas generadas
+        """
+        if self._listener is None:
+            return
+        self._logger.info(json.dumps(
+            {
+                "t": round(arrived_at, 6),
+                "latency_ms": round(latency_ms, 2),
+                "replies": replies,
+                "messages": self.sanitize(webhook),
+            },
+            ensure_ascii=False,
+            separators=(",", ":")
+        ))
+
+    def start(self) -> None:
+        """Abrir el archivo de captura y el hilo de escritura"""
+        if self._listener is not None:
+            return
+        directory = Path(settings.TRAFFIC_RECORD_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._salt = _load_salt(directory)
+        # Un archivo por proceso: varios workers no pueden rotar el mismo archivo
+        path = directory / f"{os.getpid()}-{CAPTURE_FILENAME}"
+
+        output = RotatingFileHandler(
+            path,
+            maxBytes=settings.TRAFFIC_RECORD_MAX_BYTES,
+            backupCount=settings.TRAFFIC_RECORD_BACKUPS,
+            encoding="utf-8"
+        )
+        output.namer = _gzip_namer
+        output.rotator = _gzip_rotator
+        output.setFormatter(logging.Formatter("%(message)s"))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._logger.handlers = [QueueHandler(log_queue)]
+        self._logger.setLevel(logging.INFO)
+        self._listener = QueueListener(log_queue, output)
+        self._listener.start()
+        logger.info("🎙️ Grabando tráfico del webhook en %s", path)
+
+    def stop(self) -> None:
+        """Escribir lo pendiente y cerrar el archivo"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        self._logger.handlers = []
+
+
+def _load_salt(directory: Path) -> bytes:
+    """
+    Clave de los seudónimos: TRAFFIC_RECORD_SALT o la guardada en `directory`
+
+    El primer proceso crea el archivo (O_EXCL, así dos workers que arrancan a la vez no
+    escriben claves distintas); los demás la leen.
+    """
+    if settings.TRAFFIC_RECORD_SALT:
+        return settings.TRAFFIC_RECORD_SALT.encode()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / SALT_FILENAME
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Otro proceso pudo haberlo creado recién y aún no escribió la clave
+        for _ in range(50):
+            salt = path.read_text(encoding="utf-8").strip()
+            if salt:
+                return salt.encode()
+            time.sleep(0.01)
+        raise RuntimeError(f"{path} está vacío: bórralo o define TRAFFIC_RECORD_SALT")
+
+    salt = secrets.token_hex(16)
+    with os.fdopen(fd, "w", encoding="utf-8") as output:
+        output.write(salt)
+    logger.info("🔑 Clave de seudónimos creada en %s", path)
+    return salt.encode()
+
+
+def _mask_text(text: str) -> str:
+    """Reemplazar correos y secuencias de dígitos conservando el largo"""
+    text = EMAIL_PATTERN.sub(lambda match: "x" * len(match.group()), text)
+    return DIGITS_PATTERN.sub(lambda match: "0" * len(match.group()), text)
+
+
+# Instancia global
+traffic_recorder = TrafficRecorder()
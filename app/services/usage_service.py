@@ -0,0 +1,336 @@
+"""
+Consumo de la IA (tokens y latencia) y costo por conversión
+
+Cada llamada a la IA se suma en memoria por (día, lead, operador objetivo, modelo,
+versión de prompt); una tarea en segundo plano guarda los totales en `llm_usage` con
+un upsert por lotes cada USAGE_FLUSH_INTERVAL_SECONDS. Así la tabla crece una fila por
+lead, modelo y día, no una por llamada. Sin la tarea (scripts, procesos sin el evento
+de inicio) cada llamada se guarda en el momento.
+
+Si la base de datos falla, los totales vuelven a memoria hasta USAGE_MAX_PENDING_KEYS
+agregados; lo que exceda se descarta y se registra en el log.
+
+El reporte de costos usa los precios de AI_PRICING_PER_MILLION y cuenta como
+conversión cada lead con consumo en el rango que pasó a CONVERTED en el mismo rango.
+"""
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.database import get_db_context
+from app.models.lead import Lead, LeadStatusEnum, LlmUsage
+from datetime import date, datetime, time as dt_time, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Campos sumados en cada agregado (mismo orden que los valores en memoria)
+USAGE_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms")
+
+# Agrupaciones del reporte de costos
+GROUP_COLUMNS = {
+    "operator": LlmUsage.operator,
+    "model": LlmUsage.model,
+    "prompt_version": LlmUsage.prompt_version,
+    "lead": LlmUsage.phone_number,
+}
+
+UsageKey = Tuple[date, str, str, str, str]
+
+
+class UsageRecorder:
+    """Acumulador en memoria del consumo de la IA con guardado por lotes"""
+
+    def __init__(self, flush_interval: Optional[float] = None, max_pending: Optional[int] = None):
+        """
+        Args:
+            flush_interval: Segundos entre guardados (por defecto USAGE_FLUSH_INTERVAL_SECONDS)
+            max_pending: Agregados máximos en memoria (por defecto USAGE_MAX_PENDING_KEYS)
+        """
+        self.flush_interval = flush_interval or settings.USAGE_FLUSH_INTERVAL_SECONDS
+        self.max_pending = settings.USAGE_MAX_PENDING_KEYS if max_pending is None else max_pending
+        self._totals: Dict[UsageKey, List[int]] = {}
+        self._dropped = 0  # Llamadas descartadas por superar max_pending (desde el último aviso)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Si la tarea de guardado en segundo plano está activa"""
+        return self._task is not None and not self._task.done()
+
+    def record(
+        self,
+        phone_number: str,
+        operator: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+        latency_ms: float,
+        prompt_version: Optional[str] = None
+    ) -> None:
+        """
+        Sumar una llamada a la IA
+
+        Con la tarea en segundo plano activa solo suma en memoria; si no, guarda la
+        llamada en el momento (no acumula algo que nadie va a guardar).
+
+        Args:
+            phone_number: Número de teléfono del lead
+            operator: Operador objetivo del lead
+            model: Modelo usado
+            prompt_tokens: Tokens de entrada (incluye los de caché)
+            completion_tokens: Tokens generados
+            cached_tokens: Tokens de entrada leídos de la caché del proveedor
+            latency_ms: Duración de la llamada
+            prompt_version: Versión del prompt (por defecto AI_PROMPT_VERSION)
+        """
+        key = (
+            datetime.now(timezone.utc).date(), phone_number, operator or "UNKNOWN", model,
+            prompt_version or settings.AI_PROMPT_VERSION,
+        )
+        values = [1, prompt_tokens, completion_tokens, cached_tokens, int(round(latency_ms))]
+        if not self.running:
+            self._save({key: values})
+            return
+        self._add(key, values)
+
+    def _add(self, key: UsageKey, values: List[int]) -> None:
+        """Sumar a los totales en memoria (descarta claves nuevas por encima de max_pending)"""
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is not None:
+                for index, value in enumerate(values):
+                    totals[index] += value
+            elif len(self._totals) < self.max_pending:
+                self._totals[key] = list(values)
+            else:
+                self._dropped += values[0]
+
+    def _take(self) -> Dict[UsageKey, List[int]]:
+        """Extraer los totales pendientes"""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+        return totals
+
+    def _restore(self, totals: Dict[UsageKey, List[int]]) -> None:
+        """Devolver totales a memoria si el guardado falló (hasta max_pending)"""
+        for key, values in totals.items():
+            self._add(key, values)
+
+    def flush(self) -> int:
+        """
+        Sumar los totales acumulados a `llm_usage`
+
+        Returns:
+            Filas de agregados guardadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                logger.warning(
+                    "⚠️ Consumo de la IA descartado: %d llamadas (más de %d agregados sin guardar)",
+                    dropped, self.max_pending
+                )
+
+            totals = self._take()
+            if not totals:
+                return 0
+            if not self._save(totals):
+                self._restore(totals)
+                return 0
+            return len(totals)
+
+    def _save(self, totals: Dict[UsageKey, List[int]]) -> bool:
+        """Sumar totales a `llm_usage` (False si falló)"""
+        rows = [
+            {
+                "day": day, "phone_number": phone_number, "operator": operator, "model": model,
+                "prompt_version": prompt_version, **dict(zip(USAGE_FIELDS, values)),
+            }
+            for (day, phone_number, operator, model, prompt_version), values in totals.items()
+        ]
+        try:
+            with get_db_context() as db:
+                _add_usage(db, rows)
+                db.commit()
+        except Exception as e:
+            logger.error("❌ Error guardando consumo de la IA: %s", e)
+            return False
+        return True
+
+    async def _run(self) -> None:
+        """Bucle de guardado en segundo plano"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def start(self) -> None:
+        """Iniciar la tarea en segundo plano (requiere un event loop activo)"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("✅ Registro de consumo de la IA iniciado (guardado cada %ss)", self.flush_interval)
+
+    async def stop(self) -> None:
+        """Detener la tarea y guardar lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+class UsageService:
+    """Reportes de consumo y costo de la IA"""
+
+    @staticmethod
+    def cost_report(db: Session, start: date, end: date, group_by: str = "operator", limit: int = 100) -> dict:
+        """
+        Costo, tokens, latencia y conversiones por grupo
+
+        Args:
+            db: Sesión de base de datos
+            start: Primer día (incluido, UTC)
+            end: Último día (excluido, UTC)
+            group_by: operator, model, prompt_version o lead
+            limit: Grupos máximos (los de mayor costo)
+
+        Returns:
+            {"groups": [...], "total": {...}, "unpriced_models": [...]}; cada grupo con calls,
+            tokens, cost_usd, avg_latency_ms, conversions y cost_per_conversion
+        """
+        group_column = GROUP_COLUMNS[group_by]
+
+        # Un total por grupo y modelo: el precio depende del modelo
+        usage = db.execute(
+            select(
+                group_column, LlmUsage.model,
+                *(func.sum(getattr(LlmUsage, field)) for field in USAGE_FIELDS)
+            )
+            .where(LlmUsage.day >= start, LlmUsage.day < end)
+            .group_by(group_column, LlmUsage.model)
+        ).all()
+
+        # Leads con consumo en el rango que convirtieron en el rango
+        converted_in_range = (
+            select(Lead.phone_number)
+            .where(Lead.status == LeadStatusEnum.CONVERTED)
+            .where(Lead.converted_at >= _day_start(start), Lead.converted_at < _day_start(end))
+        )
+        conversions = dict(db.execute(
+            select(group_column, func.count(func.distinct(LlmUsage.phone_number)))
+            .where(LlmUsage.day >= start, LlmUsage.day < end)
+            .where(LlmUsage.phone_number.in_(converted_in_range))
+            .group_by(group_column)
+        ).all())
+
+        groups: Dict[str, dict] = {}
+        unpriced = set()
+        for key, model, *sums in usage:
+            totals = dict(zip(USAGE_FIELDS, (int(value or 0) for value in sums)))
+            cost = _cost(model, totals)
+            if cost is None:
+                unpriced.add(model)
+            group = groups.setdefault(key, _empty_group(key))
+            for field, value in totals.items():
+                group[field] += value
+            group["cost_usd"] += cost or 0.0
+
+        results = sorted(groups.values(), key=lambda group: group["cost_usd"], reverse=True)[:limit]
+        for group in results:
+            _finish_group(group, conversions.get(group["key"], 0))
+
+        total = _empty_group(None)
+        for group in groups.values():
+            for field in USAGE_FIELDS + ("cost_usd",):
+                total[field] += group[field]
+        # Un lead puede estar en varios grupos (p. ej. dos modelos): no se suman las conversiones por grupo
+        total_conversions = db.scalar(
+            select(func.count(func.distinct(LlmUsage.phone_number)))
+            .where(LlmUsage.day >= start, LlmUsage.day < end)
+            .where(LlmUsage.phone_number.in_(converted_in_range))
+        )
+        _finish_group(total, total_conversions or 0)
+
+        return {"groups": results, "total": total, "unpriced_models": sorted(unpriced)}
+
+
+def _add_usage(db: Session, rows: List[dict]) -> None:
+    """Sumar totales con un INSERT ... ON CONFLICT compilado una vez"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        _add_usage_generic(db, rows)
+        return
+
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(LlmUsage)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[LlmUsage.day, LlmUsage.phone_number, LlmUsage.operator, LlmUsage.model, LlmUsage.prompt_version],
+            set_={field: getattr(LlmUsage, field) + getattr(stmt.excluded, field) for field in USAGE_FIELDS}
+        ),
+        rows
+    )
+
+
+def _add_usage_generic(db: Session, rows: List[dict]) -> None:
+    """Upsert fila por fila para dialectos sin ON CONFLICT"""
+    for row in rows:
+        result = db.execute(
+            update(LlmUsage)
+            .where(LlmUsage.day == row["day"])
+            .where(LlmUsage.phone_number == row["phone_number"])
+            .where(LlmUsage.operator == row["operator"])
+            .where(LlmUsage.model == row["model"])
+            .where(LlmUsage.prompt_version == row["prompt_version"])
+            .values({field: getattr(LlmUsage, field) + row[field] for field in USAGE_FIELDS})
+        )
+        if not result.rowcount:
+            db.add(LlmUsage(**row))
+
+
+def _cost(model: str, totals: dict) -> Optional[float]:
+    """Costo en USD según AI_PRICING_PER_MILLION (None si el modelo no tiene precio)"""
+    price = settings.AI_PRICING_PER_MILLION.get(model)
+    if price is None:
+        return None
+    cached = totals["cached_tokens"]
+    uncached = totals["prompt_tokens"] - cached
+    return (
+        uncached * price.get("prompt", 0.0)
+        + cached * price.get("cached", price.get("prompt", 0.0))
+        + totals["completion_tokens"] * price.get("completion", 0.0)
+    ) / 1_000_000
+
+
+def _empty_group(key) -> dict:
+    """Grupo del reporte con totales en cero"""
+    return {"key": key, **{field: 0 for field in USAGE_FIELDS}, "cost_usd": 0.0}
+
+
+def _finish_group(group: dict, conversions: int) -> None:
+    """Agregar promedios, conversiones y costo por conversión"""
+    group["cost_usd"] = round(group["cost_usd"], 6)
+    group["avg_latency_ms"] = round(group["latency_ms"] / group["calls"], 1) if group["calls"] else None
+    group["conversions"] = conversions
+    group["cost_per_conversion"] = round(group["cost_usd"] / conversions, 6) if conversions else None
+
+
+def _day_start(day: date) -> datetime:
+    """Inicio del día en UTC"""
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+# Instancias globales
+usage_recorder = UsageRecorder()
+usage_service = UsageService()
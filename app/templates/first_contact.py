@@ -0,0 +1,84 @@
+"""
+Plantillas de mensajes de primer contacto por operador (variantes A/B)
+
+Campos disponibles en cada plantilla:
+- {greeting}: "Hola Juan" o "Hola" si no hay nombre
+- {name}: primer nombre del lead (puede estar vacío)
+- {target_operator}: operador objetivo (CLARO, WOW, WIN)
+- {current_operator}: operador actual o "tu operador actual"
+- {benefit}: beneficio principal del operador objetivo
+- {second_benefit}: segundo beneficio del operador objetivo
+"""
+
+from typing import Dict, List
+
+# Cada variante tiene un id estable (para medir conversión por variante) y un peso relativo
+FIRST_CONTACT_TEMPLATES: Dict[str, List[dict]] = {
+    "CLARO": [
+        {
+            "id": "claro_a",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! 👋 Te escribo de CLARO. Vi que hoy estás con {current_operator} "
+                "y quería contarte que con nosotros tienes {benefit}. "
+                "¿Te comparto los planes disponibles para ti?"
+            ),
+        },
+        {
+            "id": "claro_b",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! Soy tu asesora de CLARO 📱 Tenemos {benefit} y {second_benefit}. "
+                "¿Te gustaría saber cuánto ahorrarías al cambiarte desde {current_operator}?"
+            ),
+        },
+    ],
+    "WOW": [
+        {
+            "id": "wow_a",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! 👋 Te escribo de WOW. Con nosotros tienes {benefit} "
+                "y {second_benefit}. ¿Te cuento qué planes hay en tu zona?"
+            ),
+        },
+        {
+            "id": "wow_b",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! Soy tu asesora de WOW 🚀 Si hoy estás con {current_operator}, "
+                "te puedo mostrar cómo mejorar tu internet con {benefit}. ¿Te interesa?"
+            ),
+        },
+    ],
+    "WIN": [
+        {
+            "id": "win_a",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! 👋 Te escribo de WIN. Tenemos {benefit} y {second_benefit}. "
+                "¿Te comparto las opciones para ti?"
+            ),
+        },
+        {
+            "id": "win_b",
+            "weight": 50,
+            "text": (
+                "¡{greeting}! Soy tu asesora de WIN 📶 Muchos clientes de {current_operator} "
+                "se están cambiando por {benefit}. ¿Quieres que te cuente más?"
+            ),
+        },
+    ],
+}
+
+# Variantes usadas cuando el operador objetivo no tiene plantillas propias
+DEFAULT_FIRST_CONTACT_TEMPLATES: List[dict] = [
+    {
+        "id": "default_a",
+        "weight": 100,
+        "text": (
+            "¡{greeting}! 👋 Te escribo de {target_operator}. "
+            "¿Te gustaría conocer los planes que tenemos para ti?"
+        ),
+    },
+]
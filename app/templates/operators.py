@@ -0,0 +1,30 @@
+"""
+Conocimiento de operadores compartido por el prompt de la IA y las plantillas
+"""
+
+from typing import Dict, List
+
+# Beneficios por operador (usados en el system prompt y en las plantillas de primer contacto)
+OPERATOR_BENEFITS: Dict[str, List[str]] = {
+    "CLARO": [
+        "Mayor cobertura 4G/5G en Perú",
+        "Planes con más gigas y minutos",
+        "Roaming internacional incluido",
+        "App Mi Claro para gestionar tu línea",
+        "Atención al cliente 24/7",
+    ],
+    "WOW": [
+        "Internet de fibra óptica ultra rápido",
+        "Planes con Netflix, HBO Max incluidos",
+        "Sin permanencia mínima",
+        "Instalación gratis",
+        "Precio fijo sin sorpresas",
+    ],
+    "WIN": [
+        "Planes económicos y flexibles",
+        "Cobertura en todo Perú",
+        "Recargas desde S/5",
+        "Bonos de internet y llamadas",
+        "Sin contratos ni permanencia",
+    ],
+}
@@ -0,0 +1,62 @@
+"""
+Archivar conversaciones antiguas en la capa fría comprimida (conversation_archives)
+
+Uso:
+    python3 scripts/archive_conversations.py --older-than-days 90 --closed-idle-days 7 --dry-run
+    python3 scripts/archive_conversations.py --older-than-days 90
+"""
+
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.db.database import get_db_context
+from app.services.archive_service import archive_service
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def archive_conversations(older_than_days: int = None, closed_idle_days: int = None, dry_run: bool = False) -> dict:
+    """
+    Archivar mensajes antiguos y de leads cerrados
+    
+    Args:
+        older_than_days: Archivar mensajes con más de N días (cualquier lead)
+        closed_idle_days: Archivar mensajes con más de N días de leads cerrados
+        dry_run: Solo calcular el reporte
+    
+    Returns:
+        Reporte de archivo
+    """
+    now = datetime.now(timezone.utc)
+    before = now - timedelta(days=older_than_days) if older_than_days is not None else None
+    closed_before = now - timedelta(days=closed_idle_days) if closed_idle_days is not None else None
+    
+    with get_db_context() as db:
+        return archive_service.archive(db, before=before, closed_before=closed_before, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Archivar conversaciones antiguas")
+    parser.add_argument("--older-than-days", type=int, default=None, help="Mensajes con más de N días")
+    parser.add_argument("--closed-idle-days", type=int, default=None, help="Mensajes con más de N días de leads cerrados")
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar cuánto se archivaría")
+    
+    args = parser.parse_args()
+    
+    if args.older_than_days is None and args.closed_idle_days is None:
+        parser.error("Indica --older-than-days y/o --closed-idle-days")
+    
+    report = archive_conversations(args.older_than_days, args.closed_idle_days, args.dry_run)
+    print(json.dumps(report, indent=2))
+    
+    if report["table_bytes_before"] is not None and not args.dry_run:
+        logger.info("💡 PostgreSQL reutiliza el espacio liberado tras VACUUM; para devolverlo al disco: VACUUM FULL conversations")
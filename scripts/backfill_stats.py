@@ -0,0 +1,52 @@
+"""
+Reconstruir los agregados de estadísticas (stats_rollups) desde el historial
+
+Uso:
+    python3 scripts/backfill_stats.py                    # todo el historial
+    python3 scripts/backfill_stats.py --since 2025-11-01 # solo desde esa fecha
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.db.database import get_db_context, init_db
+from app.services.stats_service import stats_service
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill(since: datetime = None) -> int:
+    """
+    Reconstruir los agregados
+    
+    Args:
+        since: Fecha desde la que se reconstruye (por defecto todo el historial)
+    
+    Returns:
+        Filas de agregados escritas
+    """
+    logger.info("📊 Reconstruyendo agregados %s", "desde " + since.date().isoformat() if since else "(todo el historial)")
+    with get_db_context() as db:
+        return stats_service.rebuild(db, since)
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Reconstruir agregados de estadísticas")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="Fecha inicial (YYYY-MM-DD)")
+    parser.add_argument("--create-tables", action="store_true", help="Crear tablas faltantes antes de reconstruir")
+    
+    args = parser.parse_args()
+    
+    if args.create_tables:
+        init_db()
+    
+    rows = backfill(args.since)
+    logger.info("✅ %s filas de agregados escritas", rows)
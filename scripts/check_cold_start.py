@@ -0,0 +1,159 @@
+"""
+Verificación del presupuesto de arranque en frío
+
+Mide, en un proceso nuevo (como una instancia serverless recién creada), el tiempo de
+importar api/index.py y el de la primera petición real al webhook, y falla si superan
+el presupuesto. La IA es el servidor simulado (scripts/fake_llm.py) sin latencia, así
+la primera petición recorre la inicialización diferida (engine de la base de datos,
+cliente de OpenAI) sin depender del proveedor.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from load_test import wait_for
+
+ROOT = Path(__file__).parent.parent
+
+# Crear el esquema antes de medir (en producción create_all no corre al arrancar)
+SETUP = "from app.db.database import init_db; init_db()"
+
+# Código ejecutado en el proceso limpio
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from api.index import app
+imported = time.perf_counter()
+import app.db.database as database
+startup_modules = set(sys.modules)
+openai_at_import = "openai" in sys.modules
+engine_at_import = database._engine is not None
+from fastapi.testclient import TestClient
+client = TestClient(app)
+with client:
+    client_ready = time.perf_counter()
+    before_request = set(sys.modules)
+    response = client.post(
+        "/webhook/whatsapp",
+        json={"messages": [{"from_number": "+51900000001", "message": "Hola, quiero información de planes"}]},
+        headers={"X-Webhook-Secret": "cold-start"},
+    )
+    first_request = time.perf_counter()
+request_modules = sorted({name.split(".")[0] for name in set(sys.modules) - before_request})
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (first_request - client_ready) * 1000,
+    "status_code": response.status_code,
+    "replies": len(response.json()) if response.status_code == 200 else 0,
+    "openai_at_import": openai_at_import,
+    "engine_at_import": engine_at_import,
+    "engine_created": database._engine is not None,
+    "request_modules": request_modules,
+}))
+"""
+
+# Paquetes que la primera petición debe importar (si no, la inicialización diferida no corrió)
+REQUIRED_REQUEST_MODULES = ("openai",)
+
+
+def measure(runs: int, llm_port: int) -> dict:
+    """Medir varias veces (cada una con base de datos nueva) y quedarse con la mediana"""
+    llm_url = f"http://127.0.0.1:{llm_port}"
+    fake_llm = subprocess.Popen([
+        sys.executable, str(ROOT / "scripts" / "fake_llm.py"),
+        "--port", str(llm_port), "--latency-dist", "fixed", "--latency-ms", "0",
+    ], cwd=ROOT)
+
+    samples = []
+    try:
+        wait_for(f"{llm_url}/stats")
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as directory:
+                env = dict(os.environ)
+                env.update({
+                    "DATABASE_URL": f"sqlite:///{directory}/cold_start.db",
+                    "OPENAI_API_KEY": "cold-start",
+                    "OPENAI_BASE_URL": f"{llm_url}/v1",
+                    "WHATCHIM_WEBHOOK_SECRET": "cold-start",
+                    "ENVIRONMENT": "production",
+                    "DEBUG": "False",
+                    "LOG_LEVEL": "WARNING",
+                })
+                subprocess.run([sys.executable, "-c", SETUP], cwd=ROOT, env=env, check=True)
+
+                llm_calls = httpx.get(f"{llm_url}/stats").json()["requests"]
+                output = subprocess.run(
+                    [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+                ).stdout
+                sample = json.loads(output.strip().splitlines()[-1])
+                sample["llm_calls"] = httpx.get(f"{llm_url}/stats").json()["requests"] - llm_calls
+                samples.append(sample)
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return round(values[len(values) // 2], 1)
+
+    last = samples[-1]
+    return {
+        "runs": runs,
+        "import_ms": median("import_ms"),
+        "first_request_ms": median("first_request_ms"),
+        "status_code": last["status_code"],
+        "replies": last["replies"],
+        "llm_calls": last["llm_calls"],
+        "openai_at_import": any(sample["openai_at_import"] for sample in samples),
+        "engine_at_import": any(sample["engine_at_import"] for sample in samples),
+        "engine_created": all(sample["engine_created"] for sample in samples),
+        "request_modules": last["request_modules"],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Presupuesto de arranque en frío")
+    parser.add_argument("--import-budget-ms", type=float, default=1000, help="Máximo para importar api.index")
+    parser.add_argument("--first-request-budget-ms", type=float, default=1500, help="Máximo para la primera petición al webhook")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-port", type=int, default=8101, help="Puerto del servidor de IA simulado")
+
+    args = parser.parse_args()
+
+    result = measure(args.runs, args.llm_port)
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if result["status_code"] != 200 or result["replies"] != 1:
+        failures.append(f"el webhook respondió {result['status_code']} con {result['replies']} respuestas")
+    if result["llm_calls"] != 1:
+        failures.append(f"la primera petición hizo {result['llm_calls']} llamadas a la IA (se esperaba 1)")
+    if result["import_ms"] > args.import_budget_ms:
+        failures.append(f"import {result['import_ms']} ms > {args.import_budget_ms} ms")
+    if result["first_request_ms"] > args.first_request_budget_ms:
+        failures.append(f"primera petición {result['first_request_ms']} ms > {args.first_request_budget_ms} ms")
+    if result["openai_at_import"]:
+        failures.append("openai se importa en el arranque (debe ser perezoso)")
+    if result["engine_at_import"]:
+        failures.append("el engine de la base de datos se crea en el arranque (debe ser perezoso)")
+    if not result["engine_created"]:
+        failures.append("la primera petición no creó el engine de la base de datos")
+    for module in REQUIRED_REQUEST_MODULES:
+        if module not in result["request_modules"]:
+            failures.append(f"la primera petición no importó {module} (inicialización diferida rota)")
+
+    if failures:
+        print("❌ Presupuesto de arranque en frío excedido:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+
+    print("✅ Arranque en frío dentro del presupuesto")
@@ -0,0 +1,127 @@
+"""
+Servidor local compatible con OpenAI (chat completions) para pruebas de carga
+
+Simula la latencia y los errores del proveedor de IA sin consumir tokens reales.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Respuestas de ejemplo (el contenido no importa para la carga, solo la forma)
+CANNED_REPLIES = [
+    "¡Hola! Claro que sí, tenemos planes desde S/35 con 20GB. ¿Te gustaría conocerlos?",
+    "Perfecto, con la portabilidad mantienes tu mismo número. ¿Te agendo una llamada con un asesor?",
+    "Entiendo. Déjame verificar eso con un asesor especializado.",
+    "¡Gracias por tu tiempo! Si cambias de opinión, aquí estaré.",
+]
+
+
+class LatencyModel:
+    """Distribución de latencias simuladas"""
+
+    def __init__(self, distribution: str = "lognormal", latency_ms: float = 800, jitter_ms: float = 300):
+        """
+        Args:
+            distribution: fixed, uniform o lognormal
+            latency_ms: Latencia típica (mediana en lognormal)
+            jitter_ms: Dispersión (ancho del intervalo en uniform, desviación aproximada en lognormal)
+        """
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Distribución desconocida: {distribution}")
+        self.distribution = distribution
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def sample(self) -> float:
+        """Latencia simulada en segundos"""
+        if self.distribution == "fixed" or self.latency_ms <= 0:
+            value = self.latency_ms
+        elif self.distribution == "uniform":
+            value = random.uniform(self.latency_ms - self.jitter_ms / 2, self.latency_ms + self.jitter_ms / 2)
+        else:
+            sigma = min(self.jitter_ms / self.latency_ms, 2.0)
+            value = self.latency_ms * random.lognormvariate(0, sigma)
+        return max(value, 0) / 1000
+
+
+def create_app(latency: LatencyModel, error_rate: float = 0.0) -> FastAPI:
+    """
+    Crear aplicación del servidor simulado
+
+    Args:
+        latency: Modelo de latencia
+        error_rate: Probabilidad de responder 500 (0.0 - 1.0)
+    """
+    app = FastAPI(title="Fake LLM")
+    stats = {"requests": 0, "errors": 0}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        await asyncio.sleep(latency.sample())
+
+        if error_rate and random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Simulated upstream error", "type": "server_error"}}
+            )
+
+        messages = body.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        reply = random.choice(CANNED_REPLIES)
+        completion_tokens = len(reply) // 4
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    # El cliente de OpenAI usa OPENAI_BASE_URL + /chat/completions
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor de IA simulado compatible con OpenAI")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Latencia típica en ms")
+    parser.add_argument("--jitter-ms", type=float, default=300, help="Dispersión de la latencia en ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(LatencyModel(args.latency_dist, args.latency_ms, args.jitter_ms), args.error_rate),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning"
+    )
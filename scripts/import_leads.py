@@ -30,8 +30,8 @@ def import_leads_from_csv(csv_file_path: str, target_operator: str = "CLARO"):
         csv_file_path: Ruta al archivo CSV
         target_operator: Operador objetivo por defecto (CLARO, WOW, WIN)
     """
-    logger.info(f"📂 Importando leads desde: {csv_file_path}")
-    logger.info(f"🎯 Operador objetivo: {target_operator}")
+    logger.info("📂 Importando leads desde: %s", csv_file_path)
+    logger.info("🎯 Operador objetivo: %s", target_operator)
     
     imported_count = 0
     skipped_count = 0
@@ -45,7 +45,7 @@ def import_leads_from_csv(csv_file_path: str, target_operator: str = "CLARO"):
                 try:
                     # Validar campos requeridos
                     if not row.get('phone_number'):
-                        logger.warning(f"⚠️ Fila sin número de teléfono, saltando...")
+                        logger.warning("⚠️ Fila sin número de teléfono, saltando...")
                         skipped_count += 1
                         continue
                     
@@ -55,7 +55,7 @@ def import_leads_from_csv(csv_file_path: str, target_operator: str = "CLARO"):
                     ).first()
                     
                     if existing_lead:
-                        logger.info(f"⏭️ Lead ya existe: {row['phone_number']}, saltando...")
+                        logger.info("⏭️ Lead ya existe: %s, saltando...", row['phone_number'])
                         skipped_count += 1
                         continue
                     
@@ -74,26 +74,26 @@ def import_leads_from_csv(csv_file_path: str, target_operator: str = "CLARO"):
                     db.commit()
                     
                     imported_count += 1
-                    logger.info(f"✅ Lead importado: {row['phone_number']}")
+                    logger.info("✅ Lead importado: %s", row['phone_number'])
                     
                 except IntegrityError as e:
                     db.rollback()
-                    logger.error(f"❌ Error de integridad: {row.get('phone_number')} - {str(e)}")
+                    logger.error("❌ Error de integridad: %s - %s", row.get('phone_number'), e)
                     error_count += 1
                     
                 except Exception as e:
                     db.rollback()
-                    logger.error(f"❌ Error importando: {row.get('phone_number')} - {str(e)}")
+                    logger.error("❌ Error importando: %s - %s", row.get('phone_number'), e)
                     error_count += 1
     
     # Resumen
     logger.info("\n" + "="*50)
     logger.info("📊 RESUMEN DE IMPORTACIÓN")
     logger.info("="*50)
-    logger.info(f"✅ Importados: {imported_count}")
-    logger.info(f"⏭️ Saltados: {skipped_count}")
-    logger.info(f"❌ Errores: {error_count}")
-    logger.info(f"📈 Total procesados: {imported_count + skipped_count + error_count}")
+    logger.info("✅ Importados: %s", imported_count)
+    logger.info("⏭️ Saltados: %s", skipped_count)
+    logger.info("❌ Errores: %s", error_count)
+    logger.info("📈 Total procesados: %s", imported_count + skipped_count + error_count)
     logger.info("="*50)
 
 
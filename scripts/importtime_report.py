@@ -0,0 +1,92 @@
+"""
+Resumen de `python -X importtime` para el entry point de Vercel (api/index.py)
+
+Muestra los módulos más costosos (tiempo acumulado) y el total por paquete raíz.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def collect(module: str) -> list:
+    """
+    Ejecutar `python -X importtime -c "import <module>"` en un proceso limpio
+
+    Returns:
+        Lista de (módulo, self_us, cumulative_us, profundidad)
+    """
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env.setdefault("OPENAI_API_KEY", "importtime")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def summarize(entries: list, top: int) -> dict:
+    """Top de módulos por tiempo acumulado y total propio por paquete raíz"""
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+
+    by_package = {}
+    for name, self_us, _, _ in entries:
+        package = name.split(".", 1)[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    slowest = sorted(entries, key=lambda entry: entry[2], reverse=True)[:top]
+
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(entries),
+        "by_package_ms": {
+            package: round(us / 1000, 1)
+            for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+        "slowest_cumulative_ms": [
+            {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us, _ in slowest
+        ],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reporte de tiempos de importación")
+    parser.add_argument("--module", default="api.index", help="Módulo a importar (por defecto api.index)")
+    parser.add_argument("--top", type=int, default=20, help="Número de entradas a mostrar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+
+    args = parser.parse_args()
+
+    report = summarize(collect(args.module), args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        sys.exit(0)
+
+    print(f"📦 import {args.module}: {report['total_ms']} ms en {report['modules']} módulos\n")
+    print("Por paquete (tiempo propio):")
+    for package, ms in report["by_package_ms"].items():
+        print(f"  {package:<30} {ms:>8.1f} ms")
+    print("\nMódulos más lentos (tiempo acumulado):")
+    for entry in report["slowest_cumulative_ms"]:
+        print(f"  {entry['module']:<50} {entry['cumulative_ms']:>8.1f} ms")
@@ -0,0 +1,292 @@
+"""
+Prueba de carga end-to-end del webhook de WhatsApp
+
+Levanta la aplicación (uvicorn) contra PostgreSQL o SQLite local y un servidor de IA
+simulado (scripts/fake_llm.py), simula conversaciones de varios mensajes para miles de
+números y guarda los resultados en JSON para comparar antes y después de cada cambio.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+# Mensajes típicos de un lead, por etapa de la conversación
+CONVERSATION_SCRIPT = [
+    ["Hola", "Buenas tardes", "Hola, me escribieron?", "Sí, dígame"],
+    [
+        "Cuánto cuesta el plan?",
+        "Qué planes tienen con fibra?",
+        "Tienen cobertura en Arequipa?",
+        "Quiero más gigas, cuánto sale?",
+    ],
+    [
+        "Y si hago portabilidad mantengo mi número?",
+        "Cuánto demora la instalación?",
+        "Hay permanencia mínima?",
+        "Incluye Netflix?",
+    ],
+    ["Ok gracias", "Me interesa, llámenme", "Lo voy a pensar", "No gracias"],
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Sumar cada serie de /metrics por nombre (ignorando labels)"""
+    totals: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_part, _, value = line.rpartition(" ")
+        name = name_part.split("{", 1)[0]
+        try:
+            totals[name] = totals.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+    return totals
+
+
+def wait_for(url: str, timeout: float = 30.0) -> None:
+    """Esperar a que un servidor responda"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió a tiempo: {url}")
+
+
+def start_servers(args) -> List[subprocess.Popen]:
+    """Levantar servidor de IA simulado y la aplicación"""
+    processes = []
+
+    fake_llm = subprocess.Popen([
+        sys.executable, str(ROOT / "scripts" / "fake_llm.py"),
+        "--port", str(args.llm_port),
+        "--latency-dist", args.llm_latency_dist,
+        "--latency-ms", str(args.llm_latency_ms),
+        "--jitter-ms", str(args.llm_jitter_ms),
+        "--error-rate", str(args.llm_error_rate),
+    ], cwd=ROOT)
+    processes.append(fake_llm)
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.db_url,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "OPENAI_API_KEY": "fake-key",
+        "WHATCHIM_WEBHOOK_SECRET": "pending",
+        "DEBUG": "False",
+        "LOG_LEVEL": "WARNING",
+    })
+    if args.db_pool_mode:
+        env["DB_POOL_MODE"] = args.db_pool_mode
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.app_port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ], cwd=ROOT, env=env)
+    processes.append(app)
+
+    wait_for(f"http://127.0.0.1:{args.llm_port}/stats")
+    wait_for(f"http://127.0.0.1:{args.app_port}/health")
+    return processes
+
+
+def build_conversations(phones: int, turns: int, batch_probability: float, seed: int) -> List[tuple]:
+    """
+    Generar conversaciones: por cada número, una lista de peticiones al webhook
+
+    Algunas peticiones agrupan dos mensajes seguidos (como envía WhatsApp cuando
+    el lead escribe varias líneas rápido).
+    """
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(phones):
+        phone = f"+519{i:08d}"
+        requests = []
+        for turn in range(turns):
+            stage = CONVERSATION_SCRIPT[min(turn, len(CONVERSATION_SCRIPT) - 1)]
+            messages = [rng.choice(stage)]
+            if rng.random() < batch_probability:
+                messages.append(rng.choice(stage))
+            requests.append([
+                {
+                    "from_number": phone,
+                    "message": text,
+                    "message_id": f"load_{i}_{turn}_{j}",
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                }
+                for j, text in enumerate(messages)
+            ])
+        conversations.append((phone, requests))
+    return conversations
+
+
+async def run_load(base_url: str, conversations: List[tuple], concurrency: int, think_time_ms: float) -> dict:
+    """Enviar las conversaciones al webhook (orden secuencial dentro de cada número)"""
+    latencies: List[float] = []
+    message_count = 0
+    error_count = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+
+        async def run_conversation(requests):
+            nonlocal message_count, error_count
+            async with semaphore:
+                for messages in requests:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post("/webhook/whatsapp", json={"messages": messages})
+                        ok = response.status_code == 200 and len(response.json()) == len(messages)
+                    except httpx.HTTPError:
+                        ok = False
+                    latencies.append(time.perf_counter() - start)
+                    message_count += len(messages)
+                    if not ok:
+                        error_count += 1
+                    if think_time_ms:
+                        await asyncio.sleep(random.expovariate(1000 / think_time_ms))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_conversation(requests) for _, requests in conversations))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_s": elapsed,
+        "requests": len(latencies),
+        "messages": message_count,
+        "errors": error_count,
+        "latencies": latencies,
+    }
+
+
+def main(args) -> dict:
+    processes = []
+    base_url = args.base_url or f"http://127.0.0.1:{args.app_port}"
+
+    if not args.base_url:
+        processes = start_servers(args)
+
+    try:
+        before = parse_metrics(httpx.get(f"{base_url}/metrics").text)
+        conversations = build_conversations(args.phones, args.turns, args.batch_probability, args.seed)
+        result = asyncio.run(run_load(base_url, conversations, args.concurrency, args.think_time_ms))
+        after = parse_metrics(httpx.get(f"{base_url}/metrics").text)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # Peticiones colgadas impiden el cierre ordenado de uvicorn
+                process.kill()
+                process.wait()
+
+    def delta(name: str) -> float:
+        return after.get(name, 0.0) - before.get(name, 0.0)
+
+    messages = max(result["messages"], 1)
+    latencies_ms = [value * 1000 for value in result["latencies"]]
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "config": {
+            "db_url": args.db_url if not args.base_url else None,
+            "base_url": base_url,
+            "phones": args.phones,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "db_pool_mode": args.db_pool_mode,
+            "batch_probability": args.batch_probability,
+            "llm_latency_dist": args.llm_latency_dist,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "llm_error_rate": args.llm_error_rate,
+        },
+        "requests": result["requests"],
+        "messages": result["messages"],
+        "errors": result["errors"],
+        "elapsed_s": round(result["elapsed_s"], 3),
+        "throughput_msg_per_s": round(result["messages"] / result["elapsed_s"], 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 2),
+            "p95": round(percentile(latencies_ms, 95), 2),
+            "p99": round(percentile(latencies_ms, 99), 2),
+            "max": round(max(latencies_ms, default=0.0), 2),
+        },
+        # Con varios workers /metrics refleja solo el proceso que atendió el scrape
+        "db_queries_per_message": round(delta("angia_db_queries_total") / messages, 2),
+        "llm_calls_per_message": round(delta("angia_llm_request_seconds_count") / messages, 2),
+        "fallback_replies": int(delta("angia_llm_fallback_responses_total")),
+    }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prueba de carga del webhook de WhatsApp")
+    parser.add_argument("--db-url", default=None, help="DATABASE_URL (por defecto SQLite temporal)")
+    parser.add_argument("--base-url", default=None, help="Usar una instancia ya levantada en vez de iniciar una")
+    parser.add_argument("--app-port", type=int, default=8090)
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--db-pool-mode", choices=["queue", "small", "null"], default=None, help="DB_POOL_MODE de la aplicación")
+    parser.add_argument("--llm-port", type=int, default=8100)
+    parser.add_argument("--llm-latency-dist", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--phones", type=int, default=1000, help="Números de teléfono distintos")
+    parser.add_argument("--turns", type=int, default=4, help="Peticiones por conversación")
+    parser.add_argument("--batch-probability", type=float, default=0.15, help="Probabilidad de 2 mensajes por petición")
+    parser.add_argument("--concurrency", type=int, default=50, help="Conversaciones simultáneas")
+    parser.add_argument("--think-time-ms", type=float, default=0, help="Pausa media entre mensajes de un lead")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="", help="Etiqueta para identificar la corrida")
+    parser.add_argument("--output", default="load_results.json", help="Archivo JSON de resultados")
+    parser.add_argument("--max-errors", type=int, default=None, help="Falla (exit 1) si hay más peticiones con error")
+
+    args = parser.parse_args()
+
+    if not args.db_url:
+        args.db_url = f"sqlite:///{tempfile.mkdtemp(prefix='angia_load_')}/load.db"
+
+    report = main(args)
+
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.max_errors is not None and report["errors"] > args.max_errors:
+        print(f"❌ {report['errors']} peticiones con error (máximo {args.max_errors})")
+        sys.exit(1)
@@ -0,0 +1,337 @@
+"""
+Micro-benchmarks de LeadService, AIService, serialización de /leads e importación CSV
+
+Cada tamaño de dataset (10k / 100k / 1M filas) se siembra una sola vez en una base
+SQLite local (o en la DATABASE_URL indicada) y se mide en un subproceso propio, porque
+la aplicación crea su engine global a partir de DATABASE_URL al importarse.
+
+Uso:
+    python3 scripts/microbench.py --sizes 10000,100000 --save-baseline
+    python3 scripts/microbench.py --sizes 10000,100000 --compare --threshold 0.25
+"""
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+DEFAULT_DATA_DIR = ROOT / ".bench_data"
+DEFAULT_BASELINE = ROOT / "bench_baseline.json"
+
+SEED_BATCH_SIZE = 10_000
+
+
+def phone_for(index: int) -> str:
+    """Número de teléfono determinista para el índice dado"""
+    return f"+51{index:09d}"
+
+
+def seed_dataset(db, size: int) -> None:
+    """
+    Sembrar leads, sesiones y conversaciones
+
+    - size leads
+    - size sesiones (una por lead)
+    - size conversaciones, repartidas en size / 10 leads (10 mensajes por lead)
+    """
+    from sqlalchemy import insert
+    from app.models.lead import Lead, Conversation, Session as SessionModel, LeadStatusEnum, OperatorEnum
+
+    rng = random.Random(size)
+    operators = list(OperatorEnum)
+    statuses = list(LeadStatusEnum)
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(days=365)
+
+    for start in range(0, size, SEED_BATCH_SIZE):
+        stop = min(start + SEED_BATCH_SIZE, size)
+        db.execute(insert(Lead), [
+            {
+                "phone_number": phone_for(i),
+                "name": f"Lead {i}",
+                "email": f"lead{i}@example.com",
+                "current_operator": rng.choice(operators),
+                "target_operator": rng.choice(operators),
+                "status": rng.choice(statuses),
+                "created_at": now,
+            }
+            for i in range(start, stop)
+        ])
+        db.execute(insert(SessionModel), [
+            {
+                "phone_number": phone_for(i),
+                "is_active": True,
+                "message_count": 1,
+                "created_at": now,
+                "expires_at": expires_at,
+            }
+            for i in range(start, stop)
+        ])
+        db.execute(insert(Conversation), [
+            {
+                "phone_number": phone_for(i // 10),
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Mensaje de prueba {i} sobre planes y portabilidad",
+                "extra_data": {},
+                "created_at": now + timedelta(seconds=i),
+            }
+            for i in range(start, stop)
+        ])
+        db.commit()
+
+
+def measure(fn, number: int, repeat: int = 5, setup=None) -> dict:
+    """
+    Medir fn() number veces por repetición
+
+    Args:
+        setup: Se llama antes de cada repetición, fuera de la medición (p. ej. vaciar cachés)
+
+    Returns:
+        Mediana y mínimo en microsegundos por operación
+    """
+    fn()  # calentamiento
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return {"median_us": round(statistics.median(samples), 2), "min_us": round(min(samples), 2), "number": number}
+
+
+def check_leads_payload() -> None:
+    """
+    Verificar que GET /leads/ responde lo mismo byte a byte por ambos caminos
+
+    Compara un lead de ejemplo serializado como antes (LeadResponse + jsonable_encoder +
+    JSONResponse) con el camino actual (dict + FastJSONResponse), con orjson y sin él.
+    Incluye fechas UTC (sufijo Z), con otra zona, sin zona y texto no ASCII.
+    """
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    import app.core.serialization as serialization
+    from app.models.lead import LeadStatusEnum, OperatorEnum
+    from app.schemas.webhook import LeadResponse
+
+    lead = {
+        "id": 1,
+        "phone_number": "+51987654321",
+        "name": "José Muñoz",
+        "email": None,
+        "current_operator": OperatorEnum.WOW,
+        "target_operator": OperatorEnum.CLARO,
+        "status": LeadStatusEnum.INTERESTED,
+        "created_at": datetime(2026, 1, 2, 3, 4, 5, 678900, tzinfo=timezone.utc),
+        "updated_at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=-5))),
+    }
+    naive = {**lead, "id": 2, "created_at": datetime(2026, 1, 2, 3, 4, 5), "updated_at": None}
+
+    expected = JSONResponse(jsonable_encoder([LeadResponse.model_validate(row) for row in (lead, naive)])).body
+    module = serialization.orjson
+    try:
+        for name, backend in (("orjson", module), ("json", None)):
+            if name == "orjson" and backend is None:
+                continue
+            serialization.orjson = backend
+            actual = serialization.FastJSONResponse([lead, naive]).body
+            if actual != expected:
+                raise RuntimeError(f"GET /leads/ cambia con {name}:\n  antes: {expected!r}\n  ahora: {actual!r}")
+    finally:
+        serialization.orjson = module
+
+
+def run_child(size: int, quick: bool) -> dict:
+    """Medir todas las funciones contra el dataset ya configurado en DATABASE_URL"""
+    from sqlalchemy import func
+    from fastapi.encoders import jsonable_encoder
+    from app.core.serialization import dumps
+    from app.db.database import init_db, get_db_context
+    from app.models.lead import Lead
+    from app.schemas.webhook import LeadResponse
+    from app.services.ai_service import ai_service
+    from app.services.lead_cache import lead_cache
+    from app.services.lead_service import lead_service
+
+    init_db()
+    check_leads_payload()
+
+    with get_db_context() as db:
+        if db.query(func.count(Lead.id)).scalar() < size:
+            seed_dataset(db, size)
+
+    rng = random.Random(0)
+    number = 50 if quick else 300
+    results = {}
+
+    with get_db_context() as db:
+        results["LeadService.get_or_create_lead"] = measure(
+            lambda: lead_service.get_or_create_lead(db, phone_for(rng.randrange(size)), "CLARO"), number
+        )
+        # Cada repetición empieza con la caché vacía: si no, el resultado depende de lo que
+        # dejaron las mediciones anteriores y el baseline no es comparable entre corridas
+        results["LeadService.get_lead_snapshot"] = measure(
+            lambda: lead_service.get_lead_snapshot(db, phone_for(rng.randrange(size)), "CLARO"), number,
+            setup=lead_cache.clear
+        )
+        results["LeadService.get_or_create_session"] = measure(
+            lambda: lead_service.get_or_create_session(db, phone_for(rng.randrange(size))), number
+        )
+        results["LeadService.add_conversation_message"] = measure(
+            lambda: lead_service.add_conversation_message(
+                db, phone_for(rng.randrange(size // 10)), "user", "Hola, quiero información"
+            ),
+            number
+        )
+        results["LeadService.get_conversation_history"] = measure(
+            lambda: lead_service.get_conversation_history(db, phone_for(rng.randrange(size // 10))), number
+        )
+
+    results["AIService.get_system_prompt"] = measure(
+        lambda: ai_service.get_system_prompt("CLARO", "WOW"), number * 20
+    )
+
+    def serialize_leads_page():
+        # Camino anterior de GET /leads/?limit=1000: ORM -> LeadResponse -> JSON (referencia)
+        with get_db_context() as db:
+            leads = db.query(Lead).offset(rng.randrange(max(size - 1000, 1))).limit(1000).all()
+            payload = jsonable_encoder([LeadResponse.model_validate(lead) for lead in leads])
+            return json.dumps(payload)
+
+    def serialize_leads_page_fast():
+        # Camino actual de GET /leads/?limit=1000: columnas -> dict -> FastJSONResponse
+        with get_db_context() as db:
+            leads = lead_service.list_leads(db, skip=rng.randrange(max(size - 1000, 1)), limit=1000)
+            return dumps(leads)
+
+    results["leads.list_leads[1000]"] = measure(serialize_leads_page, 3 if quick else 10)
+    results["leads.list_leads_fast[1000]"] = measure(serialize_leads_page_fast, 3 if quick else 10)
+
+    results["import_leads.import_leads_from_csv[1000]"] = measure_csv_import(size, quick)
+
+    return results
+
+
+def measure_csv_import(size: int, quick: bool) -> dict:
+    """Medir la importación de 1000 filas nuevas por repetición"""
+    import logging
+    from scripts.import_leads import import_leads_from_csv
+
+    # El script registra una línea por lead; se silencia para medir el bucle de importación
+    logging.getLogger("scripts.import_leads").setLevel(logging.WARNING)
+
+    rows = 1000
+    counter = {"offset": size * 10 + int(time.time()) % 1_000_000 * rows}
+    workdir = Path(tempfile.mkdtemp(prefix="angia_csv_"))
+
+    def import_batch():
+        path = workdir / f"batch_{counter['offset']}.csv"
+        with open(path, "w", encoding="utf-8") as csvfile:
+            csvfile.write("phone_number,name,email,current_operator,notes\n")
+            for i in range(counter["offset"], counter["offset"] + rows):
+                csvfile.write(f"{phone_for(i)},Lead {i},lead{i}@example.com,WOW,Importado\n")
+        counter["offset"] += rows
+        import_leads_from_csv(str(path), "CLARO")
+
+    result = measure(import_batch, 1, repeat=2 if quick else 3)
+    result["median_us_per_row"] = round(result["median_us"] / rows, 2)
+    return result
+
+
+def run_size(size: int, args) -> dict:
+    """Ejecutar el subproceso de medición para un tamaño de dataset"""
+    env = dict(os.environ)
+    if args.db_url:
+        env["DATABASE_URL"] = args.db_url.format(size=size)
+    else:
+        Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+        env["DATABASE_URL"] = f"sqlite:///{Path(args.data_dir).resolve()}/bench_{size}.db"
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env["DEBUG"] = "False"
+    env["LOG_LEVEL"] = "WARNING"
+
+    command = [sys.executable, str(Path(__file__).resolve()), "--child", str(size)]
+    if args.quick:
+        command.append("--quick")
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode:
+        print(completed.stderr, file=sys.stderr)
+        raise SystemExit(f"❌ Falló la medición del dataset de {size:,} filas")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Listar funciones cuya mediana empeoró más que threshold respecto al baseline"""
+    regressions = []
+    for size, functions in current.items():
+        for name, result in functions.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous:
+                continue
+            ratio = result["median_us"] / previous["median_us"] - 1
+            if ratio > threshold:
+                regressions.append({
+                    "size": size,
+                    "function": name,
+                    "baseline_us": previous["median_us"],
+                    "current_us": result["median_us"],
+                    "change": f"+{ratio:.0%}",
+                })
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de funciones críticas")
+    parser.add_argument("--sizes", default="10000,100000", help="Tamaños de dataset separados por coma")
+    parser.add_argument("--db-url", default=None, help="DATABASE_URL con {size} (por defecto SQLite en --data-dir)")
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR), help="Directorio de los datasets SQLite")
+    parser.add_argument("--output", default=None, help="Guardar resultados en este JSON")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Archivo de baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar resultados como nuevo baseline")
+    parser.add_argument("--compare", action="store_true", help="Fallar si alguna función empeora más que el umbral")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Regresión tolerada (0.25 = +25%%)")
+    parser.add_argument("--quick", action="store_true", help="Menos iteraciones")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child is not None:
+        sys.path.insert(0, str(ROOT))
+        print(json.dumps(run_child(args.child, args.quick)))
+        sys.exit(0)
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(f"⏱️ Dataset de {size:,} filas...", file=sys.stderr)
+        results[str(size)] = run_size(size, args)
+        for name, result in results[str(size)].items():
+            print(f"   {name:<45} {result['median_us']:>12,.1f} µs", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+        print(f"✅ Baseline guardado en {args.baseline}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print("❌ Regresiones detectadas:", file=sys.stderr)
+            print(json.dumps(regressions, indent=2), file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Sin regresiones mayores a {args.threshold:.0%}", file=sys.stderr)
@@ -0,0 +1,89 @@
+"""
+Script para generar mensajes de primer contacto con plantillas (sin IA)
+"""
+
+import csv
+import sys
+import time
+from pathlib import Path
+
+# Agregar directorio raíz al path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.db.database import get_db_context
+from app.models.lead import Lead, OperatorEnum, LeadStatusEnum
+from app.services.lead_service import lead_service
+from app.services.template_service import template_service
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def render_openers(output_path: str, target_operator: str = None, record: bool = False, limit: int = None):
+    """
+    Renderizar mensajes de primer contacto para todos los leads PENDING
+
+    Formato del CSV de salida:
+    phone_number,target_operator,variant_id,message
+
+    Args:
+        output_path: Ruta del CSV de salida (mensajes listos para enviar)
+        target_operator: Filtrar por operador objetivo (opcional)
+        record: Guardar el mensaje en el historial y marcar el lead como CONTACTED
+        limit: Número máximo de leads a procesar (opcional)
+    """
+    logger.info("✉️ Generando mensajes de primer contacto -> %s", output_path)
+
+    rendered_count = 0
+    start = time.perf_counter()
+
+    with get_db_context() as db, open(output_path, 'w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["phone_number", "target_operator", "variant_id", "message"])
+
+        query = db.query(Lead).filter(Lead.status == LeadStatusEnum.PENDING).order_by(Lead.id)
+        if target_operator:
+            query = query.filter(Lead.target_operator == OperatorEnum(target_operator))
+        if limit:
+            query = query.limit(limit)
+
+        # Con --record se confirma por lead, así que se materializa la lista antes de iterar
+        leads = query.all() if record else query.yield_per(1000)
+
+        for lead in leads:
+            rendered = template_service.render_for_lead(lead)
+            writer.writerow([lead.phone_number, lead.target_operator.value, rendered.variant_id, rendered.message])
+
+            if record:
+                lead_service.record_first_contact(db, lead, rendered.message, rendered.variant_id)
+
+            rendered_count += 1
+
+    elapsed = time.perf_counter() - start
+    rate = rendered_count / elapsed if elapsed > 0 else 0
+
+    logger.info("✅ Mensajes generados: %s en %.2fs (%.0f mensajes/s)", rendered_count, elapsed, rate)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generar mensajes de primer contacto con plantillas")
+    parser.add_argument("output", help="Ruta del CSV de salida")
+    parser.add_argument(
+        "--operator",
+        choices=["CLARO", "WOW", "WIN"],
+        default=None,
+        help="Filtrar por operador objetivo"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Guardar el mensaje en el historial y marcar el lead como CONTACTED"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Número máximo de leads")
+
+    args = parser.parse_args()
+
+    render_openers(args.output, args.operator, args.record, args.limit)
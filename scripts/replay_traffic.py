@@ -0,0 +1,230 @@
+"""
+Reproducir tráfico grabado del webhook (TRAFFIC_RECORD_ENABLED) contra una instancia
+
+Lee una o más capturas (.jsonl o rotadas .jsonl.gz, de uno o varios workers), las
+ordena por hora de llegada y las vuelve a enviar respetando los intervalos originales
+a 1x, a N veces la velocidad o sin pausas (max). Las peticiones de un mismo número
+se envían en su orden original y cada una espera a que termine la anterior.
+
+Al final compara latencia y throughput con la corrida original. La latencia comparada
+es la del servidor en ambas corridas: la grabación guarda el tiempo de procesamiento
+del webhook y la instancia lo devuelve en el header X-Process-Time. El tiempo de ida y
+vuelta que ve este script se reporta aparte (client_latency_ms).
+
+Si la instancia valida WHATCHIM_WEBHOOK_SECRET, pasar el mismo valor con --secret (por
+defecto se toma de la variable de entorno WHATCHIM_WEBHOOK_SECRET).
+
+Uso:
+    python3 scripts/replay_traffic.py traffic/*.jsonl* --base-url http://127.0.0.1:8000 --speed 1
+    python3 scripts/replay_traffic.py traffic/*.jsonl* --speed 10 --output replay.json
+    python3 scripts/replay_traffic.py traffic/*.jsonl* --speed max --concurrency 200 --secret "$SECRET"
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from load_test import parse_metrics, percentile
+
+
+def load_capture(paths: List[str]) -> List[dict]:
+    """Leer las capturas y ordenarlas por hora de llegada"""
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as capture:
+            for line in capture:
+                if line.strip():
+                    records.append(json.loads(line))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """'max' = sin pausas (None); si no, multiplicador de velocidad"""
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise ValueError("La velocidad debe ser mayor que 0")
+    return speed
+
+
+def latency_summary(latencies_ms: List[float]) -> Optional[dict]:
+    """Percentiles de latencia (None si no hay muestras)"""
+    if not latencies_ms:
+        return None
+    return {
+        "p50": round(percentile(latencies_ms, 50), 2),
+        "p95": round(percentile(latencies_ms, 95), 2),
+        "p99": round(percentile(latencies_ms, 99), 2),
+        "max": round(max(latencies_ms), 2),
+    }
+
+
+def summarize(latencies_ms: List[float], requests: int, messages: int, elapsed_s: float) -> dict:
+    """Latencia del servidor por petición y throughput"""
+    return {
+        "requests": requests,
+        "messages": messages,
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_msg_per_s": round(messages / elapsed_s, 2) if elapsed_s > 0 else None,
+        "latency_ms": latency_summary(latencies_ms),
+    }
+
+
+async def replay(
+    base_url: str,
+    records: List[dict],
+    speed: Optional[float],
+    concurrency: int,
+    secret: Optional[str] = None
+) -> dict:
+    """
+    Enviar las peticiones grabadas
+
+    Cada petición se programa en (t - t0) / speed; antes de enviarla espera a que
+    terminen las anteriores de los mismos números, así el orden por número se mantiene
+    aunque la instancia responda más lento que la original.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"X-Webhook-Secret": secret} if secret else {}
+    last_done: Dict[str, asyncio.Event] = {}
+    server_latencies: List[float] = []
+    client_latencies: List[float] = []
+    delays: List[float] = []
+    errors = 0
+    messages = 0
+    first = records[0]["t"] if records else 0.0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits, headers=headers) as client:
+
+        async def send(record: dict, previous: List[asyncio.Event], done: asyncio.Event, scheduled: float):
+            nonlocal errors, messages
+            try:
+                if speed is not None:
+                    await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                for event in previous:
+                    await event.wait()
+                async with semaphore:
+                    sent = time.perf_counter()
+                    if speed is not None:
+                        delays.append((sent - scheduled) * 1000)
+                    try:
+                        response = await client.post("/webhook/whatsapp", json={"messages": record["messages"]})
+                        expected = record.get("replies", len(record["messages"]))
+                        ok = response.status_code == 200 and len(response.json()) == expected
+                        if response.status_code == 200 and "x-process-time" in response.headers:
+                            server_latencies.append(float(response.headers["x-process-time"]))
+                    except httpx.HTTPError:
+                        ok = False
+                    client_latencies.append((time.perf_counter() - sent) * 1000)
+                    messages += len(record["messages"])
+                    if not ok:
+                        errors += 1
+            finally:
+                done.set()
+
+        start = time.perf_counter()
+        tasks = []
+        for record in records:
+            phones = {message["from_number"] for message in record["messages"]}
+            previous = [last_done[phone] for phone in phones if phone in last_done]
+            done = asyncio.Event()
+            for phone in phones:
+                last_done[phone] = done
+            scheduled = start + (record["t"] - first) / speed if speed is not None else start
+            tasks.append(send(record, previous, done, scheduled))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    result = summarize(server_latencies, len(client_latencies), messages, elapsed)
+    result["client_latency_ms"] = latency_summary(client_latencies)
+    result["errors"] = errors
+    if delays:
+        # Retraso respecto del horario original: si crece, la instancia no sigue el ritmo
+        result["schedule_lag_ms"] = {"p50": round(percentile(delays, 50), 2), "p95": round(percentile(delays, 95), 2)}
+    return result
+
+
+def main(args) -> dict:
+    records = load_capture(args.captures)
+    if not records:
+        raise SystemExit("Las capturas están vacías")
+    speed = parse_speed(args.speed)
+
+    original = summarize(
+        [record["latency_ms"] for record in records],
+        len(records),
+        sum(len(record["messages"]) for record in records),
+        records[-1]["t"] - records[0]["t"] + records[-1]["latency_ms"] / 1000
+    )
+
+    before = parse_metrics(httpx.get(f"{args.base_url}/metrics").text)
+    replayed = asyncio.run(replay(args.base_url, records, speed, args.concurrency, args.secret))
+    if replayed["latency_ms"] is None:
+        print("⚠️ La instancia no devolvió X-Process-Time: no se puede comparar la latencia del servidor", file=sys.stderr)
+    after = parse_metrics(httpx.get(f"{args.base_url}/metrics").text)
+    fallback = "angia_llm_fallback_responses_total"
+    replayed["fallback_replies"] = int(after.get(fallback, 0.0) - before.get(fallback, 0.0))
+
+    def ratio(new, old):
+        return round(new / old, 3) if new is not None and old else None
+
+    def latency_ratio(pct):
+        if replayed["latency_ms"] is None:
+            return None
+        return ratio(replayed["latency_ms"][pct], original["latency_ms"][pct])
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "config": {
+            "captures": args.captures,
+            "base_url": args.base_url,
+            "speed": args.speed,
+            "concurrency": args.concurrency,
+            "phones": len({message["from_number"] for record in records for message in record["messages"]}),
+        },
+        "original": original,
+        "replay": replayed,
+        "comparison": {
+            "p50_ratio": latency_ratio("p50"),
+            "p95_ratio": latency_ratio("p95"),
+            "p99_ratio": latency_ratio("p99"),
+            "throughput_ratio": ratio(replayed["throughput_msg_per_s"], original["throughput_msg_per_s"]),
+        },
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reproducir tráfico grabado del webhook")
+    parser.add_argument("captures", nargs="+", help="Archivos de captura (.jsonl o .jsonl.gz)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Instancia contra la que reproducir")
+    parser.add_argument("--speed", default="1", help="1 = tiempo real, N = N veces más rápido, max = sin pausas")
+    parser.add_argument("--concurrency", type=int, default=100, help="Peticiones simultáneas máximas")
+    parser.add_argument("--label", default="", help="Etiqueta para identificar la corrida")
+    parser.add_argument(
+        "--secret", default=os.environ.get("WHATCHIM_WEBHOOK_SECRET"),
+        help="Header X-Webhook-Secret (por defecto WHATCHIM_WEBHOOK_SECRET del entorno)"
+    )
+    parser.add_argument("--output", default=None, help="Guardar el reporte en este JSON")
+
+    args = parser.parse_args()
+    report = main(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))